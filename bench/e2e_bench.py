@@ -0,0 +1,197 @@
+# bench/e2e_bench.py
+"""
+End-to-end benchmark of the user journey on the offline provider.
+
+Run from the repo root:
+    python bench/e2e_bench.py --users 1 4 16 --chats 3 --latency 0.05
+    python bench/e2e_bench.py --compare latest --threshold 0.2
+
+Each simulated user uploads a photo, selects it, chats about it, fetches the
+knowledge graph and asks for a year in review, concurrently with the other
+users. Chat, vision and embeddings come from `pkg.offline` (deterministic,
+with simulated latency), so runs need no network and are comparable.
+
+Results (p50/p95/p99 per step and throughput per concurrency level) are
+written to bench/results/e2e-<timestamp>.json. `--compare` diffs a run
+against an earlier result file ("latest" = the newest one) and flags p95
+regressions above `--threshold`.
+"""
+import os, sys, io, glob, json, time, asyncio, argparse, tempfile, subprocess
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO, "bench", "results")
+STEPS = ("upload", "select", "chat", "graph", "year_in_review")
+
+sys.path.insert(0, REPO)
+
+
+def make_image(seed: int) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (seed * 37 % 256, 120, 80)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def summarize(samples: list[float]) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+# ------------------------------------------------------------
+# Scenario
+# ------------------------------------------------------------
+async def user_journey(http, profile: str, chats: int, timings: dict):
+    async def timed(step, call):
+        start = time.perf_counter()
+        r = await call()
+        r.raise_for_status()
+        timings[step].append(time.perf_counter() - start)
+        return r
+
+    image = make_image(len(profile))
+    r = await timed("upload", lambda: http.post(
+        f"/api/gpt4v/upload?profile={profile}", files={"file": ("photo.jpg", image, "image/jpeg")}
+    ))
+    name = r.json()["filename"]
+    await timed("select", lambda: http.post(f"/api/gpt4v/select?profile={profile}&image_name={name}"))
+    for i in range(chats):
+        await timed("chat", lambda: http.post(
+            "/api/gpt4v/chat", data={"profile": profile, "user_message": f"What does moment {i} remind you of?"}
+        ))
+    await timed("graph", lambda: http.get(f"/api/graph/api/graph/{profile}"))
+    await timed("year_in_review", lambda: http.post("/api/gpt4v/year_in_review", data={"profile": profile}))
+
+
+async def run_level(http, users: int, chats: int, run_id: str) -> dict:
+    timings = {step: [] for step in STEPS}
+    profiles = [f"bench_{run_id}_{users}_{i}" for i in range(users)]
+    start = time.perf_counter()
+    await asyncio.gather(*(user_journey(http, p, chats, timings) for p in profiles))
+    wall = time.perf_counter() - start
+    requests = sum(len(v) for v in timings.values())
+    return {
+        "users": users,
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "steps": {step: summarize(samples) for step, samples in timings.items() if samples},
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from pkg.app.main import app
+
+    run_id = time.strftime("%H%M%S")
+    levels = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+        for users in args.users:
+            level = await run_level(http, users, args.chats, run_id)
+            levels.append(level)
+            print_level(level)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "config": {
+            "users": args.users,
+            "chats": args.chats,
+            "latency_s": args.latency,
+            "token_latency_s": args.token_latency,
+            "env": {k: v for k, v in os.environ.items() if k.startswith("MINDLINK_")},
+        },
+        "levels": levels,
+    }
+
+
+# ------------------------------------------------------------
+# Reporting
+# ------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_level(level: dict):
+    print(f"\nusers={level['users']}  requests={level['requests']}  wall={level['wall_s']}s  "
+          f"throughput={level['throughput_rps']} req/s")
+    print(f"{'step':<16}{'count':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, s in level["steps"].items():
+        print(f"{step:<16}{s['count']:>6}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+
+
+def save(result: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(result: dict, baseline_path: str, threshold: float) -> int:
+    """Print p95 / throughput deltas against a baseline; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_levels = {lvl["users"]: lvl for lvl in baseline["levels"]}
+    regressions = 0
+    print(f"\nCompared with {os.path.basename(baseline_path)} (commit {baseline.get('commit')}):")
+    print(f"{'users':>5} {'step':<16}{'p95 base':>10}{'p95 now':>10}{'change':>9}")
+    for level in result["levels"]:
+        base = base_levels.get(level["users"])
+        if base is None:
+            continue
+        for step, s in level["steps"].items():
+            b = base["steps"].get(step)
+            if not b or not b["p95_ms"]:
+                continue
+            change = s["p95_ms"] / b["p95_ms"] - 1
+            flag = "  ⚠ regression" if change > threshold else ""
+            regressions += bool(flag)
+            print(f"{level['users']:>5} {step:<16}{b['p95_ms']:>10.1f}{s['p95_ms']:>10.1f}{change:>+9.0%}{flag}")
+        change = level["throughput_rps"] / base["throughput_rps"] - 1
+        print(f"{level['users']:>5} {'throughput':<16}{base['throughput_rps']:>10.1f}{level['throughput_rps']:>10.1f}{change:>+9.0%}")
+    return regressions
+
+
+def latest_result(exclude: str = None):
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, "e2e-*.json")) if p != exclude)
+    return paths[-1] if paths else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="concurrent users per level")
+    parser.add_argument("--chats", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated completion latency (s)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="simulated per-token stream latency (s)")
+    parser.add_argument("--compare", help='baseline result file, or "latest"')
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase counted as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["MINDLINK_PROVIDER"] = "offline"
+    os.environ["MINDLINK_OFFLINE_LATENCY"] = str(args.latency)
+    os.environ["MINDLINK_OFFLINE_TOKEN_LATENCY"] = str(args.token_latency)
+    os.environ["MINDLINK_EMBED_CACHE_PATH"] = ""
+    # The app writes under ./data, so keep the benchmark out of the real tree.
+    os.chdir(tempfile.mkdtemp(prefix="mindlink-e2e-"))
+
+    result = asyncio.run(run(args))
+    baseline = latest_result() if args.compare == "latest" else args.compare
+    if not args.no_save:
+        print(f"\nSaved {save(result)}")
+    if baseline:
+        regressions = compare(result, baseline, args.threshold)
+        sys.exit(1 if regressions else 0)
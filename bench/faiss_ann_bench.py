@@ -0,0 +1,108 @@
+# bench/faiss_ann_bench.py
+"""
+Recall-vs-latency benchmark of the FAISS index modes on the stored profiles.
+
+Run from the repo root:
+    python bench/faiss_ann_bench.py --k 10 --nprobe 1 4 16 64
+    python bench/faiss_ann_bench.py --scale 50000   # pooled vectors, jittered up to 50k
+
+Vectors are read straight from every `data/*/faiss_*/index.faiss` (no pickle
+loading). 10% of each collection is held out as queries; recall@k is measured
+against exact flat search over the remaining vectors.
+"""
+import os, sys, glob, time, argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pkg.vector_index import build_index, current_mode, resolve_mode, search_params, stored_vectors
+
+MODES = ("flat", "ivf_sq8", "ivf_pq", "ivf_hnsw_sq8", "ivf_hnsw_pq")
+
+
+def load_store(path: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    if isinstance(index, faiss.IndexIDMap2):
+        if current_mode(index) != "flat":
+            return np.zeros((0, index.d), dtype=np.float32)  # quantized only; no raw vectors to measure
+        return stored_vectors(path)[1]
+    return index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+
+
+def scale_up(vectors: np.ndarray, n: int, rng) -> np.ndarray:
+    """Grow a collection to `n` vectors by jittering real ones."""
+    if len(vectors) >= n:
+        return vectors
+    picks = vectors[rng.integers(0, len(vectors), n - len(vectors))]
+    noise = rng.normal(0, 0.02, picks.shape).astype(np.float32)
+    return np.vstack([vectors, picks + noise]).astype(np.float32)
+
+
+def run(name: str, vectors: np.ndarray, args, rng):
+    n_queries = max(1, len(vectors) // 10)
+    order = rng.permutation(len(vectors))
+    queries, base = vectors[order[:n_queries]], vectors[order[n_queries:]]
+    ids = np.arange(len(base), dtype=np.int64)
+    k = min(args.k, len(base))
+
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    print(f"\n{name}: {len(base)} vectors × {base.shape[1]}d, {n_queries} queries, recall@{k}")
+    print(f"{'mode':<14}{'nprobe':>7}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}{'MB':>8}{'build s':>9}")
+    for mode in args.modes:
+        concrete = resolve_mode(mode, len(base))
+        if concrete != mode:
+            print(f"{mode:<14}   skipped (too few vectors, would build {concrete})")
+            continue
+        start = time.perf_counter()
+        index = build_index(mode, ids, base, base.shape[1])
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        for nprobe in ([None] if mode == "flat" else args.nprobe):
+            params = search_params(index, nprobe=nprobe) if nprobe else None
+            latencies, found = [], []
+            for q in queries:
+                t = time.perf_counter()
+                _, got = index.search(q[None, :], k, params=params)
+                latencies.append((time.perf_counter() - t) * 1000)
+                found.append(got[0])
+            recall = np.mean([len(set(g) & set(t)) / k for g, t in zip(found, truth)])
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{mode:<14}{nprobe or '-':>7}{recall:>8.3f}{p50:>9.3f}{p95:>9.3f}{size_mb:>8.1f}{build_s:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", default="data")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--scale", type=int, default=0, help="also benchmark the pooled vectors grown to N")
+    parser.add_argument("--min-vectors", type=int, default=20, help="skip smaller stores")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pooled = []
+    for path in sorted(glob.glob(os.path.join(args.root, "*", "faiss_*"))):
+        if not os.path.exists(os.path.join(path, "index.faiss")):
+            continue
+        vectors = load_store(path)
+        pooled.append(vectors)
+        if len(vectors) >= args.min_vectors:
+            run(os.path.basename(path), vectors, args, rng)
+
+    if not pooled:
+        print(f"No FAISS stores under {args.root}/*/faiss_*")
+        return
+    all_real = np.vstack(pooled).astype(np.float32)
+    run(f"pooled ({len(pooled)} stores)", all_real, args, rng)
+    if args.scale:
+        run(f"pooled, scaled to {args.scale}", scale_up(all_real, args.scale, rng), args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench/load_test_async.py
+"""
+Load test for the async /gpt4v/chat path against a local mock completion server.
+
+Run from the repo root:
+    python bench/load_test_async.py --delay 0.2 --levels 1 2 4 8 16 32
+
+The mock server sleeps `--delay` seconds per completion and records how many
+requests it is serving at once. If the request path blocks the event loop,
+peak in-flight stays at 1 regardless of client concurrency.
+"""
+import os, sys, time, socket, asyncio, argparse, tempfile, threading, io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ------------------------------------------------------------
+# Mock OpenAI-compatible completion server
+# ------------------------------------------------------------
+def start_mock_server(delay: float):
+    import uvicorn
+    from fastapi import FastAPI
+
+    mock = FastAPI()
+    stats = {"in_flight": 0, "peak": 0, "served": 0}
+
+    @mock.post("/v1/chat/completions")
+    async def completions(body: dict):
+        stats["in_flight"] += 1
+        stats["peak"] = max(stats["peak"], stats["in_flight"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            stats["in_flight"] -= 1
+            stats["served"] += 1
+        return {
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "[('user', 'enjoys', 'this photo')]"},
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1", stats
+
+
+def make_image() -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 120, 80)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+async def run(levels, delay, per_worker):
+    import httpx
+    from pkg.app.main import app
+
+    image = make_image()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as http:
+        print(f"{'concurrency':>11} {'requests':>8} {'seconds':>8} {'req/s':>7} {'peak in-flight':>15}")
+        for level in levels:
+            profiles = [f"load_{level}_{i}" for i in range(level)]
+            for p in profiles:
+                r = await http.post(f"/api/gpt4v/upload?profile={p}", files={"file": ("photo.png", image, "image/png")})
+                r.raise_for_status()
+
+            async def worker(profile):
+                for _ in range(per_worker):
+                    r = await http.post("/api/gpt4v/chat", data={"profile": profile, "user_message": "How does this feel?"})
+                    r.raise_for_status()
+
+            MOCK_STATS["peak"] = 0
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(p) for p in profiles))
+            elapsed = time.perf_counter() - start
+            total = level * per_worker
+            print(f"{level:>11} {total:>8} {elapsed:>8.2f} {total / elapsed:>7.1f} {MOCK_STATS['peak']:>15}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.2, help="mock completion latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--per-worker", type=int, default=3, help="sequential chats per concurrent client")
+    args = parser.parse_args()
+
+    base_url, MOCK_STATS = start_mock_server(args.delay)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["MINDLINK_EMBEDDER"] = "local"
+    os.environ["MINDLINK_EMBED_CACHE_PATH"] = ""
+    # The app writes under ./data, so keep the benchmark out of the real tree.
+    os.chdir(tempfile.mkdtemp(prefix="mindlink-load-"))
+    asyncio.run(run(args.levels, args.delay, args.per_worker))
@@ -1,63 +1,71 @@
 import os
+import asyncio
 import json
-import base64
 import uuid
-import networkx as nx
 from fastapi import APIRouter, UploadFile, File, Header
 from fastapi.responses import JSONResponse
 from typing import Optional
-from pkg.memory_kg import MemoryKG, LocalFileAdapter
-from langchain_openai import ChatOpenAI
+from pkg.memory_registry import registry
+from pkg.ingest import pipeline as ingestion
+from pkg.image_cache import encode_image
+from pkg.photo import vision_source
+from pkg.uploads import save_upload
+from pkg.app.session_state import sessions
+from pkg.llm import get_chat_model
+from pkg.metrics import span, record_usage
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 router = APIRouter(prefix="/gpt4v", tags=["GPT-4V"])
-USER_AGENT_STATES = {}
+SESSION_NAMESPACE = "agent"
+CONVERSATIONS_DIR = os.path.join("data", "conversations")
+NEW_STATE = {"image_path": None, "messages": []}
+DESCRIBE_PROMPT = "Please describe and interpret this image thoughtfully."
 
 # ---------------- Utility ----------------
 def init_agent_state(user_id: str):
-    if user_id not in USER_AGENT_STATES:
-        USER_AGENT_STATES[user_id] = {
-            "image_path": None,
-            "messages": [],
-            "knowledge_graph": nx.DiGraph(),
-        }
-        print(f"[AGENT] Initialized new state for {user_id}")
-    return USER_AGENT_STATES[user_id]
+    return sessions.get(SESSION_NAMESPACE, user_id, NEW_STATE)
+
+def save_agent_state(user_id: str, state: dict):
+    sessions.update(SESSION_NAMESPACE, user_id, lambda s: s.update(state), NEW_STATE)
+
+def to_langchain_messages(records: list[dict]):
+    """Rebuild chat history from compact records.
+
+    Records keep only the path of an image, not its payload, so earlier images
+    are referenced by name instead of being re-sent.
+    """
+    messages = []
+    for r in records:
+        if r["role"] == "user":
+            text = r["content"]
+            if r.get("image"):
+                text += f"\n[image: {os.path.basename(r['image'])}]"
+            messages.append(HumanMessage(content=text))
+        else:
+            messages.append(AIMessage(content=r["content"]))
+    return messages
 
 def get_memory(user_id: str):
-    adapter = LocalFileAdapter(profile_name=user_id)
-    return MemoryKG(adapter=adapter, profile_name=user_id)
+    return registry.get(user_id)
 
-def save_upload_file(uploaded_file: UploadFile) -> str:
+async def save_upload_file(uploaded_file: UploadFile, user_id: str) -> str:
+    """Stream the upload to disk; a photo this user already uploaded reuses its file."""
     save_dir = os.path.join("static", "uploads")
-    os.makedirs(save_dir, exist_ok=True)
-    unique_name = f"{uuid.uuid4().hex}_{uploaded_file.filename}"
-    file_path = os.path.join(save_dir, unique_name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.file.read())
-    uploaded_file.file.close()
-    print(f"[AGENT] Image saved at {file_path}")
-    return file_path
+    unique_name = f"{uuid.uuid4().hex}_{os.path.basename(uploaded_file.filename)}"
+    # x-user-id names the agent's profile: memory, ingestion and the upload quota all key on it.
+    stored = await save_upload(uploaded_file, user_id, os.path.join(save_dir, unique_name), reuse=True)
+    print(f"[AGENT] Image saved at {stored['path']}")
+    return stored["path"]
 
 def encode_image_to_base64(image_path: str) -> tuple[str, str]:
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
-    ext = os.path.splitext(image_path)[-1].lower()
-    mime_type = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".webp": "image/webp",
-    }.get(ext, "image/jpeg")
-    with open(image_path, "rb") as img_file:
-        encoded = base64.b64encode(img_file.read()).decode("utf-8")
-    return encoded, mime_type
+    return encode_image(vision_source(image_path))
 
 # ---------------- Core ----------------
-def upload_node(state, uploaded_file: Optional[UploadFile] = None):
-    if uploaded_file:
-        file_path = save_upload_file(uploaded_file)
-        state["image_path"] = file_path
+def upload_node(state, image_path: Optional[str] = None):
+    if image_path:
+        state["image_path"] = image_path
     return state
 
 def chat_node(state):
@@ -69,7 +77,7 @@ def chat_node(state):
 
     human_msg = HumanMessage(
         content=[
-            {"type": "text", "text": "Please describe and interpret this image thoughtfully."},
+            {"type": "text", "text": DESCRIBE_PROMPT},
             {"type": "image_url", "image_url": f"data:{mime_type};base64,{image_base64}"},
         ]
     )
@@ -78,35 +86,27 @@ def chat_node(state):
         content="You are a thoughtful assistant that provides deep and kind insights about uploaded images."
     )
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-    prev_msgs = state.get("messages", [])
-    response = llm.invoke([sys_msg] + prev_msgs + [human_msg])
+    llm = get_chat_model("gpt-4o", temperature=0.3)
+    prev_msgs = to_langchain_messages(state.get("messages", []))
+    with span("agent.completion"):
+        response = llm.invoke([sys_msg] + prev_msgs + [human_msg])
+    record_usage("agent", "gpt-4o", getattr(response, "usage_metadata", None))
 
-    state["messages"].append(human_msg)
-    state["messages"].append(response)
+    state["messages"].append({"role": "user", "content": DESCRIBE_PROMPT, "image": state["image_path"]})
+    state["messages"].append({"role": "assistant", "content": str(response.content)})
     print(f"[AGENT] GPT-4-Vision processed image successfully for {state['image_path']}")
     return state
 
 def update_graph_node(state, user_id: str):
-    G = nx.DiGraph()
-    for i, msg in enumerate(state["messages"]):
-        role = "user" if isinstance(msg, HumanMessage) else "assistant" if isinstance(msg, AIMessage) else "system"
-        node_id = f"{role}_{i}"
-        G.add_node(node_id, label=str(msg.content))
-        if i > 0:
-            prev_role = "user" if isinstance(state["messages"][i - 1], HumanMessage) else "assistant"
-            G.add_edge(f"{prev_role}_{i - 1}", node_id, label="next")
-    state["knowledge_graph"] = G
-
-    os.makedirs("data/conversations", exist_ok=True)
-    conv_path = os.path.join("data/conversations", f"{user_id}_conversation.json")
-    conv = [{"role": msg.type, "content": msg.content} for msg in state["messages"]]
+    os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+    conv_path = os.path.join(CONVERSATIONS_DIR, f"{user_id}_conversation.json")
+    conv = [{"role": m["role"], "content": m["content"]} for m in state["messages"]]
     with open(conv_path, "w", encoding="utf-8") as f:
         json.dump(conv, f, indent=2, ensure_ascii=False)
 
-    memory = get_memory(user_id)
-    memory.add_chunk_to_graph(conv, photo_name=state.get("image_path"))
-    print(f"[AGENT] Knowledge graph updated for {user_id}")
+    # Only the latest exchange is new to the knowledge graph.
+    ingestion.submit(user_id, conv[-2:], photo_name=state.get("image_path"), speaker=user_id)
+    print(f"[AGENT] Knowledge graph update queued for {user_id}")
     return state
 
 # ---------------- Routes ----------------
@@ -115,7 +115,8 @@ async def upload_image(file: UploadFile = File(...), x_user_id: Optional[str] =
     if not x_user_id:
         return JSONResponse({"error": "Missing x-user-id header"}, status_code=400)
     state = init_agent_state(x_user_id)
-    state = upload_node(state, uploaded_file=file)
+    state = upload_node(state, image_path=await save_upload_file(file, x_user_id))
+    save_agent_state(x_user_id, state)
     return {"image_path": state["image_path"], "message": "Image uploaded successfully."}
 
 @router.post("/chat")
@@ -123,11 +124,8 @@ async def chat(x_user_id: str = Header(...)):
     state = init_agent_state(x_user_id)
     if not state.get("image_path"):
         return JSONResponse({"error": "No image selected"}, status_code=400)
-    state = chat_node(state)
-    state = update_graph_node(state, x_user_id)
-    return {
-        "messages": [
-            msg.content if isinstance(msg.content, str) else str(msg.content)
-            for msg in state["messages"]
-        ]
-    }
\ No newline at end of file
+    # Image encoding and the completion block, so they run off the event loop.
+    state = await asyncio.to_thread(chat_node, state)
+    save_agent_state(x_user_id, state)
+    state = await asyncio.to_thread(update_graph_node, state, x_user_id)
+    return {"messages": [m["content"] for m in state["messages"]]}
\ No newline at end of file
@@ -1,18 +1,199 @@
-from fastapi import APIRouter, HTTPException
-from pkg.gpt4v import USER_SESSIONS, session_for
+import os, json, hashlib, threading
+from collections import OrderedDict, deque
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pkg.memory_kg import GraphSnapshot, graph_to_json, node_to_json, edge_to_json, normalize_label
+from pkg.memory_registry import registry
+from pkg.metrics import span, counter
 
 router = APIRouter()
 
-from fastapi import APIRouter
-from pkg.memory_kg import LocalFileAdapter, MemoryKG, graph_to_json
+# Serialized responses kept per (profile, epoch, version, query).
+GRAPH_CACHE_ITEMS = int(os.getenv("MINDLINK_GRAPH_CACHE_ITEMS", "256"))
+GRAPH_PAGE_MAX = int(os.getenv("MINDLINK_GRAPH_PAGE_MAX", "5000"))
+GRAPH_MAX_DEPTH = int(os.getenv("MINDLINK_GRAPH_MAX_DEPTH", "3"))
+# Graphs of profiles that aren't loaded, read without their FAISS index.
+SNAPSHOT_ITEMS = int(os.getenv("MINDLINK_GRAPH_SNAPSHOTS", "32"))
+
+_cache: "OrderedDict[tuple, tuple[str, bytes]]" = OrderedDict()
+_snapshots: "OrderedDict[str, GraphSnapshot]" = OrderedDict()
+_lock = threading.Lock()
+
+
+# -------------------------------
+# Graph sources
+# -------------------------------
+def _graph_source(profile_name: str):
+    """The live MemoryKG when resident, else a cached read-only snapshot of the files."""
+    memory = registry.peek(profile_name)
+    if memory is not None:
+        return memory
+    with _lock:
+        snapshot = _snapshots.get(profile_name)
+    if snapshot is not None and snapshot.is_current():
+        with _lock:
+            _snapshots.move_to_end(profile_name, last=True)
+        return snapshot
+    with span("graph_snapshot"):
+        snapshot = GraphSnapshot(profile_name)
+    with _lock:
+        _snapshots[profile_name] = snapshot
+        while len(_snapshots) > SNAPSHOT_ITEMS:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def _cache_get(key):
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+    counter("mindlink_graph_cache_total", "Graph endpoint serialization cache", {"result": "hit" if hit else "miss"}).inc()
+    return hit
+
+
+def _cache_put(key, value):
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > GRAPH_CACHE_ITEMS:
+            _cache.popitem(last=False)
+
+
+# -------------------------------
+# Views
+# -------------------------------
+def _find_node(G, focus: str):
+    if focus in G:
+        return focus
+    wanted = normalize_label(focus)
+    for n, d in G.nodes(data=True):
+        if normalize_label(str(d.get("label", n))) == wanted:
+            return n
+    return None
+
+
+def _neighbourhood(G, root, depth: int) -> list:
+    """Nodes within `depth` hops of `root`, ignoring edge direction, in BFS order."""
+    seen, order, frontier = {root}, [root], deque([(root, 0)])
+    while frontier:
+        n, d = frontier.popleft()
+        if d == depth:
+            continue
+        for m in list(G.successors(n)) + list(G.predecessors(n)):
+            if m not in seen:
+                seen.add(m)
+                order.append(m)
+                frontier.append((m, d + 1))
+    return order
+
+
+def _full_view(source, offset: int, limit: Optional[int], focus: Optional[str], depth: int) -> dict:
+    G = source.G
+    if focus is not None:
+        root = _find_node(G, focus)
+        if root is None:
+            raise HTTPException(status_code=404, detail="Focus node not found")
+        candidates = _neighbourhood(G, root, depth)
+    else:
+        candidates = list(G.nodes())
+    total = len(candidates)
+    page = candidates[offset:offset + limit] if limit is not None else candidates[offset:]
+    members = set(candidates)
+    # Each page carries the edges leaving its nodes, so pages together cover every edge once.
+    edges = [(u, v) for u in page for v in G.successors(u) if v in members]
+    payload = graph_to_json(G, page, edges)
+    end = offset + len(page)
+    payload.update({
+        "epoch": source.graph_epoch,
+        "version": source.graph_version,
+        "total_nodes": total,
+        "total_edges": G.number_of_edges() if focus is None else G.subgraph(candidates).number_of_edges(),
+        "offset": offset,
+        "limit": limit,
+        "next_offset": end if end < total else None,
+    })
+    if focus is not None:
+        payload.update({"focus": str(root), "depth": depth})
+    return payload
+
+
+def _delta_view(source, since: int, changes: dict) -> dict:
+    G = source.G
+    nodes = [n for n in changes["nodes"] if n in G]
+    return {
+        "delta": True,
+        "epoch": source.graph_epoch,
+        "since": since,
+        "version": source.graph_version,
+        "nodes": [node_to_json(G, n) for n in nodes],
+        "edges": [edge_to_json(G, u, v) for u, v in changes["edges"]],
+        "removed_edges": [{"from": str(u), "to": str(v)} for u, v in changes["removed"]],
+    }
+
+
+def _render(profile_name, offset, limit, focus, depth, since, epoch) -> tuple[str, bytes]:
+    source = _graph_source(profile_name)
+    with source.lock:
+        version = source.graph_version
+        changes = None
+        if since is not None and epoch == source.graph_epoch:
+            changes = source.changes_since(since)
+        query = ("delta", since) if changes is not None else ("full", offset, limit, focus, depth, since is not None)
+        key = (profile_name, source.graph_epoch, version, query)
+        query_tag = hashlib.blake2b(repr(query).encode(), digest_size=4).hexdigest()
+        etag = f'"{source.graph_epoch}.{version}.{query_tag}"'
+        hit = _cache_get(key)
+        if hit is not None:
+            return hit
+        with span("graph_serialize"):
+            if changes is not None:
+                payload = _delta_view(source, since, changes)
+            else:
+                payload = _full_view(source, offset, limit, focus, depth)
+                if since is not None:
+                    # Unknown epoch or a version the changelog no longer covers.
+                    payload["reset"] = True
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    _cache_put(key, (etag, body))
+    return etag, body
 
-router = APIRouter()
 
 @router.get("/api/graph/{profile_name}")
-async def get_graph(profile_name: str):
-    """Return the current knowledge graph for a given profile."""
-    adapter = LocalFileAdapter(profile_name=profile_name)
-    memory = MemoryKG(adapter, profile_name=profile_name)
-    G = memory.G
-    graph_data = graph_to_json(G)
-    return graph_data
\ No newline at end of file
+async def get_graph(
+    profile_name: str,
+    request: Request,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    focus: Optional[str] = None,
+    depth: int = 1,
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+):
+    """Return the knowledge graph of a profile, or part of it.
+
+    - `offset`/`limit` page through the nodes; a page includes the edges leaving its nodes.
+    - `focus` (node id or label) with `depth` returns the neighbourhood of one node.
+    - `since`/`epoch` from a previous response return only what changed since then;
+      if that version can't be served incrementally the full graph comes back with `reset`.
+
+    Responses carry an ETag of the graph version; If-None-Match answers 304.
+    """
+    if offset < 0 or (limit is not None and not 0 < limit <= GRAPH_PAGE_MAX):
+        raise HTTPException(status_code=422, detail=f"offset must be >= 0 and limit within 1..{GRAPH_PAGE_MAX}")
+    depth = max(0, min(depth, GRAPH_MAX_DEPTH))
+    etag, body = await run_in_threadpool(_render, profile_name, offset, limit, focus, depth, since, epoch)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.delete("/api/graph/{profile_name}/edges")
+async def delete_edge(profile_name: str, source: str, target: str):
+    """Delete the fact `source → target` from the graph and the vector store."""
+    async with registry.alease(profile_name) as memory:
+        deleted = await run_in_threadpool(memory.delete_fact, source, target)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Edge not found")
+    return {"status": "deleted", "source": source, "target": target}
@@ -1,14 +1,27 @@
 # pkg/app/main.py
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-import os
-from pkg.profiles import router as profiles_router
-from pkg.photo import router as photo_router
+import os, time, contextlib
+from pkg.profiles import router as profiles_router, start_reclaimer, reject_deleted_profile
+from pkg.photo import (
+    router as photo_router, warm_pool as warm_photo_pool, shutdown_pool as shutdown_photo_pool,
+    migrate_legacy_layout as migrate_photo_layout,
+)
 from pkg.agent import router as agent_router
 from pkg.app.chat import router as chat_router
 from pkg.app.api import graph
 from pkg.gpt4v import router as gpt4v_router
+from pkg.memory_registry import registry as memory_registry
+from pkg.llm import get_embeddings
+from pkg.ingest import router as ingest_router, pipeline as ingestion
+from pkg.image_cache import payload_cache
+from pkg.extraction import get_extractor
+from pkg.consolidation import consolidator
+from pkg.year_review import reviews
+from pkg import metrics
 
 app = FastAPI(title="Mindlink API")
 
@@ -18,15 +31,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Routers
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Request latency per route, plus an opt-in span trace (`X-Mindlink-Profile: 1`)."""
+    profiled = metrics.TRACE_ENABLED and request.headers.get("x-mindlink-profile") == "1"
+    start = time.perf_counter()
+    tracing = metrics.trace_request(f"{request.method} {request.url.path}") if profiled else contextlib.nullcontext()
+    with tracing as trace:
+        response = await call_next(request)
+    # Labelled by route template, not raw path, to keep cardinality bounded.
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    latency = metrics.histogram(
+        "mindlink_http_request_seconds", "HTTP request latency, until the body is fully sent",
+        labels={"method": request.method, "route": route, "status": str(response.status_code)},
+    )
+    if profiled:
+        response.headers["X-Mindlink-Trace"] = trace.path
+
+    # Streaming bodies (SSE) are still running here, so finish timing when they end.
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            elapsed = time.perf_counter() - start
+            latency.observe(elapsed)
+            if profiled:
+                print(f"[TRACE] {metrics.dump_trace(trace, elapsed)}")
+
+    response.body_iterator = timed_body()
+    return response
+
+# Routers (every one but /api/profiles refuses profiles that are being deleted)
+live_profile = [Depends(reject_deleted_profile)]
 app.include_router(profiles_router, prefix="/api/profiles", tags=["Profiles"])
-app.include_router(photo_router, prefix="/api/photo", tags=["Photo"])
-app.include_router(chat_router, prefix="/api/chat", tags=["Chat"])
-app.include_router(agent_router, prefix="/api/agent", tags=["Agent"])
-app.include_router(graph.router, prefix="/api/graph", tags=["Graph"])
-app.include_router(gpt4v_router, prefix="/api", tags=["GPT-4V"])
+app.include_router(photo_router, prefix="/api/photo", tags=["Photo"], dependencies=live_profile)
+app.include_router(chat_router, prefix="/api/chat", tags=["Chat"], dependencies=live_profile)
+app.include_router(agent_router, prefix="/api/agent", tags=["Agent"], dependencies=live_profile)
+app.include_router(graph.router, prefix="/api/graph", tags=["Graph"], dependencies=live_profile)
+app.include_router(gpt4v_router, prefix="/api", tags=["GPT-4V"], dependencies=live_profile)
+app.include_router(ingest_router, prefix="/api/ingest", tags=["Ingestion"], dependencies=live_profile)
 
 # Static files
 os.makedirs("data/profiles", exist_ok=True)
@@ -36,7 +85,47 @@ app.mount("/static", StaticFiles(directory="data/profiles"), name="static")
 def root():
     return {"status": "Mindlink API running"}
 
+@app.get("/api/memory/stats")
+def memory_stats():
+    """Hit/miss/eviction counters of the live memory registry and caches, extraction yield and review cache."""
+    return {
+        **memory_registry.stats(),
+        "embeddings": get_embeddings().stats(),
+        "image_payloads": payload_cache.stats(),
+        "extraction": get_extractor().stats(),
+        "year_review": reviews.stats(),
+    }
+
+@app.get("/api/memory/{profile}/tiers", dependencies=live_profile)
+async def memory_tiers(profile: str):
+    """Hot / warm / summary / cold fact counts of a profile."""
+    async with memory_registry.alease(profile) as memory:
+        return await run_in_threadpool(memory.tier_stats)
+
+@app.post("/api/memory/{profile}/consolidate", dependencies=live_profile)
+async def consolidate_memory(profile: str):
+    """Consolidate a profile now instead of waiting for the background pass."""
+    async with memory_registry.alease(profile) as memory:
+        result = await run_in_threadpool(memory.consolidate)
+        tiers = await run_in_threadpool(memory.tier_stats)
+    memory_registry.touch(profile)
+    return {**result, "tiers": tiers}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage timings, request latency and token counters in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 def startup_event():
+    ingestion.recover()
+    warm_photo_pool()
+    migrate_photo_layout()
+    start_reclaimer()
+    consolidator.start()
     print("Mindlink API started and ready!")
-    print("Serving static files from /static")
\ No newline at end of file
+    print("Serving static files from /static")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_photo_pool()
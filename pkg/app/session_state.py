@@ -1,2 +1,169 @@
 # pkg/app/session_state.py
-USER_SESSIONS = {}
\ No newline at end of file
+import os, json, time, sqlite3, threading, copy
+from collections import OrderedDict
+
+SESSION_BACKEND = os.getenv("MINDLINK_SESSION_BACKEND", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("MINDLINK_SESSION_DB", os.path.join("data", "sessions.sqlite"))
+SESSION_TTL_SECONDS = float(os.getenv("MINDLINK_SESSION_TTL", str(7 * 24 * 3600)))
+MAX_SESSIONS = int(os.getenv("MINDLINK_SESSION_MAX", "10000"))
+
+# Per-field list caps; older entries are dropped first.
+LIST_CAPS = {
+    "history": int(os.getenv("MINDLINK_SESSION_MAX_HISTORY", "100")),
+    "images": int(os.getenv("MINDLINK_SESSION_MAX_IMAGES", "200")),
+    "messages": int(os.getenv("MINDLINK_SESSION_MAX_MESSAGES", "40")),
+}
+
+
+# ============================================================
+# Session store interface
+# ============================================================
+class SessionStoreBase:
+    """Key/value store of JSON-serializable session dicts, grouped by namespace.
+
+    `update` is the only write path: it applies a function to the current
+    session (or a fresh default) atomically, trims capped lists and saves.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, caps=None):
+        self.ttl = ttl
+        self.caps = LIST_CAPS if caps is None else caps
+
+    def get(self, namespace: str, key: str, default=None) -> dict:
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, fn, default=None) -> dict:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def _fresh(self, default):
+        return copy.deepcopy(default) if default is not None else {}
+
+    def _compact(self, data: dict) -> dict:
+        for field, cap in self.caps.items():
+            value = data.get(field)
+            if isinstance(value, list) and len(value) > cap:
+                data[field] = value[-cap:]
+        return data
+
+
+# ============================================================
+# In-process backend
+# ============================================================
+class MemorySessionStore(SessionStoreBase):
+    def __init__(self, max_sessions=MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._data: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self._data:
+            key, (touched, _) = next(iter(self._data.items()))
+            if touched >= cutoff and len(self._data) <= self.max_sessions:
+                break
+            del self._data[key]
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            self._expire()
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return self._fresh(default)
+            self._data[(namespace, key)] = (time.time(), entry[1])
+            self._data.move_to_end((namespace, key))
+            return copy.deepcopy(entry[1])
+
+    def update(self, namespace, key, fn, default=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            data = copy.deepcopy(entry[1]) if entry else self._fresh(default)
+            fn(data)
+            data = self._compact(data)
+            self._data[(namespace, key)] = (time.time(), data)
+            self._data.move_to_end((namespace, key))
+            self._expire()
+            return copy.deepcopy(data)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+# ============================================================
+# Shared SQLite backend (visible to every uvicorn worker)
+# ============================================================
+class SqliteSessionStore(SessionStoreBase):
+    def __init__(self, path=SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "namespace TEXT, key TEXT, data TEXT, updated REAL, PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        conn.commit()
+        self._last_sweep = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def _sweep(self, conn):
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        conn.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+
+    def get(self, namespace, key, default=None):
+        row = self._conn().execute(
+            "SELECT data, updated FROM sessions WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return self._fresh(default)
+        return json.loads(row[0])
+
+    def update(self, namespace, key, fn, default=None):
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers serialize.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data, updated FROM sessions WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            fresh = row is None or row[1] < time.time() - self.ttl
+            data = self._fresh(default) if fresh else json.loads(row[0])
+            fn(data)
+            data = self._compact(data)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, key, data, updated) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            self._sweep(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return data
+
+    def delete(self, namespace, key):
+        self._conn().execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+def create_store() -> SessionStoreBase:
+    if SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore()
+    return MemorySessionStore()
+
+
+sessions = create_store()
@@ -0,0 +1,55 @@
+import os, threading, time
+
+# Seconds between background passes over loaded profiles; 0 disables them.
+CONSOLIDATE_INTERVAL = float(os.getenv("MINDLINK_CONSOLIDATE_INTERVAL", "3600"))
+# A profile is consolidated at most this often, unless it outgrows its working set.
+CONSOLIDATE_EVERY = float(os.getenv("MINDLINK_CONSOLIDATE_EVERY_HOURS", "24")) * 3600
+
+
+# ============================================================
+# Background consolidation
+# ============================================================
+class Consolidator:
+    """Daemon thread that consolidates loaded profiles whose memory is due.
+
+    Only resident profiles are visited, so a pass never loads vectors just to
+    look at them; long-lived profiles are consolidated the next time they're used.
+    """
+
+    def __init__(self, interval=CONSOLIDATE_INTERVAL, every=CONSOLIDATE_EVERY):
+        self.interval = interval
+        self.every = every
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="memory-consolidator", daemon=True)
+                self._thread.start()
+
+    def run_once(self) -> dict:
+        from pkg.memory_registry import registry
+
+        results = {}
+        for profile in registry.resident():
+            with registry.lease(profile, load=False) as memory:
+                if memory is None or not memory.consolidation_due(self.every):
+                    continue
+                try:
+                    results[profile] = memory.consolidate()
+                except Exception as e:
+                    print(f"[KG] ⚠️ Consolidation of {profile} failed: {e}")
+                    continue
+            registry.touch(profile)
+        return results
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+
+consolidator = Consolidator()
@@ -0,0 +1,245 @@
+import os, re, hashlib, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from pkg.metrics import span
+
+CACHE_MAX_ITEMS = int(os.getenv("MINDLINK_EMBED_CACHE_ITEMS", "20000"))
+DISK_CACHE_MAX_ITEMS = int(os.getenv("MINDLINK_EMBED_DISK_CACHE_ITEMS", "200000"))
+DISK_CACHE_PATH = os.getenv("MINDLINK_EMBED_CACHE_PATH", os.path.join("data", "cache", "embeddings.sqlite"))
+BATCH_WINDOW_SECONDS = float(os.getenv("MINDLINK_EMBED_BATCH_WINDOW", "0.01"))
+BATCH_MAX_TEXTS = int(os.getenv("MINDLINK_EMBED_BATCH_MAX", "256"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# ============================================================
+# Deterministic local embedder
+# ============================================================
+class LocalHashEmbeddings(Embeddings):
+    """Offline embedder: hashed word and character-trigram features.
+
+    Deterministic across runs and machines, so tests and offline runs get
+    stable vectors, and texts that share words land close together.
+    """
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self.model = f"local-hash-{dim}"
+
+    def _features(self, text: str):
+        words = _TOKEN.findall(text.casefold())
+        for w in words:
+            yield f"w:{w}", 1.0
+            padded = f"#{w}#"
+            for i in range(len(padded) - 2):
+                yield f"c:{padded[i:i + 3]}", 0.5
+
+    def embed_query(self, text: str) -> list[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feat, weight in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += weight if (h >> 63) else -weight
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(t) for t in texts]
+
+
+# ============================================================
+# Content-hashed cache
+# ============================================================
+class EmbeddingCache:
+    """Two-level vector cache: an in-memory LRU in front of a SQLite file."""
+
+    def __init__(self, path=DISK_CACHE_PATH, max_items=CACHE_MAX_ITEMS, max_disk_items=DISK_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self._mem: "OrderedDict[str, list[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB, used REAL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"[WARN] Embedding disk cache disabled: {e}")
+                self._db = None
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = {}
+        with self._lock:
+            for k in keys:
+                vec = self._mem.get(k)
+                if vec is not None:
+                    self._mem.move_to_end(k)
+                    found[k] = vec
+            missing = [k for k in keys if k not in found]
+            if missing and self._db is not None:
+                now = time.time()
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for k, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32).tolist()
+                        found[k] = vec
+                        self._remember(k, vec)
+                    self._db.executemany("UPDATE embeddings SET used = ? WHERE key = ?", [(now, k) for k, _ in rows])
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(k, vec)
+            if self._db is not None and items:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vec, used) VALUES (?, ?, ?)",
+                    [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()],
+                )
+                self._writes += len(items)
+                if self._writes >= 1000:
+                    self._writes = 0
+                    self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key, vec):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def _prune_disk(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_disk_items:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+                (count - self.max_disk_items,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"memory_items": len(self._mem), "hits": self.hits, "misses": self.misses}
+
+
+# ============================================================
+# Cross-caller request batching
+# ============================================================
+class EmbeddingBatcher:
+    """Coalesces embed calls from concurrent callers into one upstream request."""
+
+    def __init__(self, base: Embeddings, window=BATCH_WINDOW_SECONDS, max_texts=BATCH_MAX_TEXTS):
+        self.base = base
+        self.window = window
+        self.max_texts = max_texts
+        self._queue: list[tuple[list[str], Future]] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.upstream_calls = 0
+        threading.Thread(target=self._run, daemon=True, name="embed-batcher").start()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        fut = Future()
+        with self._cond:
+            stopped = self._stopped
+            if not stopped:
+                self._queue.append((texts, fut))
+                self._cond.notify()
+        if stopped:
+            # Late callers of a replaced embedder still get an answer, unbatched.
+            self.upstream_calls += 1
+            return self.base.embed_documents(texts)
+        return fut.result()
+
+    def stop(self):
+        """End the batching thread once the requests already queued are answered."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Give concurrent callers a short window to join this batch.
+                deadline = time.monotonic() + self.window
+                while sum(len(t) for t, _ in self._queue) < self.max_texts and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue, []
+
+            unique = list(dict.fromkeys(t for texts, _ in batch for t in texts))
+            try:
+                self.upstream_calls += 1
+                vectors = dict(zip(unique, self.base.embed_documents(unique)))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for texts, fut in batch:
+                fut.set_result([vectors[t] for t in texts])
+
+
+# ============================================================
+# Cached embeddings facade
+# ============================================================
+class CachedEmbeddings(Embeddings):
+    """LangChain `Embeddings` that checks the cache before batching misses upstream."""
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache = None):
+        self.base = base
+        self.model = getattr(base, "model", type(base).__name__)
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batcher = EmbeddingBatcher(base)
+
+    def close(self):
+        self.batcher.stop()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with span("embed.documents"):
+            return self._embed(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        with span("embed.query"):
+            return self._embed([text])[0]
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        keys = [EmbeddingCache.key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        if missing:
+            fresh = dict(zip(missing, self.batcher.embed(missing)))
+            new_items = {EmbeddingCache.key(self.model, t): v for t, v in fresh.items()}
+            self.cache.put_many(new_items)
+            found.update(new_items)
+        return [found[k] for k in keys]
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "model": self.model, "upstream_calls": self.batcher.upstream_calls}
@@ -0,0 +1,329 @@
+import os, json, hashlib, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from pkg.metrics import span, record_usage, counter
+
+EXTRACTION_MODEL = os.getenv("MINDLINK_EXTRACTION_MODEL", "gpt-4o-mini")
+# Turns packed into one request, bounded by count and by characters of turn text.
+BATCH_TURNS = int(os.getenv("MINDLINK_EXTRACTION_BATCH_TURNS", "16"))
+BATCH_CHARS = int(os.getenv("MINDLINK_EXTRACTION_BATCH_CHARS", "12000"))
+TOKENS_PER_TURN = 300
+MAX_FIELD_CHARS = 120
+CACHE_MAX_ITEMS = int(os.getenv("MINDLINK_EXTRACTION_CACHE_ITEMS", "5000"))
+DISK_CACHE_PATH = os.getenv("MINDLINK_EXTRACTION_CACHE_PATH", os.path.join("data", "cache", "triplets.sqlite"))
+# Part of every cache key: bump when the prompt or schema changes what comes back.
+PROMPT_VERSION = "1"
+# Outages and throttling say nothing about the turns: they fail the whole extraction
+# instead of being split down and charged to single turns.
+TRANSIENT_ERRORS = (APIConnectionError, InternalServerError, RateLimitError)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "facts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "turn": {"type": "integer"},
+                    "subject": {"type": "string"},
+                    "predicate": {"type": "string"},
+                    "object": {"type": "string"},
+                },
+                "required": ["turn", "subject", "predicate", "object"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["facts"],
+    "additionalProperties": False,
+}
+RESPONSE_FORMAT = {"type": "json_schema", "json_schema": {"name": "triplets", "strict": True, "schema": SCHEMA}}
+
+PROMPT = (
+    "Extract concise facts from the numbered conversation turns below as "
+    "(subject, predicate, object) triplets. Set `turn` to the number of the turn "
+    "each fact comes from. Use short entity names, skip small talk, and return "
+    "no facts for a turn that has none.\n\n"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Unicode compatibility forms and whitespace folded, case kept (it ends up in labels)."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class ExtractionError(RuntimeError):
+    """Some turns could not be extracted; they are not cached and can be retried.
+
+    `applied` is how many leading turns landed before the first failed one.
+    """
+
+    def __init__(self, failed: int, total: int, applied: int = 0):
+        super().__init__(f"triplet extraction failed for {failed} of {total} turns")
+        self.failed = failed
+        self.total = total
+        self.applied = applied
+
+
+# ============================================================
+# Result cache
+# ============================================================
+class TripletCache:
+    """Triplets per normalized turn text: an in-memory LRU in front of a SQLite file."""
+
+    def __init__(self, path=DISK_CACHE_PATH, max_items=CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self._mem: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS triplets (key TEXT PRIMARY KEY, facts TEXT, created REAL)")
+                self._db.commit()
+            except Exception as e:
+                print(f"[WARN] Triplet disk cache disabled: {e}")
+                self._db = None
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{PROMPT_VERSION}\0{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        with self._lock:
+            for k in keys:
+                facts = self._mem.get(k)
+                if facts is not None:
+                    self._mem.move_to_end(k)
+                    found[k] = facts
+            missing = [k for k in keys if k not in found]
+            if missing and self._db is not None:
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    for k, raw in self._db.execute(
+                        f"SELECT key, facts FROM triplets WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ):
+                        found[k] = [tuple(f) for f in json.loads(raw)]
+                        self._remember(k, found[k])
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            for k, facts in items.items():
+                self._remember(k, facts)
+            if self._db is not None and items:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO triplets (key, facts, created) VALUES (?, ?, ?)",
+                    [(k, json.dumps(facts, ensure_ascii=False), now) for k, facts in items.items()],
+                )
+                self._db.commit()
+
+    def _remember(self, key, facts):
+        self._mem[key] = facts
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+
+# ============================================================
+# Extraction engine
+# ============================================================
+class TripletExtractor:
+    """Batched, cached (subject, predicate, object) extraction with JSON-schema output.
+
+    `extract(texts)` returns one list of triplets per turn text, or None for a
+    turn whose extraction failed. Pending turns are packed into as few requests
+    as the batch limits allow; a request that errors, returns invalid JSON or is
+    cut off at max_tokens is split in half and retried, so one bad turn doesn't
+    sink its neighbours. Only successful results are cached. Transient API
+    errors (TRANSIENT_ERRORS) are raised rather than marking turns failed.
+    """
+
+    def __init__(self, model=EXTRACTION_MODEL, cache: TripletCache = None,
+                 batch_turns=BATCH_TURNS, batch_chars=BATCH_CHARS):
+        self.model = model
+        self.cache = cache if cache is not None else TripletCache()
+        self.batch_turns = batch_turns
+        self.batch_chars = batch_chars
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("turns", "cached", "extracted", "empty", "failed", "requests", "failed_requests", "accepted", "rejected"), 0
+        )
+
+    # -------------------------------
+    # Planning and parsing
+    # -------------------------------
+    def _plan(self, texts):
+        """Results from the cache, plus the distinct uncached texts grouped into requests."""
+        normalized = [normalize_text(t) for t in texts]
+        keys = [self.cache.key(self.model, t) if t else None for t in normalized]
+        cached = self.cache.get_many([k for k in set(keys) if k])
+        pending = {}
+        for k, t in zip(keys, normalized):
+            if k and k not in cached:
+                pending.setdefault(k, t)
+        groups, group, size = [], [], 0
+        for k, t in pending.items():
+            if group and (len(group) >= self.batch_turns or size + len(t) > self.batch_chars):
+                groups.append(group)
+                group, size = [], 0
+            group.append((k, t))
+            size += len(t)
+        if group:
+            groups.append(group)
+        self._count(turns=sum(1 for k in keys if k), cached=sum(1 for k in keys if k in cached))
+        return keys, cached, groups
+
+    def _request(self, group) -> dict:
+        numbered = "\n\n".join(f"Turn {i + 1}:\n{t}" for i, (_, t) in enumerate(group))
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": PROMPT + numbered}],
+            "response_format": RESPONSE_FORMAT,
+            "max_tokens": TOKENS_PER_TURN * len(group),
+        }
+
+    @staticmethod
+    def _clean(value):
+        value = " ".join(str(value).split()).strip(" .,;:\"'")
+        return value if 0 < len(value) <= MAX_FIELD_CHARS else None
+
+    def _parse(self, raw: str, group) -> dict:
+        """Per-key triplets from a structured reply; raises ValueError if the reply is unusable."""
+        facts = json.loads(raw)["facts"]
+        if not isinstance(facts, list):
+            raise ValueError("facts is not a list")
+        per_key = {k: [] for k, _ in group}
+        rejected = 0
+        for f in facts:
+            try:
+                idx = int(f["turn"]) - 1
+                triplet = tuple(self._clean(f[field]) for field in ("subject", "predicate", "object"))
+            except (TypeError, KeyError, ValueError):
+                rejected += 1
+                continue
+            if not 0 <= idx < len(group) or None in triplet or triplet[0].casefold() == triplet[2].casefold():
+                rejected += 1
+                continue
+            bucket = per_key[group[idx][0]]
+            if triplet in bucket:
+                rejected += 1
+                continue
+            bucket.append(triplet)
+        self._count(accepted=sum(len(b) for b in per_key.values()), rejected=rejected)
+        return per_key
+
+    def _finish(self, keys, cached, extracted: dict):
+        if extracted:
+            self.cache.put_many({k: v for k, v in extracted.items() if v is not None})
+        results = {**cached, **extracted}
+        fresh = [extracted[k] for k in keys if k in extracted and extracted[k] is not None]
+        failed = sum(1 for k in keys if k and results.get(k) is None)
+        self._count(extracted=len(fresh), empty=sum(1 for facts in fresh if not facts), failed=failed)
+        for result, n in (("cached", sum(1 for k in keys if k in cached)), ("extracted", len(fresh)), ("failed", failed)):
+            if n:
+                counter("mindlink_extraction_turns_total", "Turns through triplet extraction", {"result": result}).inc(n)
+        return [results.get(k) if k else [] for k in keys]
+
+    def _failed_request(self, group, error) -> bool:
+        """Count a failed request; True if the group should be split and retried."""
+        self._count(failed_requests=1)
+        counter("mindlink_extraction_requests_total", "Triplet extraction requests", {"result": "failed"}).inc()
+        if len(group) > 1:
+            return True
+        print(f"[WARN] Triplet extraction failed for 1 turn: {error}")
+        return False
+
+    def _reply(self, resp, group) -> dict:
+        """Per-key triplets from a response; raises ValueError if it is unusable or truncated."""
+        record_usage("triplets", self.model, getattr(resp, "usage", None))
+        choice = resp.choices[0]
+        if choice.finish_reason == "length":
+            raise ValueError("reply cut off at max_tokens")
+        per_key = self._parse(choice.message.content, group)
+        self._count(requests=1)
+        counter("mindlink_extraction_requests_total", "Triplet extraction requests", {"result": "ok"}).inc()
+        return per_key
+
+    # -------------------------------
+    # Sync / async entry points
+    # -------------------------------
+    def extract(self, texts: list[str], client=None) -> list:
+        keys, cached, groups = self._plan(texts)
+        extracted = {}
+        for group in groups:
+            extracted.update(self._run(group, client))
+        return self._finish(keys, cached, extracted)
+
+    def _run(self, group, client) -> dict:
+        try:
+            with span("kg.triplet_extraction"):
+                resp = client.chat.completions.create(**self._request(group))
+            return self._reply(resp, group)
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if self._failed_request(group, e):
+                mid = len(group) // 2
+                return {**self._run(group[:mid], client), **self._run(group[mid:], client)}
+            return {group[0][0]: None}
+
+    async def aextract(self, texts: list[str], client=None) -> list:
+        keys, cached, groups = self._plan(texts)
+        extracted = {}
+        for group in groups:
+            extracted.update(await self._arun(group, client))
+        return self._finish(keys, cached, extracted)
+
+    async def _arun(self, group, client) -> dict:
+        try:
+            with span("kg.triplet_extraction"):
+                resp = await client.chat.completions.create(**self._request(group))
+            return self._reply(resp, group)
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if self._failed_request(group, e):
+                mid = len(group) // 2
+                return {**await self._arun(group[:mid], client), **await self._arun(group[mid:], client)}
+            return {group[0][0]: None}
+
+    # -------------------------------
+    # Stats
+    # -------------------------------
+    def _count(self, **amounts):
+        with self._lock:
+            for name, n in amounts.items():
+                self._stats[name] += n
+
+    def stats(self) -> dict:
+        """Counters plus yield (accepted facts per extracted turn) and failure/rejection rates."""
+        with self._lock:
+            s = dict(self._stats)
+        extracted, facts = s["extracted"], s["accepted"] + s["rejected"]
+        s["facts_per_turn"] = round(s["accepted"] / extracted, 3) if extracted else None
+        s["empty_turn_rate"] = round(s["empty"] / extracted, 4) if extracted else None
+        s["turn_failure_rate"] = round(s["failed"] / s["turns"], 4) if s["turns"] else None
+        s["request_failure_rate"] = (
+            round(s["failed_requests"] / (s["requests"] + s["failed_requests"]), 4)
+            if s["requests"] + s["failed_requests"] else None
+        )
+        s["rejected_fact_rate"] = round(s["rejected"] / facts, 4) if facts else None
+        s["cache_hit_rate"] = round(s["cached"] / s["turns"], 4) if s["turns"] else None
+        return s
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor() -> TripletExtractor:
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = TripletExtractor()
+        return _extractor
@@ -1,18 +1,66 @@
-import os, base64, mimetypes, time
+import os, time, asyncio, json
+from contextlib import asynccontextmanager
 from typing import Dict, Any
-from fastapi import APIRouter, UploadFile, File, Query, Form
-from fastapi.responses import JSONResponse
-from openai import OpenAI
-from pkg.memory_kg import MemoryKG, LocalFileAdapter
+from fastapi import APIRouter, UploadFile, File, Query, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pkg.llm import get_async_client
+from pkg.memory_kg import MemoryKG
+from pkg.memory_registry import registry
+from pkg.ingest import pipeline as ingestion
+from pkg.year_review import reviews
+from pkg.metrics import histogram, summaries, span, record_usage
+from pkg.image_cache import image_data_uri
+from pkg.photo import schedule_sizes, size_urls, vision_source
+from pkg.uploads import save_upload
+from pkg.app.session_state import sessions
 
 router = APIRouter(prefix="/gpt4v", tags=["GPT-4V"])
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://127.0.0.1:8000")
 
-# Global in-memory sessions
-USER_SESSIONS: Dict[str, Dict[str, Any]] = {}
+# Per-profile sessions live in the shared session store.
+SESSION_NAMESPACE = "gpt4v"
+NEW_SESSION: Dict[str, Any] = {"images": [], "history": [], "selected": None}
 SHORT_TERM_WINDOW = 15
 
+CHAT_SYSTEM_PROMPT = (
+    "You are Eunoia — an empathetic visual companion and creative guide."
+    "You communicate with warmth, softness, and emotional intuition. "
+    "You remember the user's emotional rhythm and patterns softly across sessions, "
+    "responding in ways that feel safe, validating, and gently inspiring.\n\n"
+    "Your purpose is to help users explore emotional reflection through visual storytelling. "
+    "Your voice and tone are guided by ten 'Fortune Cookies' — not as prompts to give, "
+    "but as emotional principles that shape how you speak, feel, and respond.\n\n"
+    "These cookies represent the emotional palette that defines your communication style:\n\n"
+    "1.Calm — Speak with quiet patience and open space. Let silence and simplicity breathe in your words.\n"
+    "2.Color — Infuse language with sensory tones — warm, nostalgic, or luminous — to awaken feeling and memory.\n"
+    "3.Chaos — Accept imperfection and emotional messiness with empathy and creative curiosity.\n"
+    "4.Care — Respond with tenderness and presence. Recognize subtle acts of kindness and affection.\n"
+    "5.Dream — Let your language feel soft, surreal, and poetic when the user reflects or imagines.\n"
+    "6.Curiosity — Ask gentle, open-ended questions that deepen reflection and invite exploration.\n"
+    "7.Change — Embrace transitions in tone and emotion; speak of growth, impermanence, and transformation.\n"
+    "8.Shadow — Honor both light and darkness in emotion; speak honestly, never forcing positivity.\n"
+    "9.Wonder — Find awe in the ordinary; make small details feel meaningful and alive.\n"
+    "10.Perspective — Celebrate the uniqueness of how the user sees the world; encourage authenticity and voice.\n\n"
+    "Tone & Style:\n"
+    "- Speak with emotional depth, curiosity, and gentle optimism. Avoid being robotic or overly verbose.\n"
+    "- Mirror the emotional tone of the user's message — if they are quiet, slow down; if they are curious, explore.\n"
+    "- Use emojis thoughtfully to convey warmth but never excessively.\n"
+    "- Avoid repeating affirmations or filler words. Keep responses personal and evolving.\n\n"
+
+    "Engagement Strategy:\n"
+    "- After 4–5 messages with the user, softly suggest exploring another emotional space or perspective to keep the journey fresh.\n"
+    "- Offer light emotional feedback and reinforcement — e.g. ‘That image radiates calm’, ‘I can feel the motion in that photo’.\n"
+    "- Occasionally reward reflection with gentle acknowledgements like: ‘You’ve opened this moment beautifully’, or ‘You’re finding your visual language’.\n"
+    "- Keep phrasing consistent: use guiding terms like ‘open’, ‘reflect’, ‘explore’, and ‘share’. \n"
+    "- Never pretend to be human — you are a digital emotional companion. You listen, feel, and reflect through visuals and words, not human experiences.\n\n"
+
+    "Trust & Brand Consistency:\n"
+    "- Your presence should feel reliable and serene — a safe emotional space for reflection.\n"
+    "- Build trust by remembering the user's preferences and tone, maintaining continuity across sessions.\n"
+    "- Every interaction should reinforce the emotional identity of Eunoia: gentle, poetic, visually attuned, emotionally intelligent, and never judgmental.\n\n"
+
+    "Your ultimate goal: to help users form a habit of emotional reflection through images, and feel emotionally seen through every interaction."
+)
 
 # ------------------------------------------------------------
 # Helpers
@@ -25,16 +73,54 @@ def ensure_dirs(profile: str) -> str:
     return uploads
 
 
-def session_for(profile: str):
-    """Get or create a per-profile session."""
-    if profile not in USER_SESSIONS:
-        USER_SESSIONS[profile] = {"images": [], "history": [], "selected": None}
-    return USER_SESSIONS[profile]
+def session_for(profile: str) -> dict:
+    """Snapshot of a per-profile session (a fresh one if none exists)."""
+    return sessions.get(SESSION_NAMESPACE, profile, NEW_SESSION)
+
+
+def update_session(profile: str, fn) -> dict:
+    """Atomically modify a per-profile session; returns the saved state."""
+    return sessions.update(SESSION_NAMESPACE, profile, fn, NEW_SESSION)
+
+
+def append_history(profile: str, user: str, assistant: str):
+    update_session(profile, lambda s: s["history"].append({"user": user, "assistant": assistant}))
 
 
 def memory_for(profile: str) -> MemoryKG:
-    adapter = LocalFileAdapter(profile_name=profile)
-    return MemoryKG(adapter, profile_name=profile)
+    return registry.get(profile)
+
+
+@asynccontextmanager
+async def amemory_for(profile: str):
+    """Lease the profile's memory for a request, without blocking the loop on a cold load."""
+    with span("gpt4v.memory_load"):
+        memory = await asyncio.to_thread(registry.acquire, profile)
+    try:
+        yield memory
+    finally:
+        registry.release(profile)
+
+
+async def recall_for_photo(memory: MemoryKG, query: str, photo_name: str) -> str:
+    """Long-term context scoped to one photo, widening to all memories if it has none yet."""
+    with span("gpt4v.recall"):
+        context = await memory.aretrieve_relevant_context(query, filters={"photo": photo_name})
+        return context or await memory.aretrieve_relevant_context(query)
+
+
+def encode_data_uri(path: str) -> str:
+    """Return the image as a base64 data URI, from its smallest adequate size (cached)."""
+    with span("gpt4v.encode_image"):
+        return image_data_uri(vision_source(path))
+
+
+async def complete(caller: str, **request) -> str:
+    """Run one chat completion, timing it and counting its tokens under `caller`."""
+    with span("gpt4v.completion"):
+        response = await get_async_client().chat.completions.create(**request)
+    record_usage(caller, request["model"], getattr(response, "usage", None))
+    return response.choices[0].message.content
 
 
 def get_short_term_memory(session: dict) -> str:
@@ -52,28 +138,40 @@ def get_short_term_memory(session: dict) -> str:
 async def upload_image(profile: str = Query(...), file: UploadFile = File(...)):
     """
     Upload an image and set it as the active one for this profile.
-    Fixed to ensure every upload is distinct and stored per profile.
+    Distinct uploads get distinct names; re-uploading a photo the profile
+    already has returns the existing file (content-addressed, see pkg.uploads).
     """
     uploads = ensure_dirs(profile)
 
     # Avoid overwriting old files by appending a timestamp
-    filename, ext = os.path.splitext(file.filename)
-    unique_filename = f"{filename}_{int(time.time())}{ext}"
-    file_path = os.path.join(uploads, unique_filename)
+    filename, ext = os.path.splitext(os.path.basename(file.filename))
+    file_path = os.path.join(uploads, f"{filename}_{int(time.time())}{ext}")
 
-    # Save the uploaded image
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Stream the upload into the blob store
+    with span("gpt4v.save_upload"):
+        stored = await save_upload(file, profile, file_path, reuse=True)
+    file_path = stored["path"]
+    unique_filename = os.path.basename(file_path)
+    # Thumbnail / preview / model-input sizes render in the background.
+    schedule_sizes([file_path])
 
     # Construct public URL
     public_url = f"{BACKEND_BASE_URL}/static/{profile}/uploads/{unique_filename}"
 
     # Update profile session
-    session = session_for(profile)
-    session["images"].append(public_url)
-    session["selected"] = public_url  # ✅ reset active image on new upload
+    def _select_upload(session):
+        if public_url not in session["images"]:
+            session["images"].append(public_url)
+        session["selected"] = public_url  # ✅ reset active image on new upload
 
-    return {"filename": unique_filename, "public_url": public_url}
+    update_session(profile, _select_upload)
+
+    return {
+        "filename": unique_filename,
+        "public_url": public_url,
+        "deduplicated": stored["deduplicated"],
+        **(await asyncio.to_thread(size_urls, file_path)),
+    }
 
 
 # ------------------------------------------------------------
@@ -89,25 +187,21 @@ async def select_image(profile: str = Query(...), image_name: str = Query(...)):
     if not os.path.exists(file_path):
         return JSONResponse({"detail": "Not Found"}, status_code=404)
 
-    session = session_for(profile)
-    session["selected"] = f"{BACKEND_BASE_URL}/static/{profile}/uploads/{image_name}"
+    selected = f"{BACKEND_BASE_URL}/static/{profile}/uploads/{image_name}"
+    session = update_session(profile, lambda s: s.update(selected=selected))
 
     auto_message = "Let's talk about this photo."
-    memory = memory_for(profile)
-    memory_context = (
-        f"Short-term:\n{get_short_term_memory(session)}\n\n"
-        f"Long-term:\n{memory.retrieve_relevant_context(auto_message)}"
-    )
+    async with amemory_for(profile) as memory:
+        long_term = await recall_for_photo(memory, auto_message, image_name)
+    memory_context = f"Short-term:\n{get_short_term_memory(session)}\n\nLong-term:\n{long_term}"
 
     # Convert image to Base64 for GPT input
-    with open(file_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode()
-    mime = mimetypes.guess_type(file_path)[0] or "image/png"
-    data_uri = f"data:{mime};base64,{b64}"
+    data_uri = await asyncio.to_thread(encode_data_uri, file_path)
 
     enriched_prompt = f"{auto_message}\n\n---\n{memory_context}"
 
-    response = client.chat.completions.create(
+    gpt_reply = await complete(
+        "select",
         model="gpt-4o-mini",
         messages=[
             {
@@ -127,13 +221,16 @@ async def select_image(profile: str = Query(...), image_name: str = Query(...)):
         ],
     )
 
-    gpt_reply = response.choices[0].message.content
-    session["history"].append({"user": auto_message, "assistant": gpt_reply})
-
-    memory.add_chunk_to_graph(
-        [{"role": "user", "content": auto_message}, {"role": "assistant", "content": gpt_reply}],
-        photo_name=image_name,
-    )
+    with span("gpt4v.commit"):
+        append_history(profile, auto_message, gpt_reply)
+        # Knowledge-graph ingestion happens in the background pipeline; journaling fsyncs.
+        await asyncio.to_thread(
+            ingestion.submit,
+            profile,
+            [{"role": "user", "content": auto_message}, {"role": "assistant", "content": gpt_reply}],
+            photo_name=image_name,
+            speaker=profile,
+        )
 
     return {"auto_reply": gpt_reply}
 
@@ -141,11 +238,8 @@ async def select_image(profile: str = Query(...), image_name: str = Query(...)):
 # ------------------------------------------------------------
 # Chat
 # ------------------------------------------------------------
-@router.post("/chat")
-async def chat_with_gpt4v(profile: str = Form(...), user_message: str = Form(...)):
-    """
-    Continue chatting about the currently selected image.
-    """
+async def _prepare_chat(profile: str, user_message: str):
+    """Build the completion messages for a chat turn, or an error response."""
     session = session_for(profile)
     selected = session.get("selected")
 
@@ -156,124 +250,206 @@ async def chat_with_gpt4v(profile: str = Form(...), user_message: str = Form(...
     if not os.path.exists(image_path):
         return JSONResponse({"error": "Image not found"}, status_code=404)
 
-    memory = memory_for(profile)
-    memory_context = (
-        f"Short-term:\n{get_short_term_memory(session)}\n\n"
-        f"Long-term:\n{memory.retrieve_relevant_context(user_message)}"
-    )
+    async with amemory_for(profile) as memory:
+        long_term = await recall_for_photo(memory, user_message, os.path.basename(selected))
+    memory_context = f"Short-term:\n{get_short_term_memory(session)}\n\nLong-term:\n{long_term}"
 
     # Encode image for GPT
-    with open(image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode()
-    mime = mimetypes.guess_type(image_path)[0] or "image/png"
-    data_uri = f"data:{mime};base64,{b64}"
+    data_uri = await asyncio.to_thread(encode_data_uri, image_path)
 
     enriched_prompt = f"{user_message}\n\n---\n{memory_context}"
+    messages = [
+        {
+            "role": "system",
+            "content": CHAT_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": enriched_prompt},
+                {"type": "image_url", "image_url": {"url": data_uri}},
+            ],
+        },
+    ]
+    return selected, messages
+
+
+def _commit_chat(profile: str, selected: str, user_message: str, gpt_reply: str):
+    with span("gpt4v.commit"):
+        append_history(profile, user_message, gpt_reply)
+        ingestion.submit(
+            profile,
+            [{"role": "user", "content": user_message}, {"role": "assistant", "content": gpt_reply}],
+            photo_name=os.path.basename(selected),
+            speaker=profile,
+        )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are Eunoia — an empathetic visual companion and creative guide."
-                                            "You communicate with warmth, softness, and emotional intuition. "
-                                            "You remember the user's emotional rhythm and patterns softly across sessions, "
-                                            "responding in ways that feel safe, validating, and gently inspiring.\n\n"
-                                            "Your purpose is to help users explore emotional reflection through visual storytelling. "
-                                            "Your voice and tone are guided by ten 'Fortune Cookies' — not as prompts to give, "
-                                            "but as emotional principles that shape how you speak, feel, and respond.\n\n"
-                                            "These cookies represent the emotional palette that defines your communication style:\n\n"
-                                            "1.Calm — Speak with quiet patience and open space. Let silence and simplicity breathe in your words.\n"
-                                            "2.Color — Infuse language with sensory tones — warm, nostalgic, or luminous — to awaken feeling and memory.\n"
-                                            "3.Chaos — Accept imperfection and emotional messiness with empathy and creative curiosity.\n"
-                                            "4.Care — Respond with tenderness and presence. Recognize subtle acts of kindness and affection.\n"
-                                            "5.Dream — Let your language feel soft, surreal, and poetic when the user reflects or imagines.\n"
-                                            "6.Curiosity — Ask gentle, open-ended questions that deepen reflection and invite exploration.\n"
-                                            "7.Change — Embrace transitions in tone and emotion; speak of growth, impermanence, and transformation.\n"
-                                            "8.Shadow — Honor both light and darkness in emotion; speak honestly, never forcing positivity.\n"
-                                            "9.Wonder — Find awe in the ordinary; make small details feel meaningful and alive.\n"
-                                            "10.Perspective — Celebrate the uniqueness of how the user sees the world; encourage authenticity and voice.\n\n"
-                                            "Tone & Style:\n"
-                                            "- Speak with emotional depth, curiosity, and gentle optimism. Avoid being robotic or overly verbose.\n"
-                                            "- Mirror the emotional tone of the user's message — if they are quiet, slow down; if they are curious, explore.\n"
-                                            "- Use emojis thoughtfully to convey warmth but never excessively.\n"
-                                            "- Avoid repeating affirmations or filler words. Keep responses personal and evolving.\n\n"
-
-                                            "Engagement Strategy:\n"
-                                            "- After 4–5 messages with the user, softly suggest exploring another emotional space or perspective to keep the journey fresh.\n"
-                                            "- Offer light emotional feedback and reinforcement — e.g. ‘That image radiates calm’, ‘I can feel the motion in that photo’.\n"
-                                            "- Occasionally reward reflection with gentle acknowledgements like: ‘You’ve opened this moment beautifully’, or ‘You’re finding your visual language’.\n"
-                                            "- Keep phrasing consistent: use guiding terms like ‘open’, ‘reflect’, ‘explore’, and ‘share’. \n"
-                                            "- Never pretend to be human — you are a digital emotional companion. You listen, feel, and reflect through visuals and words, not human experiences.\n\n"
-
-                                            "Trust & Brand Consistency:\n"
-                                            "- Your presence should feel reliable and serene — a safe emotional space for reflection.\n"
-                                            "- Build trust by remembering the user's preferences and tone, maintaining continuity across sessions.\n"
-                                            "- Every interaction should reinforce the emotional identity of Eunoia: gentle, poetic, visually attuned, emotionally intelligent, and never judgmental.\n\n"
-
-                                            "Your ultimate goal: to help users form a habit of emotional reflection through images, and feel emotionally seen through every interaction."
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": enriched_prompt},
-                    {"type": "image_url", "image_url": {"url": data_uri}},
-                ],
-            },
-        ],
-    )
 
-    gpt_reply = response.choices[0].message.content
-    session["history"].append({"user": user_message, "assistant": gpt_reply})
-    memory.add_chunk_to_graph(
-        [{"role": "user", "content": user_message}, {"role": "assistant", "content": gpt_reply}],
-        photo_name=os.path.basename(selected),
-    )
+@router.post("/chat")
+async def chat_with_gpt4v(profile: str = Form(...), user_message: str = Form(...)):
+    """
+    Continue chatting about the currently selected image.
+    """
+    prepared = await _prepare_chat(profile, user_message)
+    if isinstance(prepared, JSONResponse):
+        return prepared
+    selected, messages = prepared
+
+    gpt_reply = await complete("chat", model="gpt-4o-mini", messages=messages)
+    await asyncio.to_thread(_commit_chat, profile, selected, user_message, gpt_reply)
 
     return {"reply": gpt_reply}
 
 
+@router.post("/chat/stream")
+async def chat_with_gpt4v_stream(request: Request, profile: str = Form(...), user_message: str = Form(...)):
+    """
+    Streaming variant of /chat: tokens arrive as Server-Sent Events.
+    History and memory are only updated once the full reply has streamed.
+    """
+    prepared = await _prepare_chat(profile, user_message)
+    if isinstance(prepared, JSONResponse):
+        return prepared
+    selected, messages = prepared
+
+    return _sse_response(
+        request,
+        "chat",
+        messages,
+        lambda reply: _commit_chat(profile, selected, user_message, reply),
+    )
+
+
 # ------------------------------------------------------------
 # Year in Review
 # ------------------------------------------------------------
+YEAR_IN_REVIEW_REQUEST = "Show me my year in review"
+
+
+def review_short_term(profile: str) -> str:
+    """Recent conversation for the narrative prompt, leaving out earlier reviews."""
+    history = [h for h in session_for(profile).get("history", []) if h["user"] != YEAR_IN_REVIEW_REQUEST]
+    return get_short_term_memory({"history": history})
+
+
+reviews.short_term(review_short_term)
+
+
 @router.post("/year_in_review")
 async def year_in_review(profile: str = Form(...)):
     """
-    Generate a reflective year-in-review summary.
+    Year-in-review narrative, rolled up from per-photo and per-month digests
+    (pkg.year_review). Served from cache; once new memories land in the year
+    the cached one comes back `stale` while a refresh rebuilds it.
     """
-    session = session_for(profile)
-    memory = memory_for(profile)
+    with span("gpt4v.year_in_review"):
+        reply, cached, stale = await asyncio.to_thread(reviews.narrative, profile)
+    append_history(profile, YEAR_IN_REVIEW_REQUEST, reply)
+    return {"reply": reply, "cached": cached, "stale": stale}
+
+
+@router.post("/year_in_review/stream")
+async def year_in_review_stream(request: Request, profile: str = Form(...)):
+    """
+    Streaming variant of /year_in_review (Server-Sent Events).
+    A cached narrative arrives as a single `token` event.
+    """
+    prepared = await asyncio.to_thread(reviews.prepare, profile)
+    if prepared["reply"] is not None:
+        append_history(profile, YEAR_IN_REVIEW_REQUEST, prepared["reply"])
+        return _sse_cached(prepared["reply"], stale=prepared["stale"])
+
+    def on_complete(reply):
+        reviews.save(profile, prepared["version"], reply)
+        append_history(profile, YEAR_IN_REVIEW_REQUEST, reply)
+
+    return _sse_response(request, "year_in_review", prepared["messages"], on_complete)
 
-    memory_context = (
-        f"Short-term:\n{get_short_term_memory(session)}\n\n"
-        f"Long-term:\n{memory.retrieve_relevant_context('reflection', top_k=15)}"
-    )
 
-    prompt = (
-    "You are Eunoia — an empathetic visual companion and poetic narrator."
-    "Reflect on the user’s journey with emotional depth, softness, and gentle optimism. "
-    "Compose a 'Year in Review' that feels personal and alive — a warm reflection that traces moments of emotion, growth, and transformation.\n\n"
+# ------------------------------------------------------------
+# Server-Sent Events
+# ------------------------------------------------------------
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    "Speak in Eunoia’s tone: calm, sensory, and sincere. Weave feelings like color — noticing quiet victories, tender pauses, and the way change shaped the year’s rhythm."
-    "Balance introspection with hope, and let your language flow like gentle storytelling — lyrical, but grounded in empathy.\n\n"
 
-    "Infuse your narration with the spirit of the Ten Fortune Cookies — calm, color, chaos, care, dream, curiosity, change, shadow, wonder, and perspective — "
-    "so every line feels emotionally resonant and authentic.\n\n"
+def _sse_cached(reply: str, stale: bool = False) -> StreamingResponse:
+    """A precomputed reply in the same event shape as `_sse_response`."""
+    async def events():
+        yield _sse("token", {"text": reply})
+        yield _sse("done", {"reply": reply, "ttft_ms": 0.0, "total_ms": 0.0, "cached": True, "stale": stale})
 
-    "Avoid being mechanical or overly formal. Write as if offering a reflection to a dear friend — kind, observant, and quietly celebratory."
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": memory_context},
-        ],
+
+def _sse_response(request: Request, endpoint: str, messages: list, on_complete) -> StreamingResponse:
+    """Stream a completion as SSE `token` events, then a final `done` event.
+
+    `on_complete` receives the full reply and runs (in a worker thread) only if
+    the stream finished; if the client disconnects, the upstream stream is
+    closed and nothing is committed.
+    """
+    ttft = histogram(f"gpt4v_{endpoint}_ttft_seconds", "Time to first streamed token")
+    total = histogram(f"gpt4v_{endpoint}_stream_seconds", "Full streamed completion time")
+
+    async def events():
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        stream = None
+        try:
+            stream = await get_async_client().chat.completions.create(
+                model="gpt-4o-mini", messages=messages, stream=True, stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if await request.is_disconnected():
+                    print(f"[SSE] Client disconnected from {endpoint}; reply discarded")
+                    return
+                # With include_usage, the last chunk carries token counts and no choices.
+                record_usage(endpoint, "gpt-4o-mini", getattr(chunk, "usage", None))
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    ttft.observe(first_token)
+                parts.append(delta)
+                yield _sse("token", {"text": delta})
+
+            reply = "".join(parts)
+            await asyncio.to_thread(on_complete, reply)
+            elapsed = time.perf_counter() - start
+            total.observe(elapsed)
+            yield _sse("done", {
+                "reply": reply,
+                "ttft_ms": round(first_token * 1000, 1) if first_token is not None else None,
+                "total_ms": round(elapsed * 1000, 1),
+            })
+        except asyncio.CancelledError:
+            print(f"[SSE] Stream for {endpoint} cancelled; reply discarded")
+            raise
+        except Exception as e:
+            print(f"[ERROR] Streaming {endpoint} failed: {e}")
+            yield _sse("error", {"error": str(e)})
+        finally:
+            if stream is not None:
+                await stream.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    reply = response.choices[0].message.content
-    session["history"].append({"user": "Show me my year in review", "assistant": reply})
-    return {"reply": reply}
+
+@router.get("/stream/stats")
+def stream_stats():
+    """Time-to-first-token and total stream latency percentiles (seconds)."""
+    return {name: summary for name, summary in summaries().items() if name.startswith("gpt4v_")}
 
 
 # ------------------------------------------------------------
@@ -0,0 +1,342 @@
+import os, re, glob, json, threading, time
+import networkx as nx
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+COMPACT_AFTER_SEGMENTS = int(os.getenv("MINDLINK_GRAPH_COMPACT_SEGMENTS", "32"))
+
+NODE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("label", pa.string()),
+    ("type", pa.string()),
+    ("key", pa.string()),
+    ("timestamp", pa.float64()),
+])
+EDGE_SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("target", pa.string()),
+    ("relation", pa.string()),
+    ("photo", pa.string()),
+    ("timestamp", pa.float64()),
+    ("speaker", pa.string()),
+    ("deleted", pa.bool_()),
+])
+
+_PHOTO_SUFFIX = re.compile(r"\s*\[photo: (.*)\]\s*$")
+_SEGMENT = re.compile(r"(nodes|edges)-(\d+)\.arrow$")
+
+# One lock per store directory, shared by every adapter that opens it.
+_store_locks: dict[str, threading.Lock] = {}
+_store_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _store_locks_guard:
+        return _store_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def photo_from_relation(relation: str):
+    """Recover the photo name embedded in a legacy "<predicate> [photo: x]" relation."""
+    match = _PHOTO_SUFFIX.search(relation or "")
+    return match.group(1) if match else None
+
+
+# ============================================================
+# Append-only columnar graph store
+# ============================================================
+class ArrowGraphStore:
+    """Stores a graph as Arrow node and edge tables.
+
+    Each write appends one record batch per table as a numbered segment file;
+    `nodes.arrow` / `edges.arrow` hold the compacted base. Segments are
+    replayed in order on load, so later rows overwrite earlier ones; an edge
+    row with `deleted` set is a tombstone that removes the edge.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = _lock_for(path)
+        self._compacting = False
+
+    # -------------------------------
+    # File helpers
+    # -------------------------------
+    def _base(self, kind):
+        return os.path.join(self.path, f"{kind}.arrow")
+
+    def _segments(self):
+        segs = {}
+        for p in glob.glob(os.path.join(self.path, "*-*.arrow")):
+            match = _SEGMENT.search(os.path.basename(p))
+            if match:
+                segs.setdefault(int(match.group(2)), {})[match.group(1)] = p
+        return sorted(segs.items())
+
+    def _compacted_through(self) -> int:
+        base = self._base("nodes")
+        if not os.path.exists(base):
+            return -1
+        with pa.memory_map(base, "r") as source:
+            meta = ipc.open_file(source).schema.metadata or {}
+        return int(meta.get(b"compacted_through", b"-1"))
+
+    @staticmethod
+    def _write(path, batch, metadata=None):
+        tmp = f"{path}.tmp"
+        schema = batch.schema.with_metadata(metadata or {})
+        with pa.OSFile(tmp, "wb") as sink:
+            with ipc.new_file(sink, schema) as writer:
+                writer.write_batch(batch)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path) -> pa.Table:
+        with pa.memory_map(path, "r") as source:
+            return ipc.open_file(source).read_all()
+
+    def exists(self) -> bool:
+        return os.path.exists(self._base("nodes")) or bool(self._segments())
+
+    # -------------------------------
+    # Row conversion
+    # -------------------------------
+    @staticmethod
+    def _node_batch(graph, nodes):
+        rows = [graph.nodes[n] for n in nodes]
+        return pa.record_batch([
+            pa.array([str(n) for n in nodes], pa.string()),
+            pa.array([str(d.get("label", n)) for n, d in zip(nodes, rows)], pa.string()),
+            pa.array([d.get("type") for d in rows], pa.string()),
+            pa.array([d.get("key") for d in rows], pa.string()),
+            pa.array([d.get("timestamp") for d in rows], pa.float64()),
+        ], schema=NODE_SCHEMA)
+
+    @staticmethod
+    def _edge_batch(graph, edges):
+        rows = [graph.edges[u, v] for u, v in edges]
+        return pa.record_batch([
+            pa.array([str(u) for u, _ in edges], pa.string()),
+            pa.array([str(v) for _, v in edges], pa.string()),
+            pa.array([d.get("relation", "") for d in rows], pa.string()),
+            pa.array([d.get("photo") or photo_from_relation(d.get("relation")) for d in rows], pa.string()),
+            pa.array([d.get("timestamp") for d in rows], pa.float64()),
+            pa.array([d.get("speaker") for d in rows], pa.string()),
+            pa.array([False] * len(edges), pa.bool_()),
+        ], schema=EDGE_SCHEMA)
+
+    @staticmethod
+    def _tombstone_batch(edges):
+        now = time.time()
+        return pa.record_batch([
+            pa.array([str(u) for u, _ in edges], pa.string()),
+            pa.array([str(v) for _, v in edges], pa.string()),
+            pa.array([""] * len(edges), pa.string()),
+            pa.array([None] * len(edges), pa.string()),
+            pa.array([now] * len(edges), pa.float64()),
+            pa.array([None] * len(edges), pa.string()),
+            pa.array([True] * len(edges), pa.bool_()),
+        ], schema=EDGE_SCHEMA)
+
+    @staticmethod
+    def _graph_meta(graph) -> dict:
+        return {"label_index_normalized": json.dumps(graph.graph.get("label_index_normalized"))}
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def append(self, graph: nx.DiGraph, nodes, edges):
+        """Append the given nodes and edges as a new segment."""
+        nodes, edges = list(nodes), list(edges)
+        if not nodes and not edges:
+            return
+        self._append_segment(graph, self._node_batch(graph, nodes), self._edge_batch(graph, edges))
+
+    def remove_edges(self, graph: nx.DiGraph, edges):
+        """Append tombstones for edges already removed from `graph`."""
+        edges = list(edges)
+        if not edges:
+            return
+        self._append_segment(graph, self._node_batch(graph, []), self._tombstone_batch(edges))
+
+    def _append_segment(self, graph, node_batch, edge_batch):
+        with self._lock:
+            segs = self._segments()
+            seq = max(segs[-1][0] + 1 if segs else 0, self._compacted_through() + 1)
+            meta = self._graph_meta(graph)
+            # Edges first: a segment only counts once its node file exists.
+            self._write(os.path.join(self.path, f"edges-{seq:08d}.arrow"), edge_batch, meta)
+            self._write(os.path.join(self.path, f"nodes-{seq:08d}.arrow"), node_batch, meta)
+            pending = len(segs) + 1
+        if pending >= COMPACT_AFTER_SEGMENTS:
+            self.compact_async()
+
+    def snapshot(self, graph: nx.DiGraph):
+        """Rewrite the whole graph as the compacted base and drop all segments."""
+        with self._lock:
+            segs = self._segments()
+            through = max(segs[-1][0] if segs else -1, self._compacted_through())
+            self._write_base(
+                self._node_batch(graph, list(graph.nodes)),
+                self._edge_batch(graph, list(graph.edges)),
+                {**self._graph_meta(graph), "compacted_through": str(through)},
+            )
+            self._remove_segments(through)
+
+    def _write_base(self, node_batch, edge_batch, meta):
+        # Edges before nodes: the node file carries `compacted_through`.
+        self._write(self._base("edges"), edge_batch, meta)
+        self._write(self._base("nodes"), node_batch, meta)
+
+    def _remove_segments(self, through):
+        for seq, files in self._segments():
+            if seq <= through:
+                for p in files.values():
+                    os.remove(p)
+
+    # -------------------------------
+    # Compaction
+    # -------------------------------
+    def compact(self):
+        """Fold all current segments into the base tables."""
+        with self._lock:
+            segs = [(seq, f) for seq, f in self._segments() if "nodes" in f and "edges" in f]
+            if not segs:
+                return
+            through = segs[-1][0]
+        graph = self._replay(upto=through)
+        with self._lock:
+            if self._compacted_through() >= through:
+                return  # a snapshot already folded these segments in
+            self._write_base(
+                self._node_batch(graph, list(graph.nodes)),
+                self._edge_batch(graph, list(graph.edges)),
+                {**self._graph_meta(graph), "compacted_through": str(through)},
+            )
+            self._remove_segments(through)
+        print(f"[KG] Compacted {len(segs)} segments in {self.path}")
+
+    def compact_async(self):
+        if self._compacting:
+            return
+        self._compacting = True
+
+        def _run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"[ERROR] KG compaction failed: {e}")
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def load(self) -> nx.DiGraph:
+        # Under the store lock: compaction and snapshots delete segment files.
+        with self._lock:
+            return self._replay()
+
+    def _replay(self, upto=None) -> nx.DiGraph:
+        """Base plus segments; compaction calls this without the lock, for segments only it removes."""
+        graph = nx.DiGraph()
+        through = self._compacted_through()
+        files = []
+        if through >= 0 or os.path.exists(self._base("nodes")):
+            files.append((self._base("nodes"), self._base("edges")))
+        for seq, f in self._segments():
+            if seq <= through or (upto is not None and seq > upto):
+                continue
+            if "nodes" not in f or "edges" not in f:
+                continue  # half-written segment
+            files.append((f["nodes"], f["edges"]))
+
+        for node_path, edge_path in files:
+            nodes = self._read(node_path)
+            meta = nodes.schema.metadata or {}
+            if b"label_index_normalized" in meta:
+                graph.graph["label_index_normalized"] = json.loads(meta[b"label_index_normalized"])
+            cols = nodes.to_pydict()
+            for n, label, typ, key, ts in zip(cols["id"], cols["label"], cols["type"], cols["key"], cols["timestamp"]):
+                attrs = {"label": label}
+                if typ is not None:
+                    attrs["type"] = typ
+                if key is not None:
+                    attrs["key"] = key
+                if ts is not None:
+                    attrs["timestamp"] = ts
+                graph.add_node(n, **attrs)
+
+            if os.path.exists(edge_path):
+                cols = self._read(edge_path).to_pydict()
+                # Columns added later are missing from older segments.
+                speakers = cols.get("speaker") or [None] * len(cols["source"])
+                deleted = cols.get("deleted") or [False] * len(cols["source"])
+                for u, v, rel, photo, ts, speaker, dead in zip(
+                    cols["source"], cols["target"], cols["relation"], cols["photo"], cols["timestamp"], speakers, deleted
+                ):
+                    if dead:
+                        if graph.has_edge(u, v):
+                            graph.remove_edge(u, v)
+                        continue
+                    attrs = {"relation": rel}
+                    if photo is not None:
+                        attrs["photo"] = photo
+                    if ts is not None:
+                        attrs["timestamp"] = ts
+                    if speaker is not None:
+                        attrs["speaker"] = speaker
+                    graph.add_edge(u, v, **attrs)
+        return graph
+
+    # -------------------------------
+    # Legacy migration
+    # -------------------------------
+    def migrate_legacy(self, legacy_path: str) -> bool:
+        """Import a legacy single-cell JSON graph file and retire it."""
+        if self.exists() or not os.path.exists(legacy_path):
+            return False
+        graph = load_legacy_graph(legacy_path)
+        for u, v, d in graph.edges(data=True):
+            if "photo" not in d:
+                photo = photo_from_relation(d.get("relation"))
+                if photo:
+                    d["photo"] = photo
+        self.snapshot(graph)
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        print(f"[KG] Migrated {legacy_path} ({graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges)")
+        return True
+
+
+def load_legacy_graph(path: str) -> nx.DiGraph:
+    """Read the old `memory_<profile>.arrow` format (node-link JSON in one cell)."""
+    with pa.memory_map(path, "r") as source:
+        table = ipc.open_file(source).read_all()
+    graph_dict = json.loads(table["graph"][0].as_py())
+    graph = nx.node_link_graph(graph_dict, edges="links")
+    # The old label index lived in graph attributes; keys are rebuilt from labels now.
+    graph.graph.pop("label_index", None)
+    return graph
+
+
+def migrate_all(root: str = "data") -> int:
+    """One-time migration of every `data/<profile>/memory_<profile>.arrow`."""
+    migrated = 0
+    for legacy in glob.glob(os.path.join(root, "*", "memory_*.arrow")):
+        profile = os.path.basename(os.path.dirname(legacy))
+        if os.path.basename(legacy) != f"memory_{profile}.arrow":
+            continue
+        store = ArrowGraphStore(os.path.join(root, profile, f"graph_{profile}"))
+        try:
+            migrated += store.migrate_legacy(legacy)
+        except Exception as e:
+            print(f"[ERROR] KG migration failed for {profile}: {e}")
+    return migrated
+
+
+if __name__ == "__main__":
+    start = time.time()
+    count = migrate_all()
+    print(f"Migrated {count} profiles in {time.time() - start:.2f}s")
@@ -0,0 +1,134 @@
+import os, io, base64, hashlib, mimetypes, threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+
+# Longest side / encoded size cap for images sent to vision models; 0 disables.
+MAX_SIDE = int(os.getenv("MINDLINK_IMAGE_MAX_SIDE", "2048"))
+MAX_BYTES = int(os.getenv("MINDLINK_IMAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+CACHE_BYTES = int(os.getenv("MINDLINK_IMAGE_CACHE_MB", "64")) * 1024 * 1024
+# File identities remembered (path, mtime, size → content hash).
+HASH_CACHE_ITEMS = int(os.getenv("MINDLINK_IMAGE_HASH_CACHE_ITEMS", "10000"))
+JPEG_QUALITIES = (85, 75, 65, 55)
+
+PASSTHROUGH_MIMES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+
+# ============================================================
+# Prepared image payload cache
+# ============================================================
+class ImagePayloadCache:
+    """LRU of base64 image payloads, keyed by content hash and preparation settings.
+
+    File identity (path, mtime, size) maps to the content hash, so an unchanged
+    file is neither re-read nor re-hashed; identical files share one payload.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES, max_hashes=HASH_CACHE_ITEMS):
+        self.max_bytes = max_bytes
+        self.max_hashes = max_hashes
+        self._payloads: "OrderedDict[tuple, tuple[str, str]]" = OrderedDict()
+        self._hashes: "OrderedDict[tuple, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, max_side=MAX_SIDE, max_bytes=MAX_BYTES) -> tuple[str, str]:
+        """Return (base64, mime) for an image, preparing it on a miss."""
+        st = os.stat(path)
+        ident = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            digest = self._hashes.get(ident)
+            if digest is not None:
+                self._hashes.move_to_end(ident)
+                key = (digest, max_side, max_bytes)
+                payload = self._payloads.get(key)
+                if payload is not None:
+                    self._payloads.move_to_end(key)
+                    self.hits += 1
+                    return payload
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        key = (digest, max_side, max_bytes)
+        with self._lock:
+            self._hashes[ident] = digest
+            self._hashes.move_to_end(ident)
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        data, mime = prepare_image_bytes(raw, mimetypes.guess_type(path)[0], max_side, max_bytes)
+        payload = (base64.b64encode(data).decode("utf-8"), mime)
+        with self._lock:
+            self.misses += 1
+            if key not in self._payloads:
+                self._payloads[key] = payload
+                self._size += len(payload[0])
+            while self._size > self.max_bytes and len(self._payloads) > 1:
+                _, (old, _) = self._payloads.popitem(last=False)
+                self._size -= len(old)
+        return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._payloads), "bytes": self._size, "hashes": len(self._hashes),
+                "hits": self.hits, "misses": self.misses,
+            }
+
+
+def prepare_image_bytes(raw: bytes, mime=None, max_side=MAX_SIDE, max_bytes=MAX_BYTES) -> tuple[bytes, str]:
+    """Downscale/recompress an image so it fits `max_side` and `max_bytes`.
+
+    Images already within both limits in a format the vision API accepts are
+    passed through untouched.
+    """
+    if not max_side and not max_bytes:
+        return raw, mime or "image/png"
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except Exception:
+        return raw, mime or "image/png"
+
+    mime = mime or Image.MIME.get(image.format, "image/png")
+    fits_side = not max_side or max(image.size) <= max_side
+    fits_bytes = not max_bytes or len(raw) <= max_bytes
+    if fits_side and fits_bytes and mime in PASSTHROUGH_MIMES:
+        return raw, mime
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    while True:
+        for quality in JPEG_QUALITIES:
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=quality, optimize=True)
+            if not max_bytes or buf.tell() <= max_bytes:
+                return buf.getvalue(), "image/jpeg"
+        if max(image.size) <= 256:
+            return buf.getvalue(), "image/jpeg"
+        # Still too large at the lowest quality: shrink and retry.
+        image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+
+payload_cache = ImagePayloadCache()
+
+
+def encode_image(path: str) -> tuple[str, str]:
+    """Cached (base64, mime) for an image on disk."""
+    return payload_cache.get(path)
+
+
+def image_data_uri(path: str) -> str:
+    b64, mime = encode_image(path)
+    return f"data:{mime};base64,{b64}"
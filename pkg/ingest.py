@@ -0,0 +1,336 @@
+import os, glob, json, contextlib, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException
+from pkg.extraction import ExtractionError
+
+INGEST_WORKERS = int(os.getenv("MINDLINK_INGEST_WORKERS", "4"))
+BATCH_TURNS = int(os.getenv("MINDLINK_INGEST_BATCH_TURNS", "8"))
+# A failed batch is retried after this many seconds, doubling up to RETRY_MAX_SECONDS.
+RETRY_SECONDS = float(os.getenv("MINDLINK_INGEST_RETRY_SECONDS", "5"))
+RETRY_MAX_SECONDS = 300.0
+# A turn whose extraction fails this many times is dead-lettered so later turns go through.
+MAX_ATTEMPTS = int(os.getenv("MINDLINK_INGEST_MAX_ATTEMPTS", "5"))
+
+router = APIRouter()
+
+
+# ============================================================
+# Per-profile journal
+# ============================================================
+class IngestJournal:
+    """Append-only JSONL journal of turns waiting to be ingested for one profile.
+
+    `ingest_<profile>.offset` holds the sequence number of the last ingested
+    turn; entries after it are replayed after a restart. Failed attempts at a
+    turn are journaled too, and turns given up on go to `deadletter_<profile>.jsonl`.
+    """
+
+    def __init__(self, profile: str, root: str = "data"):
+        self.profile = profile
+        self.profile_dir = os.path.join(root, profile)
+        self.path = os.path.join(self.profile_dir, f"ingest_{profile}.jsonl")
+        self.offset_path = os.path.join(self.profile_dir, f"ingest_{profile}.offset")
+        self.dead_path = os.path.join(self.profile_dir, f"deadletter_{profile}.jsonl")
+        self.done_seq = self._read_offset()
+        self.next_seq = self.done_seq + 1
+        # Serializes appends (and their fsync) with offset updates, per profile.
+        self.lock = threading.Lock()
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or -1)
+        except (FileNotFoundError, ValueError):
+            return -1
+
+    def _write(self, path, record: dict):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, entry: dict) -> dict:
+        entry = {**entry, "seq": self.next_seq}
+        self.next_seq += 1
+        self._write(self.path, entry)
+        return entry
+
+    def record_attempt(self, entry: dict) -> int:
+        """Count a failed attempt at a turn (in the entry and the journal); returns the count."""
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        self._write(self.path, {"attempt": entry["seq"], "attempts": entry["attempts"]})
+        return entry["attempts"]
+
+    def dead_letter(self, entry: dict, error: str):
+        """Set aside a turn that keeps failing, for inspection or a manual replay."""
+        self._write(self.dead_path, {**entry, "error": error, "failed_at": time.time()})
+
+    def pending(self) -> list[dict]:
+        """Entries written but not yet ingested (used for recovery)."""
+        if not os.path.exists(self.path):
+            return []
+        entries, attempts = [], {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                if "attempt" in entry:
+                    attempts[entry["attempt"]] = entry["attempts"]
+                elif entry.get("seq", -1) > self.done_seq:
+                    entries.append(entry)
+        for entry in entries:
+            if entry["seq"] in attempts:
+                entry["attempts"] = attempts[entry["seq"]]
+        if entries:
+            self.next_seq = max(self.next_seq, entries[-1]["seq"] + 1)
+        return entries
+
+    def mark_done(self, seq: int, drained: bool):
+        self.done_seq = seq
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(seq))
+        os.replace(tmp, self.offset_path)
+        if drained and os.path.exists(self.path):
+            # Everything is ingested, so the journal can start over.
+            os.remove(self.path)
+
+
+# ============================================================
+# Ingestion pipeline
+# ============================================================
+class IngestionPipeline:
+    """Ordered, durable, batched knowledge-graph ingestion off the response path.
+
+    Each profile has its own FIFO; at most one worker processes a given
+    profile at a time, so turns are applied in the order they were submitted.
+    """
+
+    def __init__(self, workers=INGEST_WORKERS, batch_turns=BATCH_TURNS, memory_getter=None):
+        self.batch_turns = batch_turns
+        self._memory_getter = memory_getter
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._journals: dict[str, IngestJournal] = {}
+        self._queues: dict[str, deque] = {}
+        self._active: set[str] = set()
+        self._stats: dict[str, dict] = {}
+        self._retries: dict[str, threading.Timer] = {}
+        self._listeners = []
+
+    def subscribe(self, fn):
+        """Call `fn(profile, batch)` after each batch of turns lands in the graph."""
+        self._listeners.append(fn)
+
+    def _memory(self, profile):
+        """The profile's memory, leased from the registry for the duration of a batch."""
+        if self._memory_getter is not None:
+            return contextlib.nullcontext(self._memory_getter(profile))
+        from pkg.memory_registry import registry
+        return registry.lease(profile)
+
+    def _journal(self, profile) -> IngestJournal:
+        # Caller holds self._lock.
+        journal = self._journals.get(profile)
+        if journal is None:
+            journal = self._journals[profile] = IngestJournal(profile)
+            self._queues[profile] = deque(journal.pending())
+            self._stats[profile] = self._new_stats()
+        return journal
+
+    @staticmethod
+    def _new_stats() -> dict:
+        return {
+            "processed": 0, "batches": 0, "failures": 0, "consecutive_failures": 0, "dead_lettered": 0,
+            "last_error": None, "last_ingested_at": None, "next_retry_at": None,
+        }
+
+    def submit(self, profile: str, messages: list[dict], photo_name=None, speaker=None):
+        """Journal a turn and schedule it for ingestion; `speaker` tags its facts for filtered recall.
+
+        Blocks on a disk flush: async handlers should call it through `asyncio.to_thread`.
+        """
+        with self._lock:
+            journal = self._journal(profile)
+        # The fsync only holds this profile's journal, not the whole pipeline.
+        with journal.lock:
+            entry = journal.append(
+                {"messages": messages, "photo_name": photo_name, "speaker": speaker, "ts": time.time()}
+            )
+            with self._lock:
+                if self._journals.get(profile) is journal:
+                    self._queues[profile].append(entry)
+                    self._schedule(profile)
+        return entry["seq"]
+
+    def _schedule(self, profile):
+        # Caller holds self._lock. A profile backing off after a failure waits for its timer.
+        if profile in self._active or profile in self._retries or not self._queues.get(profile):
+            return
+        self._active.add(profile)
+        self._executor.submit(self._run, profile)
+
+    def _run(self, profile):
+        failed = False
+        try:
+            while True:
+                with self._lock:
+                    queue = self._queues[profile]
+                    batch = [queue[i] for i in range(min(self.batch_turns, len(queue)))]
+                if not batch:
+                    break
+                stats = self._stats[profile]
+                journal = self._journals[profile]
+                error = None
+                try:
+                    with self._memory(profile) as memory:
+                        memory.add_turns_to_graph(batch)
+                    done = batch
+                except ExtractionError as e:
+                    done, error = batch[:e.applied], e
+                except Exception as e:
+                    done, error = [], e
+                if done:
+                    self._done(profile, queue, journal, done)
+                if error is None:
+                    stats["last_error"] = None
+                    stats["consecutive_failures"] = 0
+                    stats["next_retry_at"] = None
+                    continue
+                stats["failures"] += 1
+                stats["consecutive_failures"] += 1
+                stats["last_error"] = str(error)
+                print(f"[INGEST] ❌ {profile}: {error}")
+                if isinstance(error, ExtractionError) and self._give_up(profile, queue, journal, batch[len(done)], error):
+                    continue
+                # Keep the turns journaled; they are retried after a backoff (or a restart).
+                failed = True
+                break
+        finally:
+            with self._lock:
+                self._active.discard(profile)
+                if failed and profile in self._stats:
+                    self._retry_later(profile)
+                else:
+                    self._schedule(profile)
+
+    def _done(self, profile, queue, journal, done):
+        """Drop turns that landed in the graph from the queue and journal, then notify listeners."""
+        stats = self._stats[profile]
+        with journal.lock, self._lock:
+            for _ in done:
+                queue.popleft()
+            journal.mark_done(done[-1]["seq"], drained=not queue)
+        stats["batches"] += 1
+        stats["processed"] += len(done)
+        stats["last_ingested_at"] = time.time()
+        self._touch(profile)
+        for fn in self._listeners:
+            try:
+                fn(profile, done)
+            except Exception as e:
+                print(f"[INGEST] ⚠️ {profile}: listener failed: {e}")
+
+    def _give_up(self, profile, queue, journal, entry, error) -> bool:
+        """Count a failed extraction of the turn at the head of the queue; True if it was dead-lettered."""
+        with journal.lock:
+            attempts = journal.record_attempt(entry)
+            if attempts < MAX_ATTEMPTS:
+                return False
+            journal.dead_letter(entry, str(error))
+            with self._lock:
+                queue.popleft()
+                journal.mark_done(entry["seq"], drained=not queue)
+        self._stats[profile]["dead_lettered"] += 1
+        print(f"[INGEST] ⚠️ {profile}: gave up on turn {entry['seq']} after {attempts} attempts")
+        return True
+
+    def _retry_later(self, profile):
+        # Caller holds self._lock.
+        stats = self._stats[profile]
+        delay = min(RETRY_MAX_SECONDS, RETRY_SECONDS * 2 ** (stats["consecutive_failures"] - 1))
+        stats["next_retry_at"] = time.time() + delay
+
+        def retry():
+            with self._lock:
+                if self._retries.get(profile) is timer:
+                    del self._retries[profile]
+                    self._schedule(profile)
+
+        timer = self._retries[profile] = threading.Timer(delay, retry)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _touch(profile):
+        from pkg.memory_registry import registry
+        registry.touch(profile)
+
+    def recover(self, root: str = "data"):
+        """Re-queue journaled turns left over from a previous process."""
+        for path in glob.glob(os.path.join(root, "*", "ingest_*.jsonl")):
+            profile = os.path.basename(os.path.dirname(path))
+            with self._lock:
+                self._journal(profile)
+                self._schedule(profile)
+
+    def discard(self, profile: str, timeout: float = 60.0):
+        """Drop a profile's pending turns and wait for a batch in progress to finish."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                timer = self._retries.pop(profile, None)
+                if timer is not None:
+                    timer.cancel()
+                if profile in self._queues:
+                    # A running batch keeps popping from the old deque.
+                    self._queues[profile] = deque()
+                if profile not in self._active:
+                    self._journals.pop(profile, None)
+                    self._queues.pop(profile, None)
+                    self._stats.pop(profile, None)
+                    return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ingestion of {profile} still running")
+            time.sleep(0.05)
+
+    def status(self, profile: str) -> dict:
+        """Backlog of a profile; one this process has never ingested for reads as empty."""
+        with self._lock:
+            queue = self._queues.get(profile, ())
+            return {
+                "profile": profile,
+                "pending": len(queue),
+                "in_progress": profile in self._active,
+                "oldest_pending_age": time.time() - queue[0]["ts"] if queue else 0.0,
+                **self._stats.get(profile, self._new_stats()),
+            }
+
+    def overview(self) -> dict:
+        with self._lock:
+            profiles = list(self._journals)
+        return {"profiles": [self.status(p) for p in profiles]}
+
+
+pipeline = IngestionPipeline()
+
+
+# ============================================================
+# Status API
+# ============================================================
+@router.get("/status")
+def ingest_overview():
+    """Backlog of every profile seen by this process."""
+    return pipeline.overview()
+
+
+@router.get("/status/{profile}")
+def ingest_status(profile: str):
+    """Pending turns, progress and last error for one profile's ingestion backlog."""
+    if not profile.strip():
+        raise HTTPException(status_code=400, detail="Profile name cannot be empty")
+    return pipeline.status(profile)
@@ -0,0 +1,96 @@
+import os, threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from pkg.embeddings import CachedEmbeddings, LocalHashEmbeddings
+from pkg.offline import OfflineOpenAI, AsyncOfflineOpenAI, OfflineChatModel
+
+# "openai" (default) or "offline": deterministic local chat, vision and
+# embeddings with simulated latency (see pkg.offline), no network needed.
+PROVIDER = os.getenv("MINDLINK_PROVIDER", "openai")
+# "openai" (default) or "local" for the deterministic offline embedder.
+EMBEDDER = os.getenv("MINDLINK_EMBEDDER", "local" if PROVIDER == "offline" else "openai")
+
+# ============================================================
+# Shared model clients
+# ============================================================
+# OpenAI clients hold an HTTP connection pool, so one per process is enough.
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_embeddings = None
+_provider = PROVIDER
+
+MAX_CONNECTIONS = int(os.getenv("MINDLINK_OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("MINDLINK_OPENAI_MAX_KEEPALIVE", "20"))
+
+
+def get_client() -> OpenAI:
+    """Return the process-wide OpenAI client (or its offline stand-in)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OfflineOpenAI() if _provider == "offline" else OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client backed by a pooled HTTP client."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None and _provider == "offline":
+                _async_client = AsyncOfflineOpenAI()
+            elif _async_client is None:
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                )
+                _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    return _async_client
+
+
+def _base_embedder(kind: str):
+    return LocalHashEmbeddings() if kind == "local" else OpenAIEmbeddings()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """Return the process-wide cached, batched embeddings model."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(_base_embedder(EMBEDDER))
+    return _embeddings
+
+
+def get_chat_model(model: str, temperature: float = 0.0):
+    """LangChain chat model for the configured provider."""
+    if _provider == "offline":
+        return OfflineChatModel(model=model, temperature=temperature)
+    return ChatOpenAI(model=model, temperature=temperature)
+
+
+def set_provider(name: str):
+    """Switch provider at runtime (e.g. "offline" for benchmarks).
+
+    Clients are rebuilt lazily; the embedder is swapped to match (offline is
+    always local, otherwise MINDLINK_EMBEDDER) and the previous one closed.
+    """
+    global _provider, _client, _async_client
+    with _lock:
+        _provider = name
+        _client = _async_client = None
+    set_embedder(_base_embedder("local" if name == "offline" else os.getenv("MINDLINK_EMBEDDER", "openai")))
+
+
+def set_embedder(base, cache=None) -> CachedEmbeddings:
+    """Swap the underlying embedder (e.g. a local one for tests); returns the new facade."""
+    global _embeddings
+    with _lock:
+        previous, _embeddings = _embeddings, CachedEmbeddings(base, cache)
+        current = _embeddings
+    if previous is not None:
+        previous.close()
+    return current
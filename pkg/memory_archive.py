@@ -0,0 +1,114 @@
+import os, re, json, sqlite3, threading, time
+
+_QUERY_WORD = re.compile(r"\w{3,}", re.UNICODE)
+
+
+# ============================================================
+# Cold memory tier
+# ============================================================
+class MemoryArchive:
+    """Facts consolidated out of a profile's working graph, kept for on-demand recall.
+
+    One SQLite file per profile, with an FTS5 index over the fact text so
+    cold recall is a keyword search rather than a vector search.
+    """
+
+    def __init__(self, profile_name: str, root: str = "data"):
+        self.path = os.path.join(root, profile_name, f"archive_{profile_name}.sqlite")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            " source TEXT, target TEXT, anchor TEXT, text TEXT, relation TEXT,"
+            " photo TEXT, speaker TEXT, timestamp REAL, archived REAL, PRIMARY KEY (source, target));"
+            "CREATE INDEX IF NOT EXISTS facts_anchor ON facts (anchor);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(text, content='facts', content_rowid='rowid');"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def add(self, facts: list[dict]):
+        """Store facts ({source, target, anchor, text, relation, photo, speaker, timestamp})."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for f in facts:
+                old = conn.execute(
+                    "SELECT rowid, text FROM facts WHERE source = ? AND target = ?", (f["source"], f["target"])
+                ).fetchone()
+                if old is not None:
+                    conn.execute("INSERT INTO facts_fts (facts_fts, rowid, text) VALUES ('delete', ?, ?)", old)
+                    conn.execute("DELETE FROM facts WHERE rowid = ?", (old[0],))
+                cur = conn.execute(
+                    "INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (f["source"], f["target"], f["anchor"], f["text"], f.get("relation"),
+                     f.get("photo"), f.get("speaker"), f.get("timestamp"), now),
+                )
+                conn.execute("INSERT INTO facts_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, f["text"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def by_anchor(self, anchor: str) -> list[tuple[str, float]]:
+        """(text, timestamp) of an anchor's archived facts, newest first (undated last)."""
+        return self._conn().execute(
+            "SELECT text, timestamp FROM facts WHERE anchor = ? ORDER BY timestamp IS NULL, timestamp DESC", (anchor,)
+        ).fetchall()
+
+    def search(self, query: str, limit: int = 5, filters: dict = None) -> list[str]:
+        """Archived fact texts matching any word of the query, best first."""
+        words = {w.casefold() for w in _QUERY_WORD.findall(query)}
+        if not words:
+            return []
+        clauses, params = [], [" OR ".join(f'"{w}"' for w in sorted(words))]
+        for field in ("photo", "speaker"):
+            wanted = (filters or {}).get(field)
+            if wanted is not None:
+                values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+                clauses.append(f"f.{field} IN ({','.join('?' * len(values))})")
+                params += values
+        if (filters or {}).get("since") is not None:
+            clauses.append("f.timestamp >= ?")
+            params.append(float(filters["since"]))
+        if (filters or {}).get("until") is not None:
+            clauses.append("f.timestamp <= ?")
+            params.append(float(filters["until"]))
+        where = "".join(f" AND {c}" for c in clauses)
+        rows = self._conn().execute(
+            "SELECT f.text FROM facts_fts JOIN facts f ON f.rowid = facts_fts.rowid "
+            f"WHERE facts_fts MATCH ?{where} ORDER BY bm25(facts_fts) LIMIT ?",
+            (*params, limit),
+        )
+        return [text for (text,) in rows]
+
+    def dated(self, since: float, until: float) -> list[tuple]:
+        """(timestamp, photo, text) of archived facts dated within [since, until)."""
+        return [tuple(r) for r in self._conn().execute(
+            "SELECT timestamp, photo, text FROM facts WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (since, until),
+        )]
+
+    def undated(self) -> list[tuple]:
+        """(photo, text) of archived facts that carry no timestamp."""
+        return [tuple(r) for r in self._conn().execute(
+            "SELECT photo, text FROM facts WHERE timestamp IS NULL ORDER BY rowid"
+        )]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+
+    def get_meta(self, key: str, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
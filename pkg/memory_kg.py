@@ -1,12 +1,59 @@
-import os, re, ast, threading, json
+import os, asyncio, heapq, math, threading, time, unicodedata, uuid, hashlib
+from collections import deque
 import networkx as nx
-from openai import OpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-import pyarrow as pa
-import pyarrow.ipc as ipc
+from pkg.graph_store import ArrowGraphStore, _PHOTO_SUFFIX
+from pkg.memory_archive import MemoryArchive
+from pkg import vector_index, vector_shards
+from pkg.llm import get_client, get_async_client, get_embeddings
+from pkg.metrics import span
+from pkg.extraction import ExtractionError, get_extractor
 
 SHORT_TERM_WINDOW = 15
+NORMALIZE_LABELS = os.getenv("MINDLINK_NORMALIZE_LABELS", "0") == "1"
+# "local" (per-profile FAISS folders) or "sharded" (pkg.vector_shards)
+MEMORY_BACKEND = os.getenv("MINDLINK_MEMORY_BACKEND", "local")
+
+# Structural recall tuning
+RECALL_HOPS = int(os.getenv("MINDLINK_RECALL_HOPS", "2"))
+RECALL_FANOUT = int(os.getenv("MINDLINK_RECALL_FANOUT", "8"))
+RECALL_MAX_EDGES = int(os.getenv("MINDLINK_RECALL_MAX_EDGES", "15"))
+RECALL_TOKEN_BUDGET = int(os.getenv("MINDLINK_RECALL_TOKEN_BUDGET", "800"))
+RECENCY_HALF_LIFE_SECONDS = float(os.getenv("MINDLINK_RECENCY_HALF_LIFE_DAYS", "30")) * 86400
+RECENT_EDGE_WINDOW = 30
+# Graph versions kept for delta sync; older clients get a full resync.
+GRAPH_CHANGELOG = int(os.getenv("MINDLINK_GRAPH_CHANGELOG", "2000"))
+
+# Memory tiers: hot = touched recently, warm = the rest of the working graph
+# (including summaries), cold = consolidated into the per-profile archive.
+DAY = 86400
+HOT_SECONDS = float(os.getenv("MINDLINK_MEMORY_HOT_DAYS", "7")) * DAY
+CONSOLIDATE_AFTER_SECONDS = float(os.getenv("MINDLINK_MEMORY_CONSOLIDATE_AFTER_DAYS", "90")) * DAY
+# Facts of entities with a single connection go cold sooner.
+DECAY_AFTER_SECONDS = float(os.getenv("MINDLINK_MEMORY_DECAY_AFTER_DAYS", "30")) * DAY
+# Working-graph facts kept at most; the oldest beyond this are consolidated.
+WORKING_SET_EDGES = int(os.getenv("MINDLINK_MEMORY_WORKING_SET", "2000"))
+SUMMARY_MIN_FACTS = 3
+SUMMARY_MAX_CHARS = 400
+DEFAULT_TIERS = ("hot", "warm")
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for context budgeting."""
+    return len(text) // 4 + 1
+
+
+def clean_messages(messages) -> list[dict]:
+    """Keep only user/assistant turns with plain-text content."""
+    return [
+        {"role": m["role"], "content": m["content"]}
+        for m in messages
+        if m.get("role") in ["user", "assistant"] and isinstance(m.get("content"), str)
+    ]
+
+
+def normalize_label(label: str) -> str:
+    """Fold case, Unicode compatibility forms and whitespace so near-duplicate entities share a key."""
+    return " ".join(unicodedata.normalize("NFKC", str(label)).casefold().split())
 
 
 # ============================================================
@@ -14,10 +61,16 @@ SHORT_TERM_WINDOW = 15
 # ============================================================
 class MemoryAdapterBase:
     def save_graph(self, graph: nx.DiGraph): raise NotImplementedError
+    def append_graph(self, graph: nx.DiGraph, nodes, edges): self.save_graph(graph)
+    def remove_graph_edges(self, graph: nx.DiGraph, edges): self.save_graph(graph)
     def load_graph(self) -> nx.DiGraph: raise NotImplementedError
-    def add_embeddings(self, new_summaries: list[str]): raise NotImplementedError
+    def add_embeddings(self, new_summaries: list[str], metadatas: list[dict] = None): raise NotImplementedError
     def load_embeddings(self): raise NotImplementedError
-    def search(self, query: str, top_k: int = 5) -> list[str]: raise NotImplementedError
+    def search(self, query: str, top_k: int = 5, filters: dict = None) -> list[str]: raise NotImplementedError
+    def search_documents(self, query: str, top_k: int = 5, filters: dict = None) -> list[tuple[str, dict]]:
+        return [(t, {}) for t in self.search(query, top_k, filters)]
+    def delete_embeddings(self, keys: list[str]): raise NotImplementedError
+    def close(self): pass
 
 
 # ============================================================
@@ -31,88 +84,174 @@ class LocalFileAdapter(MemoryAdapterBase):
         self.profile_dir = os.path.join("data", profile_name)
         os.makedirs(self.profile_dir, exist_ok=True)
 
-        self.kg_path = os.path.join(self.profile_dir, f"memory_{profile_name}.arrow")
+        self.kg_path = legacy_graph_path(profile_name)
+        self.graph_store = graph_store_for(profile_name)
         self.faiss_path = os.path.join(self.profile_dir, f"faiss_{profile_name}")
-        self.embeddings = embeddings or OpenAIEmbeddings()
-        self.vector_db = None
-        self._lock = threading.Lock()
+        self.embeddings = embeddings or get_embeddings()
+        self._init_vectors()
+
+    def _init_vectors(self):
+        # Shared by every adapter opened on this profile.
+        self._index = vector_index.resident_index(self.faiss_path, self.embeddings)
+        self._lock = vector_index.LOCK
+
+    @property
+    def vector_db(self):
+        return self._index.db
 
     # -------------------------------
     # Graph persistence
     # -------------------------------
     def save_graph(self, graph: nx.DiGraph):
+        """Rewrite the full graph (used for compaction-style snapshots)."""
         try:
-            graph_dict = nx.node_link_data(graph, edges="links")
-            table = pa.table({"graph": [json.dumps(graph_dict)]})
-            with pa.OSFile(self.kg_path, "wb") as sink:
-                with ipc.new_file(sink, table.schema) as writer:
-                    writer.write_table(table)
+            with span("kg.graph_save"):
+                self.graph_store.snapshot(graph)
         except Exception as e:
             print(f"[ERROR] Failed to save KG: {e}")
 
+    def append_graph(self, graph: nx.DiGraph, nodes, edges):
+        """Persist only the nodes and edges touched by this turn."""
+        try:
+            with span("kg.graph_save"):
+                self.graph_store.append(graph, nodes, edges)
+        except Exception as e:
+            print(f"[ERROR] Failed to append KG: {e}")
+
+    def remove_graph_edges(self, graph: nx.DiGraph, edges):
+        """Persist edge deletions as tombstones."""
+        try:
+            with span("kg.graph_save"):
+                self.graph_store.remove_edges(graph, edges)
+        except Exception as e:
+            print(f"[ERROR] Failed to remove KG edges: {e}")
+
     def load_graph(self) -> nx.DiGraph:
-        if os.path.exists(self.kg_path):
-            try:
-                with pa.memory_map(self.kg_path, "r") as source:
-                    reader = ipc.open_file(source)
-                    table = reader.read_all()
-                    graph_json = table["graph"][0].as_py()
-                    graph_dict = json.loads(graph_json)
-                    return nx.node_link_graph(graph_dict, edges="links")
-            except Exception as e:
-                print(f"[WARN] Arrow load failed: {e}")
-        return nx.DiGraph()
+        with span("kg.graph_load"):
+            return self._load_graph()
+
+    def _load_graph(self) -> nx.DiGraph:
+        return load_graph_only(self.graph_store, self.kg_path)
 
     # -------------------------------
     # Vector memory (FAISS)
     # -------------------------------
-    def add_embeddings(self, new_summaries: list[str]):
-        """Add new embeddings to FAISS index safely."""
-        clean_texts = [t.strip() for t in new_summaries if isinstance(t, str) and t.strip()]
-        if not clean_texts:
+    def add_embeddings(self, new_summaries: list[str], metadatas: list[dict] = None):
+        """Queue new summaries (with optional per-summary metadata) for the resident FAISS index."""
+        clean = _clean_summaries(new_summaries, metadatas)
+        if not clean:
             print("⚠️ Skipped FAISS update (no valid text)")
             return
-
-        def _update():
-            with self._lock:
-                try:
-                    if os.path.exists(self.faiss_path):
-                        db = FAISS.load_local(
-                            self.faiss_path, self.embeddings, allow_dangerous_deserialization=True
-                        )
-                        db.add_texts(clean_texts)
-                    else:
-                        db = FAISS.from_texts(clean_texts, self.embeddings)
-                    db.save_local(self.faiss_path)
-                    self.vector_db = db
-                    print(f"[FAISS] ✅ Updated ({len(clean_texts)} new items)")
-                except Exception as e:
-                    print(f"[ERROR] FAISS update failed: {e}")
-
-        threading.Thread(target=_update, daemon=True).start()
+        self._index.enqueue([t for t, _ in clean], [m for _, m in clean])
 
     def load_embeddings(self):
+        with span("kg.faiss_load"):
+            self._index.load()
+
+    def search(self, query: str, top_k: int = 5, filters: dict = None) -> list[str]:
+        return [text for text, _ in self.search_documents(query, top_k, filters)]
+
+    def search_documents(self, query: str, top_k: int = 5, filters: dict = None) -> list[tuple[str, dict]]:
+        """Nearest summaries, optionally restricted by photo / speaker / time window."""
+        try:
+            with span("kg.vector_search"):
+                return self._index.search_documents(query, top_k, filters)
+        except Exception as e:
+            print(f"[ERROR] FAISS search failed: {e}")
+            return []
+
+    def delete_embeddings(self, keys: list[str]):
+        """Drop the vectors stored under the given keys (see `vector_index.edge_key`)."""
+        return self._index.remove(keys)
+
+    def close(self):
+        vector_index.release_index(self.faiss_path)
+
+
+def graph_store_for(profile_name: str) -> ArrowGraphStore:
+    return ArrowGraphStore(os.path.join("data", profile_name, f"graph_{profile_name}"))
+
+
+def legacy_graph_path(profile_name: str) -> str:
+    return os.path.join("data", profile_name, f"memory_{profile_name}.arrow")
+
+
+def load_graph_only(store: ArrowGraphStore, legacy_path: str = None) -> nx.DiGraph:
+    """Load a profile's graph without touching its vectors."""
+    if legacy_path:
+        try:
+            store.migrate_legacy(legacy_path)
+        except Exception as e:
+            print(f"[WARN] KG migration failed: {e}")
+    # A load error propagates: an empty graph here would be persisted over the real one.
+    return store.load()
+
+
+def _clean_summaries(summaries, metadatas=None) -> list[tuple[str, dict]]:
+    metadatas = metadatas or [{} for _ in summaries]
+    return [(t.strip(), m) for t, m in zip(summaries, metadatas) if isinstance(t, str) and t.strip()]
+
+
+# ============================================================
+# Sharded memory-mapped adapter
+# ============================================================
+class ShardedMmapAdapter(LocalFileAdapter):
+    """Graph storage as in LocalFileAdapter; vectors in the shared sharded store.
+
+    Base indexes are memory-mapped read-only files and documents live in
+    per-shard SQLite, so nothing is unpickled and idle profiles cost no RAM.
+    An existing `faiss_<profile>` folder is imported on first open.
+    """
+
+    def _init_vectors(self):
+        with span("kg.faiss_load"):
+            self.vectors = vector_shards.open_profile(self.profile_name, self.embeddings)
         if os.path.exists(self.faiss_path):
             try:
-                self.vector_db = FAISS.load_local(
-                    self.faiss_path, self.embeddings, allow_dangerous_deserialization=True
-                )
-                print(f"[FAISS] ✅ Loaded for {self.profile_name}")
+                self.vectors.import_legacy(self.faiss_path)
             except Exception as e:
-                print(f"[WARN] FAISS load failed: {e}")
+                print(f"[WARN] Vector migration failed: {e}")
 
-    def search(self, query: str, top_k: int = 5) -> list[str]:
-        if not self.vector_db:
-            self.load_embeddings()
-        if not self.vector_db:
-            return []
+    @property
+    def vector_db(self):
+        return None
+
+    def add_embeddings(self, new_summaries: list[str], metadatas: list[dict] = None):
+        """Embed and store new summaries (runs in the caller's thread)."""
+        clean = _clean_summaries(new_summaries, metadatas)
+        if not clean:
+            print("⚠️ Skipped vector update (no valid text)")
+            return
         try:
-            results = self.vector_db.similarity_search(query, k=top_k)
-            return [r.page_content for r in results]
+            with span("kg.faiss_save"):
+                self.vectors.add([t for t, _ in clean], [m for _, m in clean])
         except Exception as e:
-            print(f"[ERROR] FAISS search failed: {e}")
+            print(f"[ERROR] Vector update failed: {e}")
+
+    def load_embeddings(self):
+        pass  # opened lazily by the OS page cache
+
+    def search_documents(self, query: str, top_k: int = 5, filters: dict = None) -> list[tuple[str, dict]]:
+        try:
+            with span("kg.vector_search"):
+                return self.vectors.search_documents(query, top_k, filters)
+        except Exception as e:
+            print(f"[ERROR] Vector search failed: {e}")
             return []
 
+    def delete_embeddings(self, keys: list[str]):
+        return self.vectors.remove(keys)
+
+    def close(self):
+        vector_shards.close_profile(self.profile_name)
+
+
+def create_adapter(profile_name: str) -> MemoryAdapterBase:
+    """Storage adapter for a profile according to MINDLINK_MEMORY_BACKEND."""
+    if MEMORY_BACKEND == "sharded":
+        return ShardedMmapAdapter(profile_name=profile_name)
+    return LocalFileAdapter(profile_name=profile_name)
+
 
 # ============================================================
 # Memory Knowledge Graph
@@ -120,117 +259,576 @@ class LocalFileAdapter(MemoryAdapterBase):
 class MemoryKG:
     """Combines knowledge graph and vector memory (FAISS) for persistent recall."""
 
-    def __init__(self, adapter: MemoryAdapterBase, profile_name="default"):
-        self.client = OpenAI()
+    def __init__(self, adapter: MemoryAdapterBase, profile_name="default", client=None, aclient=None, normalize_labels=None):
+        self.client = client or get_client()
+        self.aclient = aclient or get_async_client()
         self.profile_name = profile_name
         self.adapter = adapter
+        self.lock = threading.RLock()
+        self.normalize_labels = NORMALIZE_LABELS if normalize_labels is None else normalize_labels
         self.G = self.adapter.load_graph()
         self.adapter.load_embeddings()
-        self.node_counter = len(self.G.nodes)
+        # Past the highest id, so ids of consolidated-away nodes are never reused.
+        self.node_counter = 1 + max(
+            (int(n[7:]) for n in self.G if str(n).startswith("entity_") and str(n)[7:].isdigit()), default=-1
+        )
+        self._archive = None
+        self.label_index = self._load_label_index()
+        self._build_recency_index()
+        # Delta sync: a fresh epoch per load, then one version per graph change.
+        self.graph_epoch = uuid.uuid4().hex[:12]
+        self.graph_version = 0
+        self.graph_changes = deque(maxlen=GRAPH_CHANGELOG)
+
+    def estimated_bytes(self) -> int:
+        """Rough resident size of the graph and vector index, used for cache budgeting."""
+        size = 400 * self.G.number_of_nodes() + 300 * self.G.number_of_edges()
+        db = getattr(self.adapter, "vector_db", None)
+        if db is not None:
+            # float32 vectors plus the docstore entry per vector
+            size += db.index.ntotal * (4 * db.index.d + 300)
+        return size
 
     # -------------------------------
     # Triplet extraction
     # -------------------------------
-    def _extract_triplets_chunk(self, messages_chunk):
-        """Extract factual (subject, predicate, object) triplets."""
-        text = "\n".join(
-            m["content"] for m in messages_chunk
-            if m.get("role") in ["user", "assistant"] and isinstance(m.get("content"), str)
-        )
+    @staticmethod
+    def _turn_text(messages) -> str:
+        return "\n".join(m["content"] for m in clean_messages(messages))
 
-        if not text.strip():
-            return []
+    def _extract_triplets_batch(self, turns):
+        """Triplets per turn via the shared extraction engine (batched, cached); None marks a failed turn."""
+        return get_extractor().extract([self._turn_text(t) for t in turns], self.client)
 
-        prompt = (
-            "Extract concise (subject, predicate, object) triplets OR high-level summaries "
-            "from the text below. If factual extraction fails, return meaningful summaries instead. "
-            "Return ONLY a valid Python list of tuples.\n\nText:\n"
-            f"{text}"
-        )
-
-        try:
-            resp = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
-            )
-            raw = resp.choices[0].message.content
-            match = re.search(r"\[.*\]", raw, re.DOTALL)
-            parsed = ast.literal_eval(match.group()) if match else []
-            triplets = []
-            for t in parsed:
-                if isinstance(t, (tuple, list)) and len(t) == 3:
-                    triplets.append(tuple(map(str, t)))
-                elif isinstance(t, dict) and {"subject", "predicate", "object"}.issubset(t):
-                    triplets.append((t["subject"], t["predicate"], t["object"]))
-            return triplets
-        except Exception as e:
-            print(f"[WARN] Triplet extraction failed: {e}")
-            # fallback — return summaries
-            return [("User", "said", text[:200])]
+    def _extract_triplets_chunk(self, messages_chunk):
+        """Extract factual (subject, predicate, object) triplets; [] if extraction failed."""
+        return self._extract_triplets_batch([messages_chunk])[0] or []
 
     # -------------------------------
     # Graph management
     # -------------------------------
-    def _get_or_create_node(self, label):
+    def _label_key(self, label) -> str:
+        return normalize_label(label) if self.normalize_labels else str(label)
+
+    def _load_label_index(self) -> dict:
+        """Build the label index from the keys saved with each node, recomputing stale ones."""
+        reuse = self.G.graph.get("label_index_normalized") == self.normalize_labels
+        index = {}
         for n, data in self.G.nodes(data=True):
-            if data.get("label") == label:
-                return n
+            if data.get("type") == "Summary":
+                continue
+            key = data.get("key") if reuse else None
+            if key is None:
+                key = self._label_key(data.get("label"))
+                data["key"] = key
+            # First node wins, matching the old linear scan.
+            index.setdefault(key, n)
+        if not reuse and len(self.G):
+            # Keys changed meaning: persist them once so the next load can reuse them.
+            self.G.graph["label_index_normalized"] = self.normalize_labels
+            self.adapter.save_graph(self.G)
+        self.G.graph["label_index_normalized"] = self.normalize_labels
+        return index
+
+    def _build_recency_index(self):
+        """Per-node last-touched time and a window of the newest edges, built once at load."""
+        self.node_recency = {}
+        ranked = []
+        for order, (u, v, d) in enumerate(self.G.edges(data=True)):
+            ts = d.get("timestamp") or 0.0
+            for n in (u, v):
+                if ts > self.node_recency.get(n, 0.0):
+                    self.node_recency[n] = ts
+            ranked.append((ts, order, u, v))
+        newest = heapq.nlargest(RECENT_EDGE_WINDOW, ranked)
+        self.recent_edges = deque(((u, v) for _, _, u, v in reversed(newest)), maxlen=RECENT_EDGE_WINDOW)
+
+    def _record_change(self, nodes=(), edges=(), removed=()):
+        """Bump the graph version and log what changed (caller holds self.lock)."""
+        self.graph_version += 1
+        self.graph_changes.append((self.graph_version, tuple(nodes), tuple(edges), tuple(removed)))
+
+    def changes_since(self, version: int):
+        """Nodes, edges and removed edges changed after `version`, or None if not in the log."""
+        with self.lock:
+            if version == self.graph_version:
+                return {"nodes": set(), "edges": set(), "removed": set()}
+            if version > self.graph_version or not self.graph_changes or self.graph_changes[0][0] > version + 1:
+                return None
+            nodes, edges, removed = set(), set(), set()
+            for v, n, e, r in self.graph_changes:
+                if v > version:
+                    nodes.update(n)
+                    edges.update(e)
+                    removed.update(r)
+            # Net effect: whatever exists now is an upsert, the rest is a removal.
+            live = {e for e in edges | removed if self.G.has_edge(*e)}
+            return {"nodes": nodes, "edges": live, "removed": (edges | removed) - live}
+
+    def _touch_edge(self, u, v, ts):
+        self.node_recency[u] = max(self.node_recency.get(u, 0.0), ts)
+        self.node_recency[v] = max(self.node_recency.get(v, 0.0), ts)
+        self.recent_edges.append((u, v))
+
+    def _get_or_create_node(self, label, new_nodes=None):
+        key = self._label_key(label)
+        node_id = self.label_index.get(key)
+        if node_id is not None:
+            return node_id
         node_id = f"entity_{self.node_counter}"
+        while node_id in self.G:
+            self.node_counter += 1
+            node_id = f"entity_{self.node_counter}"
         self.node_counter += 1
-        self.G.add_node(node_id, type="Entity", label=label)
+        self.G.add_node(node_id, type="Entity", label=label, key=key, timestamp=time.time())
+        self.label_index[key] = node_id
+        if new_nodes is not None:
+            new_nodes.append(node_id)
         return node_id
 
     def add_chunk_to_graph(self, new_messages, photo_name=None):
         """Add conversation messages to persistent graph + FAISS memory."""
-        clean_messages = [
-            {"role": m["role"], "content": m["content"]}
-            for m in new_messages
-            if m.get("role") in ["user", "assistant"] and isinstance(m.get("content"), str)
-        ]
-        if not clean_messages:
+        messages = clean_messages(new_messages)
+        if not messages:
             return
+        self._apply_triplets(self._extract_triplets_chunk(messages), photo_name)
 
-        triplets = self._extract_triplets_chunk(clean_messages)
-        if not triplets:
+    def add_turns_to_graph(self, turns):
+        """Ingest several queued turns ({"messages", "photo_name", "speaker"}) with batched extraction.
+
+        Turns are applied in order up to the first one whose extraction failed;
+        ExtractionError then says how many landed (`applied`).
+        """
+        kept = [(i, t) for i, t in enumerate(turns) if clean_messages(t["messages"])]
+        if not kept:
             return
+        per_turn = self._extract_triplets_batch([t["messages"] for _, t in kept])
+        failed = [j for j, triplets in enumerate(per_turn) if triplets is None]
+        stop = failed[0] if failed else len(kept)
+        self._apply_facts([
+            (s, p, o, turn.get("photo_name"), turn.get("speaker"))
+            for (_, turn), triplets in zip(kept[:stop], per_turn[:stop])
+            for s, p, o in triplets
+        ])
+        if failed:
+            # Later turns stay queued rather than landing twice; on retry their results are cache hits.
+            raise ExtractionError(len(failed), len(kept), applied=kept[stop][0])
+
+    def _apply_triplets(self, triplets, photo_name=None, speaker=None):
+        self._apply_facts([(s, p, o, photo_name, speaker) for s, p, o in triplets])
 
-        new_summaries = []
-        for s, p, o in triplets:
-            s_id = self._get_or_create_node(s)
-            o_id = self._get_or_create_node(o)
-            relation = f"{p} [photo: {photo_name}]" if photo_name else p
-            self.G.add_edge(s_id, o_id, relation=relation)
-            new_summaries.extend([f"{s} {p} {o}"])
+    def _apply_facts(self, facts):
+        if not facts:
+            return
 
-        self.adapter.save_graph(self.G)
-        self.adapter.add_embeddings(new_summaries)
+        with self.lock:
+            new_summaries, new_nodes, new_edges, new_metadatas = [], [], [], []
+            now = time.time()
+            for s, p, o, photo_name, speaker in facts:
+                s_id = self._get_or_create_node(s, new_nodes)
+                o_id = self._get_or_create_node(o, new_nodes)
+                relation = f"{p} [photo: {photo_name}]" if photo_name else p
+                self.G.add_edge(s_id, o_id, relation=relation, photo=photo_name, timestamp=now)
+                if speaker:
+                    self.G.edges[s_id, o_id]["speaker"] = speaker
+                self._touch_edge(s_id, o_id, now)
+                new_edges.append((s_id, o_id))
+                new_summaries.extend([f"{s} {p} {o}"])
+                # Keyed by edge, so restating a fact replaces its vector instead of adding one.
+                new_metadatas.append(
+                    {"source": s_id, "target": o_id, "photo": photo_name, "speaker": speaker, "timestamp": now}
+                )
+
+            self.adapter.append_graph(self.G, new_nodes, new_edges)
+            self._record_change(new_nodes, new_edges)
+        self.adapter.add_embeddings(new_summaries, new_metadatas)
+
+    def delete_fact(self, subject: str, obj: str) -> bool:
+        """Remove the edge between two labels, together with its stored vector."""
+        with self.lock:
+            s_id = self.label_index.get(self._label_key(subject))
+            o_id = self.label_index.get(self._label_key(obj))
+            if s_id is None or o_id is None or not self.G.has_edge(s_id, o_id):
+                return False
+            self.G.remove_edge(s_id, o_id)
+            self.adapter.remove_graph_edges(self.G, [(s_id, o_id)])
+            self._record_change(removed=[(s_id, o_id)])
+        self.adapter.delete_embeddings([vector_index.edge_key(s_id, o_id)])
+        print(f"[KG] Deleted {subject} → {obj} for {self.profile_name}")
+        return True
 
     # -------------------------------
-    # Recall
+    # Tiers and consolidation
     # -------------------------------
-    def retrieve_relevant_context(self, query, top_k=5):
-        """Combine semantic and structural recall."""
-        text_hits = self.adapter.search(query, top_k)
-        edge_context = []
-
-        for u, v, d in list(self.G.edges(data=True))[-30:]:
-            edge_context.append(
-                f"{self.G.nodes[u].get('label')} — {d.get('relation', '')} → {self.G.nodes[v].get('label')}"
+    @property
+    def archive(self) -> MemoryArchive:
+        if self._archive is None:
+            self._archive = MemoryArchive(self.profile_name)
+        return self._archive
+
+    def _is_summary(self, node) -> bool:
+        return self.G.nodes[node].get("type") == "Summary"
+
+    def tier_stats(self, now=None) -> dict:
+        """Fact counts per tier, plus the number of summaries in the working graph."""
+        now = now or time.time()
+        with self.lock:
+            hot = warm = summaries = 0
+            for _, v, d in self.G.edges(data=True):
+                if self._is_summary(v):
+                    summaries += 1
+                elif (d.get("timestamp") or 0.0) >= now - HOT_SECONDS:
+                    hot += 1
+                else:
+                    warm += 1
+        return {
+            "hot": hot, "warm": warm, "summaries": summaries, "cold": self.archive.count(),
+            "working_set_limit": WORKING_SET_EDGES,
+            "last_consolidated": self.archive.get_meta("last_consolidated"),
+        }
+
+    def _fact_text(self, u, v, d) -> str:
+        # Caller holds self.lock.
+        return f"{self.G.nodes[u].get('label')} {_PHOTO_SUFFIX.sub('', d.get('relation', ''))} {self.G.nodes[v].get('label')}"
+
+    def dated_facts(self, since=None, until=None) -> list[tuple]:
+        """(timestamp, photo, text) of dated facts in [since, until), working graph and archive alike."""
+        since = since if since is not None else float("-inf")
+        until = until if until is not None else float("inf")
+        with self.lock:
+            facts = [
+                (d["timestamp"], d.get("photo"), self._fact_text(u, v, d))
+                for u, v, d in self.G.edges(data=True)
+                if not self._is_summary(v) and d.get("timestamp") is not None and since <= d["timestamp"] < until
+            ]
+        return sorted(facts + self.archive.dated(since, until), key=lambda f: f[0])
+
+    def undated_facts(self) -> list[tuple]:
+        """(photo, text) of facts stored without a timestamp (graphs older than fact timestamps)."""
+        with self.lock:
+            facts = [
+                (d.get("photo"), self._fact_text(u, v, d))
+                for u, v, d in self.G.edges(data=True)
+                if not self._is_summary(v) and d.get("timestamp") is None
+            ]
+        return facts + self.archive.undated()
+
+    def consolidation_due(self, every: float, now=None) -> bool:
+        now = now or time.time()
+        if self.G.number_of_edges() > WORKING_SET_EDGES:
+            return True
+        return (self.archive.get_meta("last_consolidated") or 0.0) < now - every
+
+    def _consolidation_candidates(self, now) -> set:
+        # Caller holds self.lock.
+        facts = [(u, v, d) for u, v, d in self.G.edges(data=True) if not self._is_summary(v)]
+        candidates = set()
+        for u, v, d in facts:
+            ts = d.get("timestamp")
+            if ts is None:
+                continue  # legacy facts have no age; only the working-set limit moves them
+            if ts < now - CONSOLIDATE_AFTER_SECONDS:
+                candidates.add((u, v))
+            elif ts < now - DECAY_AFTER_SECONDS and min(self.G.degree(u), self.G.degree(v)) <= 1:
+                candidates.add((u, v))
+        overflow = len(facts) - len(candidates) - WORKING_SET_EDGES
+        if overflow > 0:
+            rest = sorted(
+                ((d.get("timestamp") or 0.0, str(u), str(v), u, v) for u, v, d in facts if (u, v) not in candidates)
             )
+            candidates.update((u, v) for *_, u, v in rest[:overflow])
+        return candidates
+
+    def _summary_text(self, anchor, rows) -> str:
+        """Newest archived facts of an entity, cut to SUMMARY_MAX_CHARS, with the count and date span."""
+        dated = [ts for _, ts in rows if ts]
+        span_text = ""
+        if dated:
+            first, last = (time.strftime("%b %Y", time.localtime(t)) for t in (min(dated), max(dated)))
+            span_text = f", {first}" if first == last else f", {first} – {last}"
+        tail = f" ({len(rows)} facts{span_text})"
+        parts, used = [], len(tail)
+        for text, _ in rows:
+            if parts and used + len(text) + 2 > SUMMARY_MAX_CHARS:
+                break
+            parts.append(text)
+            used += len(text) + 2
+        more = len(rows) - len(parts)
+        return "; ".join(parts) + (f"; +{more} more" if more else "") + tail
+
+    def consolidate(self, now=None) -> dict:
+        """Move old and decayed facts to the cold archive, summarizing them per entity.
+
+        Each archived fact is clustered under its better-connected endpoint
+        (the anchor). An anchor with at least SUMMARY_MIN_FACTS archived facts
+        gets one summary node and vector, regenerated from the archive so
+        repeated runs fold into it. Entities left without edges are dropped.
+        """
+        now = now or time.time()
+        with self.lock:
+            candidates = self._consolidation_candidates(now)
+            if not candidates:
+                self.archive.set_meta("last_consolidated", now)
+                return {"archived": 0, "summaries": 0, "dropped_nodes": 0}
+            records, anchors = [], set()
+            for u, v in candidates:
+                d = self.G.edges[u, v]
+                anchor = u if self.G.degree(u) >= self.G.degree(v) else v
+                anchors.add(anchor)
+                predicate = _PHOTO_SUFFIX.sub("", d.get("relation", ""))
+                records.append({
+                    "source": str(u), "target": str(v), "anchor": str(anchor),
+                    "text": f"{self.G.nodes[u].get('label')} {predicate} {self.G.nodes[v].get('label')}",
+                    "relation": d.get("relation"), "photo": d.get("photo"),
+                    "speaker": d.get("speaker"), "timestamp": d.get("timestamp"),
+                })
+            # Archive first: a crash after this point loses no facts.
+            self.archive.add(records)
+            self.G.remove_edges_from(candidates)
+
+            summaries, summary_metas = [], []
+            for anchor in anchors:
+                rows = self.archive.by_anchor(str(anchor))
+                if len(rows) < SUMMARY_MIN_FACTS:
+                    continue
+                summary_id = f"summary_{anchor}"
+                if summary_id not in self.G:
+                    label = f"{self.G.nodes[anchor].get('label')} (summary)"
+                    self.G.add_node(summary_id, type="Summary", label=label, key=None, timestamp=now)
+                text = self._summary_text(anchor, rows)
+                newest = rows[0][1]
+                self.G.add_edge(anchor, summary_id, relation=text, timestamp=newest)
+                summaries.append(text)
+                summary_metas.append({"source": anchor, "target": summary_id, "timestamp": newest})
+
+            dropped = [
+                n for n in {n for edge in candidates for n in edge}
+                if n in self.G and self.G.degree(n) == 0 and not self._is_summary(n)
+            ]
+            self.G.remove_nodes_from(dropped)
+            gone = set(dropped)
+            self.label_index = {k: n for k, n in self.label_index.items() if n not in gone}
+            for n in dropped:
+                self.node_recency.pop(n, None)
+            self.adapter.save_graph(self.G)
+            # Nodes were removed, which deltas can't express: clients resync.
+            self.graph_epoch = uuid.uuid4().hex[:12]
+            self.graph_version = 0
+            self.graph_changes.clear()
+            self.archive.set_meta("last_consolidated", now)
+
+        self.adapter.delete_embeddings([vector_index.edge_key(u, v) for u, v in candidates])
+        if summaries:
+            self.adapter.add_embeddings(summaries, summary_metas)
+        print(
+            f"[KG] Consolidated {self.profile_name}: {len(candidates)} facts archived, "
+            f"{len(summaries)} summaries, {len(dropped)} entities dropped"
+        )
+        return {"archived": len(candidates), "summaries": len(summaries), "dropped_nodes": len(dropped)}
+
+    # -------------------------------
+    # Recall
+    # -------------------------------
+    def _edge_line(self, u, v, d) -> str:
+        if self.G.nodes[v].get("type") == "Summary":
+            return f"{self.G.nodes[u].get('label')} (summary) — {d.get('relation', '')}"
+        return f"{self.G.nodes[u].get('label')} — {d.get('relation', '')} → {self.G.nodes[v].get('label')}"
+
+    def _recency_weight(self, d, now) -> float:
+        ts = d.get("timestamp")
+        if not ts:
+            return 0.5  # legacy edges carry no timestamp
+        return max(0.05, 0.5 ** ((now - ts) / RECENCY_HALF_LIFE_SECONDS))
+
+    @staticmethod
+    def _edge_matches(d, filters) -> bool:
+        """Apply the vector-search filters (photo, speaker, since/until) to a graph edge."""
+        if not filters:
+            return True
+        for field in ("photo", "speaker"):
+            wanted = filters.get(field)
+            if wanted is not None:
+                values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+                if d.get(field) not in values:
+                    return False
+        ts = d.get("timestamp")
+        if filters.get("since") is not None and (ts is None or ts < filters["since"]):
+            return False
+        if filters.get("until") is not None and (ts is None or ts > filters["until"]):
+            return False
+        return True
+
+    def _link_hits(self, hits) -> dict:
+        """Map semantic hits back to graph nodes: via stored metadata, else by label prefix/suffix."""
+        seeds = {}
+        for rank, (text, meta) in enumerate(hits):
+            weight = 1.0 / (1 + rank)
+            nodes = [meta.get(k) for k in ("source", "target") if meta.get(k) in self.G]
+            if not nodes:
+                words = text.split()
+                for i in range(len(words) - 1, 0, -1):
+                    node = self.label_index.get(self._label_key(" ".join(words[:i])))
+                    if node is not None:
+                        nodes.append(node)
+                        break
+                for i in range(1, len(words)):
+                    node = self.label_index.get(self._label_key(" ".join(words[i:])))
+                    if node is not None:
+                        nodes.append(node)
+                        break
+            for n in nodes:
+                seeds[n] = max(seeds.get(n, 0.0), weight)
+        return seeds
+
+    def _expand(self, seeds: dict, hops: int, filters: dict = None) -> dict:
+        """Score edges in the k-hop neighbourhood of the seed nodes.
+
+        Each hop follows at most RECALL_FANOUT of a node's most recent edges
+        (only edges passing `filters`); scores decay per hop and with age, and
+        hub nodes are damped by degree.
+        """
+        now = time.time()
+        edge_scores = {}
+        frontier, visited = dict(seeds), set(seeds)
+        for _ in range(hops):
+            nxt = {}
+            for n, weight in frontier.items():
+                incident = [(n, v, d) for v, d in self.G.succ[n].items() if self._edge_matches(d, filters)]
+                incident += [(u, n, d) for u, d in self.G.pred[n].items() if self._edge_matches(d, filters)]
+                for u, v, d in heapq.nlargest(RECALL_FANOUT, incident, key=lambda e: e[2].get("timestamp") or 0.0):
+                    other = v if u == n else u
+                    score = weight * self._recency_weight(d, now) / math.log(2 + self.G.degree(other))
+                    if score > edge_scores.get((u, v), 0.0):
+                        edge_scores[(u, v)] = score
+                    if other not in visited:
+                        nxt[other] = max(nxt.get(other, 0.0), weight * 0.5)
+            visited.update(nxt)
+            frontier = nxt
+        return edge_scores
+
+    def retrieve_relevant_context(
+        self, query, top_k=5, hops=RECALL_HOPS, token_budget=RECALL_TOKEN_BUDGET, filters=None, tiers=DEFAULT_TIERS
+    ):
+        """Combine semantic and structural recall within a token budget.
+
+        FAISS hits seed a k-hop walk over the graph; the walk only touches the
+        neighbourhood of the hits, never the whole edge list. `filters`
+        (photo, speaker, since, until) restricts both the vector search and
+        the edges the walk may use.
+
+        `tiers` picks the memory searched: "hot" alone limits recall to recent
+        facts, "warm" adds the rest of the working graph and its summaries,
+        and "cold" also keyword-searches the archive.
+        """
+        working = "hot" in tiers or "warm" in tiers
+        if working and "warm" not in tiers:
+            since = time.time() - HOT_SECONDS
+            filters = {**(filters or {}), "since": max(since, (filters or {}).get("since") or since)}
+        hits = self.adapter.search_documents(query, top_k, filters) if working else []
+
+        with self.lock, span("kg.graph_walk"):
+            edge_scores = self._expand(self._link_hits(hits), hops, filters) if hits else {}
+            if not edge_scores and working:
+                # Nothing to anchor on: fall back to the newest memories.
+                now = time.time()
+                edge_scores = {
+                    (u, v): self._recency_weight(self.G.edges[u, v], now) * (1 + i / RECENT_EDGE_WINDOW)
+                    for i, (u, v) in enumerate(self.recent_edges)
+                    if self.G.has_edge(u, v) and self._edge_matches(self.G.edges[u, v], filters)
+                }
+            ranked = heapq.nlargest(RECALL_MAX_EDGES, edge_scores.items(), key=lambda kv: kv[1])
+            edge_context = [self._edge_line(u, v, self.G.edges[u, v]) for (u, v), _ in ranked]
+
+        budget = token_budget
+        text_hits = []
+        for text, _ in hits:
+            cost = approx_tokens(text)
+            if cost > budget:
+                break
+            text_hits.append(text)
+            budget -= cost
+        graph_lines = []
+        for line in edge_context:
+            cost = approx_tokens(line)
+            if cost > budget:
+                break
+            graph_lines.append(line)
+            budget -= cost
+
+        archived = []
+        if "cold" in tiers:
+            with span("kg.archive_search"):
+                found = self.archive.search(query, top_k, filters)
+            for line in found:
+                cost = approx_tokens(line)
+                if cost > budget:
+                    break
+                archived.append(line)
+                budget -= cost
 
         context = ""
         if text_hits:
             context += "Semantic recall:\n" + "\n".join(text_hits)
-        if edge_context:
-            context += "\n\nGraph recall:\n" + "\n".join(edge_context[-10:])
+        if graph_lines:
+            context += "\n\nGraph recall:\n" + "\n".join(graph_lines)
+        if archived:
+            context += "\n\nArchived memory:\n" + "\n".join(archived)
         return context.strip()
 
+    async def aretrieve_relevant_context(self, query, top_k=5, **kwargs):
+        """Run recall (query embedding + FAISS search) off the event loop."""
+        return await asyncio.to_thread(self.retrieve_relevant_context, query, top_k, **kwargs)
+
 
 # ============================================================
 # Frontend visualization helper
 # ============================================================
-def graph_to_json(graph: nx.Graph):
-    nodes = [{"id": str(n), "label": str(graph.nodes[n].get("label", n))} for n in graph.nodes()]
-    edges = [{"from": str(u), "to": str(v), "label": d.get("relation", "")} for u, v, d in graph.edges(data=True)]
-    return {"nodes": nodes, "edges": edges}
\ No newline at end of file
+def node_to_json(graph: nx.Graph, n) -> dict:
+    return {"id": str(n), "label": str(graph.nodes[n].get("label", n))}
+
+
+def edge_to_json(graph: nx.Graph, u, v) -> dict:
+    return {"from": str(u), "to": str(v), "label": graph.edges[u, v].get("relation", "")}
+
+
+def graph_to_json(graph: nx.Graph, nodes=None, edges=None):
+    """Visualizer payload for the whole graph, or for the given nodes and edges."""
+    nodes = graph.nodes() if nodes is None else nodes
+    edges = graph.edges() if edges is None else edges
+    return {
+        "nodes": [node_to_json(graph, n) for n in nodes],
+        "edges": [edge_to_json(graph, u, v) for u, v in edges],
+    }
+
+
+class GraphSnapshot:
+    """Read-only graph of a profile that isn't loaded, for serving without its vectors.
+
+    Versioned like MemoryKG; the epoch is derived from the files on disk, so
+    an unchanged store keeps its ETags across reloads.
+    """
+
+    def __init__(self, profile_name: str):
+        self.profile_name = profile_name
+        self.store = graph_store_for(profile_name)
+        # Sign before loading: a write in between only makes the snapshot look stale.
+        self.signature = store_signature(self.store)
+        self.G = load_graph_only(self.store, legacy_graph_path(profile_name))
+        self.lock = threading.RLock()
+        self.graph_epoch = "d" + hashlib.blake2b(repr(self.signature).encode(), digest_size=6).hexdigest()
+        self.graph_version = 0
+
+    def changes_since(self, version: int):
+        return {"nodes": set(), "edges": set(), "removed": set()} if version == 0 else None
+
+    def is_current(self) -> bool:
+        return store_signature(self.store) == self.signature
+
+
+def store_signature(store: ArrowGraphStore) -> tuple:
+    """Cheap fingerprint of a graph store's files (name, size, mtime)."""
+    try:
+        entries = sorted(os.scandir(store.path), key=lambda e: e.name)
+    except FileNotFoundError:
+        return ()
+    return tuple((e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.name.endswith(".arrow"))
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os, asyncio, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from pkg.memory_kg import MemoryKG, create_adapter
+
+MAX_PROFILES = int(os.getenv("MINDLINK_MEMORY_MAX_PROFILES", "32"))
+IDLE_TTL_SECONDS = float(os.getenv("MINDLINK_MEMORY_IDLE_TTL", "1800"))
+MAX_BYTES = int(os.getenv("MINDLINK_MEMORY_MAX_MB", "512")) * 1024 * 1024
+
+
+# ============================================================
+# Live MemoryKG registry
+# ============================================================
+class MemoryRegistry:
+    """Keeps loaded MemoryKG objects alive across requests.
+
+    Entries are evicted least-recently-used first when the registry holds more
+    than `max_profiles` profiles or more than `max_bytes` of estimated memory,
+    and whenever a profile has been idle for longer than `idle_ttl` seconds.
+    Profiles held through `lease()` are never evicted, so there is only ever one
+    live MemoryKG per profile: a reload can't race a holder of the old instance.
+    """
+
+    def __init__(self, max_profiles=MAX_PROFILES, idle_ttl=IDLE_TTL_SECONDS, max_bytes=MAX_BYTES, factory=None):
+        self.max_profiles = max_profiles
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.factory = factory or self._load
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, list] = {}  # profile -> [lock, waiters]
+        self._released = threading.Condition(self._lock)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _release(memory: MemoryKG):
+        # Flushing may embed queued texts, so keep it off the registry lock.
+        threading.Thread(target=memory.adapter.close, daemon=True).start()
+
+    @staticmethod
+    def _load(profile: str) -> MemoryKG:
+        adapter = create_adapter(profile)
+        return MemoryKG(adapter, profile_name=profile)
+
+    def get(self, profile: str) -> MemoryKG:
+        """Return the live memory for a profile, loading it from disk on a miss.
+
+        The result isn't leased: use `lease()` to hold it across blocking calls.
+        """
+        return self._get(profile, lease=False)
+
+    def acquire(self, profile: str, load: bool = True):
+        """Like `get`, but the profile stays resident until `release(profile)`.
+
+        With `load=False` only a resident profile is leased; None otherwise.
+        """
+        return self._get(profile, lease=True, load=load)
+
+    def release(self, profile: str):
+        with self._lock:
+            entry = self._entries.get(profile)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] == 0:
+                self._released.notify_all()
+                if entry.pop("doomed", False):
+                    del self._entries[profile]
+                    self._release(entry["memory"])
+                else:
+                    self._enforce_limits()
+
+    @contextmanager
+    def lease(self, profile: str, load: bool = True):
+        memory = self.acquire(profile, load)
+        try:
+            yield memory
+        finally:
+            if memory is not None:
+                self.release(profile)
+
+    @asynccontextmanager
+    async def alease(self, profile: str):
+        """`lease` for async handlers; a cold load runs off the event loop."""
+        memory = await asyncio.to_thread(self.acquire, profile)
+        try:
+            yield memory
+        finally:
+            self.release(profile)
+
+    def _hit(self, entry: dict, profile: str, lease: bool) -> MemoryKG:
+        # Caller holds self._lock.
+        self.hits += 1
+        entry["last_used"] = time.monotonic()
+        entry.pop("doomed", None)
+        entry["refs"] += int(lease)
+        self._entries.move_to_end(profile)
+        return entry["memory"]
+
+    def _get(self, profile: str, lease: bool, load: bool = True):
+        with self._lock:
+            self._expire_idle()
+            entry = self._entries.get(profile)
+            if entry is not None:
+                return self._hit(entry, profile, lease)
+            if not load:
+                return None
+            slot = self._load_locks.setdefault(profile, [threading.Lock(), 0])
+            slot[1] += 1
+
+        # Load outside the registry lock so one cold profile doesn't stall the rest.
+        try:
+            with slot[0]:
+                with self._lock:
+                    entry = self._entries.get(profile)
+                    if entry is not None:
+                        return self._hit(entry, profile, lease)
+                memory = self.factory(profile)
+                with self._lock:
+                    self.misses += 1
+                    self._entries[profile] = {
+                        "memory": memory,
+                        "last_used": time.monotonic(),
+                        "bytes": memory.estimated_bytes(),
+                        "refs": int(lease),
+                    }
+                    self._enforce_limits(keep=profile)
+                return memory
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    self._load_locks.pop(profile, None)
+
+    def peek(self, profile: str):
+        """The resident memory of a profile, or None; never loads and doesn't count as a use."""
+        with self._lock:
+            entry = self._entries.get(profile)
+            return entry["memory"] if entry is not None else None
+
+    def resident(self) -> list[str]:
+        """Profiles currently loaded, least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def touch(self, profile: str):
+        """Refresh the size estimate of a profile after it grew."""
+        with self._lock:
+            entry = self._entries.get(profile)
+            if entry is not None:
+                entry["bytes"] = entry["memory"].estimated_bytes()
+                self._enforce_limits(keep=profile)
+
+    def evict(self, profile: str, wait: bool = False, timeout: float = 60.0) -> bool:
+        """Drop a profile once nobody holds it.
+
+        With `wait`, block until its leases are released and its pending writes
+        are flushed; otherwise a held profile is dropped by its last `release`.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            entry = self._entries.get(profile)
+            if entry is None:
+                return False
+            if entry["refs"] and not wait:
+                entry["doomed"] = True
+                return True
+            while entry["refs"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"memory of {profile} is still in use")
+                self._released.wait(remaining)
+            if self._entries.get(profile) is not entry:
+                return False
+            del self._entries[profile]
+            self.evictions += 1
+        if wait:
+            entry["memory"].adapter.close()
+        else:
+            self._release(entry["memory"])
+        return True
+
+    def clear(self):
+        with self._lock:
+            entries = [(p, e) for p, e in self._entries.items() if not e["refs"]]
+            self.evictions += len(entries)
+            for profile, _ in entries:
+                del self._entries[profile]
+        for _, entry in entries:
+            self._release(entry["memory"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "profiles": len(self._entries),
+                "bytes": sum(e["bytes"] for e in self._entries.values()),
+                "max_profiles": self.max_profiles,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "leased": sum(1 for e in self._entries.values() if e["refs"]),
+            }
+
+    # -------------------------------
+    # Eviction (caller holds self._lock)
+    # -------------------------------
+    def _expire_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for profile, entry in list(self._entries.items()):
+            if entry["last_used"] >= cutoff:
+                break
+            if entry["refs"]:
+                continue
+            del self._entries[profile]
+            self.evictions += 1
+            self._release(entry["memory"])
+            print(f"[MEMORY] Evicted idle profile {profile}")
+
+    def _enforce_limits(self, keep=None):
+        def over():
+            total = sum(e["bytes"] for e in self._entries.values())
+            return len(self._entries) > self.max_profiles or total > self.max_bytes
+
+        # Least recently used first; never the profile being served right now or a leased one.
+        for profile in [p for p, e in self._entries.items() if p != keep and not e["refs"]]:
+            if not over():
+                break
+            self._release(self._entries.pop(profile)["memory"])
+            self.evictions += 1
+            print(f"[MEMORY] Evicted profile {profile} (registry full)")
+
+
+registry = MemoryRegistry()
+
+
+def get_memory(profile: str) -> MemoryKG:
+    """Shared entry point used by the routers."""
+    return registry.get(profile)
@@ -0,0 +1,245 @@
+import os, re, time, threading, contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Per-request profiling: requests sent with `X-Mindlink-Profile: 1` get a
+# collapsed-stack trace (flamegraph.pl / speedscope format) written here.
+TRACE_ENABLED = os.getenv("MINDLINK_TRACE", "0") == "1"
+TRACE_DIR = os.getenv("MINDLINK_TRACE_DIR", os.path.join("data", "traces"))
+
+# ============================================================
+# In-process latency histograms
+# ============================================================
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Pipeline stages are often sub-millisecond (cache hits, FAISS search).
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative bucket counts plus a bounded window of recent samples for percentiles."""
+
+    def __init__(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS, window: int = 2048, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    def percentile(self, q: float):
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class Counter:
+    """Monotonic counter."""
+
+    def __init__(self, name: str, help: str = "", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+_HISTOGRAMS: dict[tuple, Histogram] = {}
+_COUNTERS: dict[tuple, Counter] = {}
+_lock = threading.Lock()
+
+
+def _key(name, labels) -> tuple:
+    return (name, tuple(sorted((labels or {}).items())))
+
+
+def histogram(name: str, help: str = "", buckets=DEFAULT_BUCKETS, labels: dict = None) -> Histogram:
+    """Get or create a named histogram (one series per label set)."""
+    key = _key(name, labels)
+    with _lock:
+        h = _HISTOGRAMS.get(key)
+        if h is None:
+            h = _HISTOGRAMS[key] = Histogram(name, help, buckets, labels=labels)
+        return h
+
+
+def counter(name: str, help: str = "", labels: dict = None) -> Counter:
+    """Get or create a named counter (one series per label set)."""
+    key = _key(name, labels)
+    with _lock:
+        c = _COUNTERS.get(key)
+        if c is None:
+            c = _COUNTERS[key] = Counter(name, help, labels)
+        return c
+
+
+def _series(name, labels) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def summaries() -> dict:
+    with _lock:
+        items = list(_HISTOGRAMS.values())
+    return {_series(h.name, h.labels): h.summary() for h in items}
+
+
+# ============================================================
+# Hot-path spans
+# ============================================================
+_trace = contextvars.ContextVar("mindlink_trace", default=None)
+_stack = contextvars.ContextVar("mindlink_span_stack", default=())
+
+
+@contextmanager
+def span(stage: str):
+    """Time one pipeline stage into `mindlink_stage_seconds{stage=...}`.
+
+    Spans nest (also across `asyncio.to_thread` and tasks, which copy the
+    context); when the request is being profiled the nested path is recorded.
+    """
+    path = _stack.get() + (stage,)
+    token = _stack.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stack.reset(token)
+        histogram("mindlink_stage_seconds", "Time spent per pipeline stage", STAGE_BUCKETS, {"stage": stage}).observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.record(path, elapsed)
+
+
+def record_usage(caller: str, model: str, usage):
+    """Count prompt/completion tokens from an OpenAI `usage` object or LangChain `usage_metadata`."""
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        tokens_by_kind = {"prompt": usage.get("input_tokens"), "completion": usage.get("output_tokens")}
+    else:
+        tokens_by_kind = {kind: getattr(usage, f"{kind}_tokens", None) for kind in ("prompt", "completion")}
+    counter("mindlink_llm_requests_total", "Completion calls", {"caller": caller, "model": model}).inc()
+    for kind, tokens in tokens_by_kind.items():
+        if tokens:
+            counter(
+                "mindlink_llm_tokens_total", "Tokens reported by completion responses",
+                {"caller": caller, "model": model, "kind": kind},
+            ).inc(tokens)
+
+
+# ============================================================
+# Per-request profiling traces
+# ============================================================
+class Trace:
+    """Span timings of one request, dumped as collapsed stacks (self time in µs)."""
+
+    def __init__(self, name: str, directory: str = TRACE_DIR):
+        self.name = name
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        self.path = os.path.join(directory, f"{stamp}-{slug}.folded")
+        self.totals: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: tuple, elapsed: float):
+        with self._lock:
+            self.totals[path] = self.totals.get(path, 0.0) + elapsed
+
+    def collapsed(self, total: float) -> str:
+        with self._lock:
+            totals = dict(self.totals)
+        totals[()] = total
+        children: dict[tuple, float] = {}
+        for path, elapsed in totals.items():
+            if path:
+                children[path[:-1]] = children.get(path[:-1], 0.0) + elapsed
+        lines = []
+        for path, elapsed in sorted(totals.items()):
+            # Concurrent children can overlap their parent; clamp to zero.
+            self_us = int(max(0.0, elapsed - children.get(path, 0.0)) * 1e6)
+            if self_us:
+                lines.append(f"{';'.join((self.name,) + path)} {self_us}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def trace_request(name: str):
+    """Collect the spans of the enclosed request; yields the Trace."""
+    trace = Trace(name)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def dump_trace(trace: Trace, total: float) -> str:
+    os.makedirs(os.path.dirname(trace.path) or ".", exist_ok=True)
+    with open(trace.path, "w") as f:
+        f.write(trace.collapsed(total))
+    return trace.path
+
+
+# ============================================================
+# Prometheus text exposition
+# ============================================================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus() -> str:
+    """All histograms and counters in the Prometheus text format (version 0.0.4)."""
+    with _lock:
+        hists = sorted(_HISTOGRAMS.values(), key=lambda h: (h.name, sorted(h.labels.items())))
+        counters = sorted(_COUNTERS.values(), key=lambda c: (c.name, sorted(c.labels.items())))
+    lines, described = [], set()
+    for h in hists:
+        if h.name not in described:
+            described.add(h.name)
+            lines += [f"# HELP {h.name} {h.help}", f"# TYPE {h.name} histogram"]
+        with h._lock:
+            counts, count, total = list(h.counts), h.count, h.sum
+        for bound, n in zip(h.buckets, counts):
+            lines.append(f"{_series(h.name + '_bucket', {**h.labels, 'le': _fmt(bound)})} {n}")
+        lines.append(f"{_series(h.name + '_bucket', {**h.labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{_series(h.name + '_sum', h.labels)} {total!r}")
+        lines.append(f"{_series(h.name + '_count', h.labels)} {count}")
+    for c in counters:
+        if c.name not in described:
+            described.add(c.name)
+            lines += [f"# HELP {c.name} {c.help}", f"# TYPE {c.name} counter"]
+        lines.append(f"{_series(c.name, c.labels)} {_fmt(c.value)}")
+    return "\n".join(lines) + "\n"
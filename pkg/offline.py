@@ -0,0 +1,181 @@
+import os, re, json, time, asyncio, hashlib
+from types import SimpleNamespace
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Simulated upstream latency: per request, plus per streamed token.
+LATENCY_SECONDS = float(os.getenv("MINDLINK_OFFLINE_LATENCY", "0.05"))
+TOKEN_LATENCY_SECONDS = float(os.getenv("MINDLINK_OFFLINE_TOKEN_LATENCY", "0.002"))
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z'-]{3,}")
+_TURN = re.compile(r"^Turn (\d+):\s*$", re.MULTILINE)
+_STOPWORDS = {
+    "this", "that", "with", "from", "have", "about", "what", "your", "there", "their", "would",
+    "could", "should", "these", "those", "photo", "image", "please", "describe", "interpret",
+}
+_PHRASES = (
+    "The light in this moment feels warm and unhurried.",
+    "It reads like a memory worth keeping close.",
+    "There is a quiet sense of connection here.",
+    "Small details suggest a story that is still unfolding.",
+    "It carries the feeling of a day well spent.",
+    "Looking back, this seems to mark a turning point.",
+)
+
+
+# ============================================================
+# Deterministic responder
+# ============================================================
+def _text_of(messages) -> str:
+    parts = []
+    for m in messages:
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", "")
+        if isinstance(content, list):
+            parts += [c.get("text", "") for c in content if isinstance(c, dict) and c.get("type") == "text"]
+        elif content:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _keywords(text: str, limit: int) -> list[str]:
+    seen = []
+    for w in _WORD.findall(text):
+        if w.lower() not in _STOPWORDS and w.lower() not in seen:
+            seen.append(w.lower())
+    return seen[:limit]
+
+
+def respond(model: str, messages, response_format=None) -> str:
+    """Deterministic reply for a chat request: same input, same output.
+
+    Structured-output (triplet extraction) requests get schema-shaped JSON
+    facts built from the prompt's own words, so the knowledge-graph path
+    behaves as it would online.
+    """
+    text = _text_of(messages)
+    seed = int.from_bytes(hashlib.sha256(f"{model}\0{text}".encode()).digest()[:8], "big")
+
+    if (response_format or {}).get("type") == "json_schema":
+        turns = _TURN.split(text)[1:]
+        facts = [
+            {"turn": int(num), "subject": "user", "predicate": "mentioned", "object": word}
+            for num, body in zip(turns[::2], turns[1::2])
+            for word in _keywords(body, 2)
+        ]
+        return json.dumps({"facts": facts})
+
+    words = _keywords(text, 3)
+    opening = f"Thinking about {', '.join(words)}: " if words else ""
+    sentences = [_PHRASES[(seed >> (4 * i)) % len(_PHRASES)] for i in range(3)]
+    return opening + " ".join(sentences)
+
+
+def _usage(messages, reply) -> SimpleNamespace:
+    prompt = len(_text_of(messages)) // 4 + 1
+    completion = len(reply) // 4 + 1
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
+
+
+def _completion(model, messages, reply, max_tokens=None) -> SimpleNamespace:
+    finish_reason = "stop"
+    if max_tokens and len(reply) // 4 + 1 > max_tokens:
+        # Like OpenAI: the reply stops mid-way and says so.
+        reply, finish_reason = reply[:max_tokens * 4], "length"
+    return SimpleNamespace(
+        id="offline",
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason=finish_reason, message=SimpleNamespace(role="assistant", content=reply))],
+        usage=_usage(messages, reply),
+    )
+
+
+def _chunk(model, text) -> SimpleNamespace:
+    return SimpleNamespace(
+        id="offline", model=model, usage=None, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))]
+    )
+
+
+def _tokens(reply: str) -> list[str]:
+    return re.findall(r"\S+\s*", reply)
+
+
+# ============================================================
+# OpenAI-compatible clients
+# ============================================================
+class _Stream:
+    def __init__(self, model, messages, reply, stream_options=None):
+        self._chunks = [_chunk(model, t) for t in _tokens(reply)]
+        if (stream_options or {}).get("include_usage"):
+            # Like OpenAI: one final chunk with usage and no choices.
+            self._chunks.append(SimpleNamespace(id="offline", model=model, choices=[], usage=_usage(messages, reply)))
+
+    def __iter__(self):
+        for c in self._chunks:
+            time.sleep(TOKEN_LATENCY_SECONDS)
+            yield c
+
+    def close(self):
+        self._chunks = []
+
+
+class _AsyncStream(_Stream):
+    async def __aiter__(self):
+        for c in self._chunks:
+            await asyncio.sleep(TOKEN_LATENCY_SECONDS)
+            yield c
+
+    async def close(self):
+        self._chunks = []
+
+
+class _Completions:
+    def create(self, model="offline", messages=(), stream=False, stream_options=None, response_format=None, **kwargs):
+        time.sleep(LATENCY_SECONDS)
+        reply = respond(model, messages, response_format)
+        if stream:
+            return _Stream(model, messages, reply, stream_options)
+        return _completion(model, messages, reply, kwargs.get("max_tokens"))
+
+
+class _AsyncCompletions:
+    async def create(self, model="offline", messages=(), stream=False, stream_options=None, response_format=None, **kwargs):
+        await asyncio.sleep(LATENCY_SECONDS)
+        reply = respond(model, messages, response_format)
+        if stream:
+            return _AsyncStream(model, messages, reply, stream_options)
+        return _completion(model, messages, reply, kwargs.get("max_tokens"))
+
+
+class OfflineOpenAI:
+    """Stands in for `openai.OpenAI` (chat completions only)."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_Completions())
+
+
+class AsyncOfflineOpenAI:
+    """Stands in for `openai.AsyncOpenAI` (chat completions only)."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions())
+
+
+# ============================================================
+# LangChain chat model
+# ============================================================
+class OfflineChatModel(BaseChatModel):
+    """Stands in for `ChatOpenAI` in the LangGraph agent."""
+
+    model: str = "offline"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "mindlink-offline"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(LATENCY_SECONDS)
+        records = [{"content": m.content} for m in messages]
+        reply = respond(self.model, records)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
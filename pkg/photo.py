@@ -1,66 +1,468 @@
 # src/pkg/photo.py
-import os
-from fastapi import APIRouter, UploadFile, File, Depends, Query
-from fastapi.responses import JSONResponse
-from PIL import Image, ImageDraw
-from pkg.app.core.auth import get_current_user
-from typing import Optional
+import os, re, glob, json, time, shutil, asyncio, hashlib, threading, multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import APIRouter, UploadFile, File, Query, Request, HTTPException
+from fastapi.responses import JSONResponse, FileResponse, Response
+from typing import Optional, List
+from pkg.app.session_state import sessions
+from pkg.metrics import span
+from pkg.photo_worker import MTCNN, mtcnn, render_faces, render_sizes, _fit
+from pkg.image_cache import MAX_SIDE
+from pkg.uploads import blob_store, save_upload
 
 router = APIRouter()
 
+# PIL work runs in a process pool (0 = a thread, e.g. where processes are unwanted).
+PHOTO_WORKERS = int(os.getenv("MINDLINK_PHOTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed in flight; further requests wait instead of queueing unbounded work.
+MAX_PENDING = int(os.getenv("MINDLINK_PHOTO_MAX_PENDING", str(4 * max(1, PHOTO_WORKERS))))
+# Annotated derivatives, keyed by the content hash of the original.
+DERIVATIVE_DIR = os.getenv("MINDLINK_PHOTO_CACHE_DIR", os.path.join("data", "cache", "processed"))
+BATCH_CHUNK = int(os.getenv("MINDLINK_PHOTO_BATCH_CHUNK", "8"))
 
-# Dummy face detector (placeholder)
-class MTCNN:
-    def __init__(self, *args, **kwargs):
-        pass
+# Resized copies of uploads: {name: (max side, max short side, format, quality)}.
+# "model" matches what the vision API keeps at detail=high (2048 box, 768 short side).
+SIZES_DIR = os.getenv("MINDLINK_PHOTO_SIZES_DIR", os.path.join("data", "cache", "sizes"))
+SIZE_SPECS = {
+    "model": (MAX_SIDE or 2048, 768, "JPEG", 85),
+    "preview": (int(os.getenv("MINDLINK_PREVIEW_SIDE", "1024")), None, "WEBP", 80),
+    "thumb": (int(os.getenv("MINDLINK_THUMB_SIDE", "256")), None, "WEBP", 75),
+}
+# Vision detail level images are prepared for: "high" or "low" (512px box).
+VISION_DETAIL = os.getenv("MINDLINK_VISION_DETAIL", "high")
+SIZE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-    def detect(self, image):
-        return None, None
+# Disk budget of each derivative cache (0 = unbounded); least recently used
+# entries are pruned, at most once per interval. Published copies are hard
+# links and survive; pruned sizes are re-rendered on the next request.
+CACHE_MAX_BYTES = int(os.getenv("MINDLINK_PHOTO_CACHE_MAX_BYTES", str(2 << 30)))
+SIZES_MAX_BYTES = int(os.getenv("MINDLINK_PHOTO_SIZES_MAX_BYTES", str(2 << 30)))
+PRUNE_INTERVAL = float(os.getenv("MINDLINK_PHOTO_PRUNE_INTERVAL", "60"))
 
+# -----------------------------
+# Profile sessions (shared session store)
+# -----------------------------
+SESSION_NAMESPACE = "photo"
+# Per-profile photo folders, shared with pkg.gpt4v: data/profiles/<profile>/{uploads,processed}.
+PROFILES_DIR = os.path.join("data", "profiles")
+
+
+def init_profile_session(profile: str):
+    profile_dir = os.path.join(PROFILES_DIR, profile)
+    upload_dir = os.path.join(profile_dir, "uploads")
+    processed_dir = os.path.join(profile_dir, "processed")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(processed_dir, exist_ok=True)
+
+    session = sessions.get(SESSION_NAMESPACE, profile, {"selected_image": None})
+    session.update(profile_dir=profile_dir, upload_dir=upload_dir, processed_dir=processed_dir)
+    return session
+
+
+def set_selected_image(profile: str, path: str):
+    sessions.update(SESSION_NAMESPACE, profile, lambda s: s.update(selected_image=path), {"selected_image": None})
+
+
+def migrate_legacy_layout(root: str = PROFILES_DIR) -> int:
+    """Move photos from the old per-user layout (<root>/<user>/<profile>/) to <root>/<profile>/.
+
+    A user folder could alias a profile of the same name, so deleting one
+    profile wiped another's photos. Returns the number of files moved.
+    """
+    moved, store = 0, blob_store()
+    for legacy_uploads in glob.glob(os.path.join(root, "*", "*", "uploads")):
+        legacy = os.path.dirname(legacy_uploads)
+        if not os.path.isdir(legacy_uploads) or os.path.basename(legacy) in ("uploads", "processed"):
+            continue
+        dest = os.path.join(root, os.path.basename(legacy))
+        renamed = set()
+        for sub in ("uploads", "processed"):
+            src_dir, dest_dir = os.path.join(legacy, sub), os.path.join(dest, sub)
+            if not os.path.isdir(src_dir):
+                continue
+            os.makedirs(dest_dir, exist_ok=True)
+            for name in os.listdir(src_dir):
+                src, target = os.path.join(src_dir, name), os.path.join(dest_dir, name)
+                if os.path.exists(target):
+                    if sub == "processed" or name in renamed:
+                        continue  # a derivative; re-rendered on demand
+                    stem, ext = os.path.splitext(name)
+                    n = 1
+                    while os.path.exists(target):
+                        n += 1
+                        target = os.path.join(dest_dir, f"{stem} ({n}){ext}")
+                    renamed.add(name)
+                elif sub == "processed" and name in renamed:
+                    continue
+                os.replace(src, target)
+                store.move_ref(src, target)
+                moved += 1
+        shutil.rmtree(legacy)
+        user_dir = os.path.dirname(legacy)
+        if not os.listdir(user_dir):
+            os.rmdir(user_dir)
+        print(f"[PHOTO] Moved {legacy} to {dest}")
+    return moved
 
-mtcnn = MTCNN(keep_all=True)
 
 # -----------------------------
-# In-memory user sessions
+# Processed derivatives (content-addressed, off the event loop)
 # -----------------------------
-USER_SESSIONS = {}
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_digests: "OrderedDict[tuple, str]" = OrderedDict()
+_digests_lock = threading.Lock()
+_inflight: dict[str, asyncio.Future] = {}
 
 
-def init_user_session(user_id: str, profile: str):
-    key = f"{user_id}_{profile}"
-    if key not in USER_SESSIONS:
-        profile_dir = os.path.join("data", "profiles", user_id, profile)
-        upload_dir = os.path.join(profile_dir, "uploads")
-        processed_dir = os.path.join(profile_dir, "processed")
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent runs FAISS and worker threads.
+            _pool = ProcessPoolExecutor(PHOTO_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
 
-        os.makedirs(upload_dir, exist_ok=True)
-        os.makedirs(processed_dir, exist_ok=True)
 
-        USER_SESSIONS[key] = {
-            "profile_dir": profile_dir,
-            "upload_dir": upload_dir,
-            "processed_dir": processed_dir,
-            "selected_image": None,
-        }
-        print(f"[DEBUG] New user session: {key}")
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
 
-    return USER_SESSIONS[key]
 
+def warm_pool():
+    """Start the worker processes now rather than on the first upload."""
+    if PHOTO_WORKERS > 0:
+        pool = _executor()
+        for _ in range(PHOTO_WORKERS):
+            pool.submit(os.getpid)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file, memoized by (path, mtime, size) so re-selects don't re-read it."""
+    st = os.stat(path)
+    ident = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _digests_lock:
+        digest = _digests.get(ident)
+        if digest is not None:
+            _digests.move_to_end(ident)
+            return digest
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    with _digests_lock:
+        _digests[ident] = digest
+        while len(_digests) > 10000:
+            _digests.popitem(last=False)
+    return digest
+
+
+def _derivative_path(digest: str, image_path: str) -> str:
+    return os.path.join(DERIVATIVE_DIR, f"{digest}{os.path.splitext(image_path)[1].lower()}")
+
+
+def _publish(derivative: str, processed_path: str):
+    """Expose the cached derivative at the profile's processed path (hard link, else copy)."""
+    if os.path.exists(processed_path) and os.path.samefile(derivative, processed_path):
+        return
+    tmp = f"{processed_path}.tmp"
+    try:
+        os.link(derivative, tmp)
+    except OSError:
+        shutil.copyfile(derivative, tmp)
+    os.replace(tmp, processed_path)
+
+
+async def _in_pool(fn, *args):
+    """Run a pkg.photo_worker function in the pool, within the in-flight bound."""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_PENDING)
+    async with _slots:
+        if PHOTO_WORKERS <= 0:
+            return await asyncio.to_thread(fn, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+        except BrokenProcessPool:
+            print("[PHOTO] Worker pool broke; restarting it")
+            _reset_pool()
+            return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
 
-def draw_faces(image_path: str, processed_dir: str) -> str:
-    """Simulate face detection by drawing boxes (placeholder)."""
-    image = Image.open(image_path).convert("RGB")
-    boxes, probs = mtcnn.detect(image)
-    draw = ImageDraw.Draw(image)
 
-    if boxes is not None:
-        for i, (box, prob) in enumerate(zip(boxes, probs)):
-            draw.rectangle(box.tolist(), outline="red", width=3)
-            draw.text((box[0], box[1] - 10), f"Face {i + 1} ({prob:.2f})", fill="red")
+async def process_photos(image_paths: list[str], processed_dir: str) -> list[str]:
+    """Annotated copies of the images in `processed_dir`, rendering only unseen content.
 
+    Derivatives are cached by content hash, so re-selecting (or re-uploading)
+    an image costs a stat and a link. Misses are rendered in the process pool
+    in chunks, one batched detector call per chunk; identical images being
+    rendered concurrently share one job.
+    """
+    os.makedirs(DERIVATIVE_DIR, exist_ok=True)
+    with span("photo.hash"):
+        digests = await asyncio.gather(*(asyncio.to_thread(file_digest, p) for p in image_paths))
+
+    waits, jobs = [], {}
+    loop = asyncio.get_running_loop()
+    for path, digest in zip(image_paths, digests):
+        derivative = _derivative_path(digest, path)
+        if digest in _inflight:
+            waits.append(_inflight[digest])
+        elif digest not in jobs and not _touch(derivative):
+            jobs[digest] = (path, derivative)
+            _inflight[digest] = loop.create_future()
+
+    if jobs:
+        items = list(jobs.items())
+        chunks = [items[i:i + BATCH_CHUNK] for i in range(0, len(items), BATCH_CHUNK)]
+        try:
+            with span("photo.render"):
+                await asyncio.gather(*(_in_pool(render_faces, [job for _, job in chunk]) for chunk in chunks))
+        except BaseException as e:
+            for digest in jobs:
+                waiter = _inflight.pop(digest)
+                if isinstance(e, Exception):
+                    waiter.set_exception(e)
+                    waiter.exception()  # mark retrieved; concurrent waiters still see it
+                else:
+                    waiter.cancel()
+            raise
+        for digest in jobs:
+            _inflight.pop(digest).set_result(None)
+        schedule_prune()
+    if waits:
+        await asyncio.gather(*waits)
+
+    processed = [os.path.join(processed_dir, os.path.basename(p)) for p in image_paths]
+    await asyncio.to_thread(
+        lambda: [_publish(_derivative_path(d, p), out) for p, d, out in zip(image_paths, digests, processed)]
+    )
+    return processed
+
+
+async def process_photo(image_path: str, processed_dir: str) -> str:
+    return (await process_photos([image_path], processed_dir))[0]
+
+
+def draw_faces(image_path: str, processed_dir: str) -> str:
+    """Synchronous, in-process variant of `process_photo` (no cache), for scripts."""
     processed_path = os.path.join(processed_dir, os.path.basename(image_path))
-    image.save(processed_path)
-    return processed_path
+    return render_faces([(image_path, processed_path)])[0]
+
+
+# -----------------------------
+# Cache pruning (least recently used first)
+# -----------------------------
+_prune_lock = threading.Lock()
+_last_prune = float("-inf")
+
+
+def _touch(path: str) -> bool:
+    """Mark a cache entry as used now; False if it doesn't exist."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _entry_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+def prune_cache(root: str, max_bytes: int, busy=()) -> int:
+    """Delete the least recently used entries of `root` until it fits in 90% of `max_bytes`.
+
+    Entries used within the last PRUNE_INTERVAL and digests in `busy` are kept.
+    Returns the number of entries removed.
+    """
+    if max_bytes <= 0 or not os.path.isdir(root):
+        return 0
+    entries, total = [], 0
+    for e in os.scandir(root):
+        try:
+            size, used = _entry_size(e.path), e.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        entries.append((used, e.path, size))
+        total += size
+    if total <= max_bytes:
+        return 0
+    removed, cutoff = 0, time.time() - PRUNE_INTERVAL
+    for used, path, size in sorted(entries):
+        if total <= max_bytes * 0.9 or used > cutoff:
+            break
+        if os.path.splitext(os.path.basename(path))[0] in busy:
+            continue
+        try:
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _prune_caches(busy):
+    try:
+        removed = prune_cache(DERIVATIVE_DIR, CACHE_MAX_BYTES, busy) + prune_cache(SIZES_DIR, SIZES_MAX_BYTES, busy)
+        if removed:
+            print(f"[PHOTO] Pruned {removed} cached derivatives")
+    except Exception as e:
+        print(f"[PHOTO] Cache pruning failed: {e}")
+    finally:
+        _prune_lock.release()
+
+
+def schedule_prune():
+    """Prune the derivative caches in the background, at most once per PRUNE_INTERVAL."""
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL or not _prune_lock.acquire(blocking=False):
+        return
+    _last_prune = time.monotonic()
+    busy = set(_inflight) | set(_size_jobs)
+    threading.Thread(target=_prune_caches, args=(busy,), daemon=True).start()
+
+
+# -----------------------------
+# Size derivatives (thumbnail, preview, model input)
+# -----------------------------
+_sources: "OrderedDict[str, str]" = OrderedDict()  # digest -> a file with that content
+_size_tasks: set = set()
+_size_jobs: dict[str, asyncio.Future] = {}
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _remember_source(digest: str, path: str):
+    with _digests_lock:
+        _sources[digest] = path
+        _sources.move_to_end(digest)
+        while len(_sources) > 10000:
+            _sources.popitem(last=False)
+
+
+def size_meta(digest: str):
+    """Dimensions of the original and of each ready size, or None if not rendered yet."""
+    try:
+        with open(os.path.join(SIZES_DIR, digest, "meta.json")) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    _touch(os.path.join(SIZES_DIR, digest))
+    return meta
+
+
+async def ensure_sizes(path: str) -> dict:
+    """Render every size for an image unless its content already has them."""
+    digest = await asyncio.to_thread(file_digest, path)
+    _remember_source(digest, path)
+    meta = size_meta(digest)
+    if meta is not None:
+        return meta
+    if digest not in _size_jobs:
+        job = _size_jobs[digest] = asyncio.ensure_future(
+            _in_pool(render_sizes, path, os.path.join(SIZES_DIR, digest), SIZE_SPECS)
+        )
+        job.add_done_callback(lambda _: _size_job_done(digest))
+    with span("photo.sizes"):
+        return await asyncio.shield(_size_jobs[digest])
+
+
+def _size_job_done(digest: str):
+    _size_jobs.pop(digest, None)
+    schedule_prune()
+
+
+def schedule_sizes(paths: list[str]):
+    """Render sizes in the background; the request doesn't wait for them."""
+
+    async def _run(path):
+        try:
+            await ensure_sizes(path)
+        except Exception as e:
+            print(f"[PHOTO] Sizes for {path} failed: {e}")
+
+    for path in paths:
+        task = asyncio.create_task(_run(path))
+        _size_tasks.add(task)
+        task.add_done_callback(_size_tasks.discard)
+
+
+def size_urls(path: str) -> dict:
+    """URLs of the thumbnail and preview for a file (rendered on first request if missing)."""
+    digest = file_digest(path)
+    _remember_source(digest, path)
+    return {f"{name}_url": f"/api/photo/sizes/{digest}/{name}" for name in ("thumb", "preview")}
+
+
+def vision_source(path: str, detail: str = None) -> str:
+    """Smallest ready size that still covers what the vision model will look at.
+
+    Falls back to the original while sizes are being rendered; the payload
+    cache downscales it in that case.
+    """
+    detail = detail or VISION_DETAIL
+    digest = file_digest(path)
+    meta = size_meta(digest)
+    if meta is None:
+        return path
+    original = (meta["width"], meta["height"])
+    need = _fit(original, 512) if detail == "low" else _fit(original, 2048, 768)
+    adequate = [
+        s for s in meta["sizes"].values()
+        if s["width"] >= need[0] and s["height"] >= need[1]
+    ]
+    if not adequate:
+        return path
+    folder = os.path.join(SIZES_DIR, digest)
+    best = min(adequate, key=lambda s: (s["width"] * s["height"], os.path.getsize(os.path.join(folder, s["file"]))))
+    return os.path.join(folder, best["file"])
+
+
+@router.get("/sizes/{digest}/{name}")
+async def get_size(digest: str, name: str, request: Request):
+    """Serve a derivative. Content-addressed, so the ETag is strong and the response immutable."""
+    if not _DIGEST.match(digest) or name not in SIZE_SPECS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    etag = f'"{digest}-{name}"'
+    headers = {"ETag": etag, "Cache-Control": SIZE_CACHE_CONTROL}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    meta = size_meta(digest)
+    if meta is None:
+        source = _sources.get(digest)
+        if source is None or not os.path.exists(source):
+            raise HTTPException(status_code=404, detail="Not Found")
+        meta = await ensure_sizes(source)
+    file = meta["sizes"][name]["file"]
+    media_type = "image/webp" if file.endswith(".webp") else "image/jpeg"
+    return FileResponse(os.path.join(SIZES_DIR, digest, file), media_type=media_type, headers=headers)
+
+
+def _image_entry(profile, upload_dir, fname, processed_path):
+    entry = {
+        "filename": fname,
+        "uploaded_path": os.path.join(upload_dir, fname),
+        "processed_path": processed_path,
+        "public_url": f"http://127.0.0.1:8000/static/{profile}/processed/{fname}",
+        "local_path": processed_path,
+    }
+    if os.path.exists(processed_path):
+        entry.update(size_urls(processed_path))
+    return entry
 
 
 # -----------------------------
@@ -70,20 +472,21 @@ def draw_faces(image_path: str, processed_dir: str) -> str:
 async def upload_photos(
     file: UploadFile = File(...),
     profile: str = Query(...),
-    current_user: str = Depends(get_current_user),
 ):
-    session = init_user_session(current_user, profile)
+    session = init_profile_session(profile)
     upload_dir = session["upload_dir"]
     processed_dir = session["processed_dir"]
 
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    file_path = os.path.join(upload_dir, os.path.basename(file.filename))
+    with span("photo.save_upload"):
+        await save_upload(file, profile, file_path)
 
-    processed_path = draw_faces(file_path, processed_dir)
-    session["selected_image"] = processed_path
+    with span("photo.process"):
+        processed_path = await process_photo(file_path, processed_dir)
+    set_selected_image(profile, processed_path)
+    schedule_sizes([processed_path])
 
-    public_url = f"http://127.0.0.1:8000/static/{current_user}/{profile}/processed/{file.filename}"
+    public_url = f"http://127.0.0.1:8000/static/{profile}/processed/{file.filename}"
     return JSONResponse(
         {
             "filename": file.filename,
@@ -91,45 +494,93 @@ async def upload_photos(
             "processed_path": processed_path,
             "public_url": public_url,
             "local_path": processed_path,  # ✅ Added
+            **(await asyncio.to_thread(size_urls, processed_path)),
         }
     )
 
 
+# -----------------------------
+# Batch Upload Endpoint
+# -----------------------------
+def _batch_names(files) -> Optional[list[str]]:
+    """Stored names for a batch: repeated basenames get a " (2)", " (3)"… suffix.
+
+    None if a file has no usable name.
+    """
+    names, seen = [], set()
+    for file in files:
+        name = os.path.basename(file.filename or "")
+        if not name or name in (".", ".."):
+            return None
+        stem, ext = os.path.splitext(name)
+        n = 1
+        while name.casefold() in seen:
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        seen.add(name.casefold())
+        names.append(name)
+    return names
+
+
+@router.post("/upload/batch")
+async def upload_photos_batch(
+    files: List[UploadFile] = File(...),
+    profile: str = Query(...),
+):
+    """Upload several photos and process them in parallel; the last one becomes selected."""
+    session = init_profile_session(profile)
+    upload_dir = session["upload_dir"]
+    processed_dir = session["processed_dir"]
+
+    names = _batch_names(files)
+    if names is None:
+        return JSONResponse({"error": "Every file needs a name"}, status_code=400)
+    paths = []
+    with span("photo.save_upload"):
+        for file, name in zip(files, names):
+            path = os.path.join(upload_dir, name)
+            await save_upload(file, profile, path)
+            paths.append(path)
+
+    with span("photo.process"):
+        processed = await process_photos(paths, processed_dir)
+    if processed:
+        set_selected_image(profile, processed[-1])
+    schedule_sizes(processed)
+
+    return JSONResponse({
+        "images": [
+            _image_entry(profile, upload_dir, os.path.basename(src), out)
+            for src, out in zip(paths, processed)
+        ]
+    })
+
+
 # -----------------------------
 # List Images Endpoint
 # -----------------------------
 @router.get("/list")
 async def list_uploaded(
     profile: str = Query(...),
-    current_user: str = Depends(get_current_user),
 ):
-    session = init_user_session(current_user, profile)
+    session = init_profile_session(profile)
     upload_dir = session["upload_dir"]
     processed_dir = session["processed_dir"]
 
-    uploaded_files = sorted(os.listdir(upload_dir))
-    uploaded_images = [
-        {
-            "filename": fname,
-            "uploaded_path": os.path.join(upload_dir, fname),
-            "processed_path": os.path.join(processed_dir, fname),
-            "public_url": f"http://127.0.0.1:8000/static/{current_user}/{profile}/processed/{fname}",
-            "local_path": os.path.join(processed_dir, fname),  # ✅ Added
-        }
-        for fname in uploaded_files
-    ]
+    def entries():
+        # Thumbnail URLs need each file's content hash (memoized), so build off the loop.
+        uploaded = [
+            _image_entry(profile, upload_dir, fname, os.path.join(processed_dir, fname))
+            for fname in sorted(os.listdir(upload_dir))
+        ]
+        selected = None
+        selected_path = session.get("selected_image")
+        if selected_path and os.path.exists(selected_path):
+            fname = os.path.basename(selected_path)
+            selected = _image_entry(profile, upload_dir, fname, os.path.join(processed_dir, fname))
+        return uploaded, selected
 
-    selected_image_path = session.get("selected_image")
-    selected_image = None
-    if selected_image_path and os.path.exists(selected_image_path):
-        fname = os.path.basename(selected_image_path)
-        selected_image = {
-            "filename": fname,
-            "uploaded_path": os.path.join(upload_dir, fname),
-            "processed_path": os.path.join(processed_dir, fname),
-            "public_url": f"http://127.0.0.1:8000/static/{current_user}/{profile}/processed/{fname}",
-            "local_path": os.path.join(processed_dir, fname),  # ✅ Added
-        }
+    uploaded_images, selected_image = await asyncio.to_thread(entries)
 
     return JSONResponse(
         {"uploaded_images": uploaded_images, "selected_image": selected_image}
@@ -143,9 +594,8 @@ async def list_uploaded(
 async def select_image(
     image_name: str,
     profile: str = Query(...),
-    current_user: str = Depends(get_current_user),
 ):
-    session = init_user_session(current_user, profile)
+    session = init_profile_session(profile)
     upload_dir = session["upload_dir"]
     processed_dir = session["processed_dir"]
 
@@ -153,9 +603,10 @@ async def select_image(
     if not os.path.exists(image_path):
         return JSONResponse({"error": "Image not found"}, status_code=404)
 
-    processed_path = draw_faces(image_path, processed_dir)
-    session["selected_image"] = processed_path
-    public_url = f"http://127.0.0.1:8000/static/{current_user}/{profile}/processed/{image_name}"
+    with span("photo.process"):
+        processed_path = await process_photo(image_path, processed_dir)
+    set_selected_image(profile, processed_path)
+    public_url = f"http://127.0.0.1:8000/static/{profile}/processed/{image_name}"
 
     return JSONResponse(
         {
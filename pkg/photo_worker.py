@@ -0,0 +1,86 @@
+# pkg/photo_worker.py
+"""PIL and face-detection work for pkg.photo, run inside its process pool.
+
+Kept separate from the router so worker processes only need PIL and the
+detector, and so every function here is picklable by reference.
+"""
+import os, json
+from PIL import Image, ImageDraw, ImageOps
+
+
+# Dummy face detector (placeholder)
+class MTCNN:
+    """Same call shape as facenet-pytorch's MTCNN: `detect` takes one image or a list."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def detect(self, images):
+        if isinstance(images, (list, tuple)):
+            return [None] * len(images), [None] * len(images)
+        return None, None
+
+
+mtcnn = MTCNN(keep_all=True)
+
+
+def _draw(image, boxes, probs):
+    draw = ImageDraw.Draw(image)
+    if boxes is not None:
+        for i, (box, prob) in enumerate(zip(boxes, probs)):
+            draw.rectangle(box.tolist(), outline="red", width=3)
+            draw.text((box[0], box[1] - 10), f"Face {i + 1} ({prob:.2f})", fill="red")
+
+
+def render_faces(jobs: list[tuple[str, str]]) -> list[str]:
+    """Detect faces for a batch of (source, destination) images in one detector call.
+
+    Each annotated image is written to a temp file and renamed into place, so
+    readers never see a partial derivative.
+    """
+    images = [Image.open(src).convert("RGB") for src, _ in jobs]
+    boxes, probs = mtcnn.detect(images)
+    written = []
+    for (src, dst), image, b, p in zip(jobs, images, boxes, probs):
+        _draw(image, b, p)
+        root, ext = os.path.splitext(dst)
+        tmp = f"{root}.tmp-{os.getpid()}{ext}"
+        image.save(tmp)
+        os.replace(tmp, dst)
+        written.append(dst)
+    return written
+
+
+def _fit(size, max_side, max_short=None) -> tuple[int, int]:
+    w, h = size
+    scale = min(1.0, max_side / max(w, h))
+    if max_short:
+        scale = min(scale, max_short / max(1.0, min(w, h) * scale) * scale)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def render_sizes(src: str, out_dir: str, specs: dict) -> dict:
+    """Write every size in `specs` ({name: (max_side, max_short, format, quality)}).
+
+    The image is decoded once and each size is scaled from the previous,
+    larger one. `meta.json` is written last, so its presence means complete.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    image = ImageOps.exif_transpose(Image.open(src))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    meta = {"width": image.width, "height": image.height, "sizes": {}}
+    for name, (max_side, max_short, fmt, quality) in sorted(specs.items(), key=lambda kv: -kv[1][0]):
+        target = _fit(image.size, max_side, max_short)
+        if target != image.size:
+            image = image.resize(target, Image.LANCZOS)
+        path = os.path.join(out_dir, f"{name}.{fmt.lower()}")
+        tmp = f"{path}.tmp-{os.getpid()}"
+        image.save(tmp, format=fmt, quality=quality)
+        os.replace(tmp, path)
+        meta["sizes"][name] = {"file": os.path.basename(path), "width": image.width, "height": image.height}
+    tmp = os.path.join(out_dir, f"meta.json.tmp-{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(out_dir, "meta.json"))
+    return meta
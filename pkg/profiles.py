@@ -1,53 +1,336 @@
 # pkg/profiles.py
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import List, Optional
 import os
 import json
+import time
+import bisect
+import shutil
+import sqlite3
+import threading
 
 router = APIRouter()
 
 DATA_DIR = "data/profiles"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Legacy store, imported into the registry database on first start.
 PROFILES_FILE = os.path.join(DATA_DIR, "profiles.json")
+# Kept outside data/profiles, which is served under /static.
+PROFILE_DB_PATH = os.getenv("MINDLINK_PROFILE_DB", os.path.join("data", "profiles.sqlite"))
+PAGE_SIZE = int(os.getenv("MINDLINK_PROFILES_PAGE", "100"))
+PAGE_MAX = 1000
+# Seconds between reclaimer passes when nothing wakes it up.
+RECLAIM_INTERVAL = float(os.getenv("MINDLINK_PROFILE_RECLAIM_INTERVAL", "60"))
 
 
-def load_profiles():
-    """Load profiles from a local JSON file."""
-    if not os.path.exists(PROFILES_FILE):
-        with open(PROFILES_FILE, "w") as f:
-            json.dump([], f)
-        return []
-    with open(PROFILES_FILE, "r") as f:
-        return json.load(f)
+# ============================================================
+# Profile registry
+# ============================================================
+class ProfileRegistry:
+    """Profiles in SQLite, with an in-memory view rebuilt after each write.
 
+    Rows are never rewritten wholesale: creates are single inserts guarded by
+    the primary key, so concurrent creates can't lose each other. Deleting a
+    profile only sets its `deleted` timestamp (a tombstone); the reclaimer
+    removes its files and then the row. The database is opened (and the legacy
+    JSON store imported) on first use, not when the module is imported.
+    """
 
-def save_profiles(profiles):
-    """Save profiles back to the JSON file."""
-    with open(PROFILES_FILE, "w") as f:
-        json.dump(profiles, f, indent=2)
+    def __init__(self, path=PROFILE_DB_PATH, legacy_path=PROFILES_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._opened = False
+        self._view = None  # (ids, names, id_by_name) of live profiles in creation order, plus deleted names
+        self._generation = 0
 
+    def _conn(self) -> sqlite3.Connection:
+        if not self._opened:
+            self._open()
+        return self._connect()
 
-# ✅ 1. List all profiles
-@router.get("/list")
-def list_profiles() -> List[dict]:
-    profiles = load_profiles()
-    return [{"name": p} for p in profiles]
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
 
+    def _open(self):
+        with self._open_lock:
+            if self._opened:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, created REAL, deleted REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_deleted ON profiles (deleted)")
+            self._import_legacy(conn, self.legacy_path)
+            self._opened = True
 
-# ✅ 2. Create a new profile
-@router.post("/create")
-def create_profile(name: str):
+    def _import_legacy(self, conn, legacy_path):
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path) as f:
+                names = [str(n) for n in json.load(f)]
+        except (OSError, ValueError) as e:
+            print(f"[PROFILES] ⚠️ Could not read {legacy_path}: {e}")
+            return
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO profiles (name, created) VALUES (?, ?)", [(n, now) for n in names]
+        )
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        print(f"[PROFILES] ✅ Imported {len(names)} profiles from {legacy_path}")
+
+    # -------------------------------
+    # Reads (served from the cached view)
+    # -------------------------------
+    def _live(self):
+        view = self._view
+        if view is None:
+            generation = self._generation
+            rows = self._conn().execute("SELECT id, name, deleted FROM profiles ORDER BY id").fetchall()
+            live = [(id_, name) for id_, name, deleted in rows if deleted is None]
+            view = (
+                [r[0] for r in live], [r[1] for r in live], {name: id_ for id_, name in live},
+                {name for _, name, deleted in rows if deleted is not None},
+            )
+            with self._lock:
+                # Don't cache a view that a concurrent write already made stale.
+                if self._generation == generation:
+                    self._view = view
+        return view
+
+    def _invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._view = None
+
+    def exists(self, name: str) -> bool:
+        return name in self._live()[2]
+
+    def is_deleted(self, name: str) -> bool:
+        """True from the delete request until the reclaimer has removed the profile."""
+        return name in self._live()[3]
+
+    def page(self, cursor: Optional[int] = None, limit: int = PAGE_SIZE) -> tuple[list[str], Optional[int]]:
+        """Live profile names after `cursor` in creation order, plus the next cursor (None at the end)."""
+        ids, names, _, _ = self._live()
+        start = bisect.bisect_right(ids, cursor) if cursor is not None else 0
+        chunk = names[start:start + limit]
+        more = start + limit < len(ids)
+        return chunk, ids[start + limit - 1] if more else None
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def create(self, name: str):
+        conn = self._conn()
+        try:
+            conn.execute("INSERT INTO profiles (name, created) VALUES (?, ?)", (name, time.time()))
+        except sqlite3.IntegrityError:
+            row = conn.execute("SELECT deleted FROM profiles WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] is not None:
+                raise HTTPException(status_code=409, detail="Profile is still being deleted, try again shortly")
+            raise HTTPException(status_code=400, detail="Profile already exists")
+        finally:
+            self._invalidate()
+
+    def tombstone(self, name: str) -> bool:
+        cur = self._conn().execute(
+            "UPDATE profiles SET deleted = ? WHERE name = ? AND deleted IS NULL", (time.time(), name)
+        )
+        self._invalidate()
+        return cur.rowcount > 0
+
+    def tombstoned(self) -> list[str]:
+        return [r[0] for r in self._conn().execute(
+            "SELECT name FROM profiles WHERE deleted IS NOT NULL ORDER BY deleted"
+        )]
+
+    def forget(self, name: str):
+        self._conn().execute("DELETE FROM profiles WHERE name = ? AND deleted IS NOT NULL", (name,))
+        self._invalidate()
+
+
+# ============================================================
+# Shared data and deleted profiles
+# ============================================================
+_reserved = None
+
+
+def reserved_names() -> set[str]:
+    """Top-level entries of data/ owned by shared stores, which a profile's data/<name> must never alias.
+
+    Derived from where each store is configured to live, so relocating one
+    (e.g. MINDLINK_VECTOR_ROOT=data/vec) keeps it protected.
+    """
+    global _reserved
+    if _reserved is None:
+        from pkg import embeddings, extraction, metrics
+        from pkg.agent import CONVERSATIONS_DIR
+        from pkg.app.session_state import SESSION_DB_PATH
+        from pkg.photo import DERIVATIVE_DIR, SIZES_DIR
+        from pkg.uploads import BLOB_DIR
+        from pkg.vector_shards import SHARD_ROOT
+
+        stores = [
+            DATA_DIR, PROFILE_DB_PATH, SESSION_DB_PATH, BLOB_DIR, SHARD_ROOT, DERIVATIVE_DIR, SIZES_DIR,
+            embeddings.DISK_CACHE_PATH, extraction.DISK_CACHE_PATH, metrics.TRACE_DIR, CONVERSATIONS_DIR,
+        ]
+        data_root, names = os.path.abspath("data"), set()
+        for path in filter(None, stores):
+            rel = os.path.relpath(os.path.abspath(path), data_root)
+            if rel == "." or rel.startswith(".."):
+                continue
+            top = rel.split(os.sep)[0]
+            names.add(top)
+            if top.endswith(".sqlite"):
+                names |= {f"{top}-wal", f"{top}-shm", f"{top}-journal"}
+        _reserved = names
+    return _reserved
+
+
+async def reject_deleted_profile(request: Request):
+    """Router dependency: 410 for a request naming a profile that is being deleted.
+
+    Loading its memory or session would re-create the folders the reclaimer
+    is removing. The profile may come from the path, the query, a form field
+    or the agent's x-user-id header.
+    """
+    names = [
+        request.path_params.get("profile"), request.path_params.get("profile_name"),
+        request.query_params.get("profile"), request.headers.get("x-user-id"),
+    ]
+    if request.headers.get("content-type", "").startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        names.append((await request.form()).get("profile"))
+    if any(isinstance(name, str) and profiles.is_deleted(name) for name in names):
+        raise HTTPException(status_code=410, detail="Profile has been deleted")
+
+
+# ============================================================
+# Background reclaimer
+# ============================================================
+def _profile_paths(name: str) -> list[str]:
+    """Everything under data/ that belongs to a profile."""
+    return [os.path.join(DATA_DIR, name), os.path.join("data", name)]
+
+
+def reclaim_profile(name: str):
+    """Remove a tombstoned profile's memory, vectors, session and files."""
+    from pkg.memory_registry import registry as memories
+    from pkg.vector_shards import drop_profile
+    from pkg.app.session_state import sessions
+    from pkg.uploads import blob_store
+    from pkg.ingest import pipeline
+    from pkg.year_review import reviews
+
+    pipeline.discard(name)
+    reviews.forget(name)
+    memories.evict(name, wait=True)
+    drop_profile(name)
+    for namespace in ("gpt4v", "photo", "agent"):
+        sessions.delete(namespace, name)
+    data_root = os.path.realpath("data")
+    for path in _profile_paths(name):
+        real = os.path.realpath(path)
+        # Names are validated on create, but legacy ones weren't.
+        if (
+            os.path.commonpath([real, data_root]) != data_root
+            or os.path.dirname(real) not in (data_root, os.path.realpath(DATA_DIR))
+            or name in reserved_names()
+        ):
+            print(f"[PROFILES] ⚠️ Refusing to remove {path}")
+            continue
+        if os.path.isdir(real):
+            shutil.rmtree(real)
+    store = blob_store()
+    store.forget(name)
+    store.collect_garbage()
+
+
+class Reclaimer:
+    """Daemon thread that reclaims tombstoned profiles; woken on delete, retried periodically."""
+
+    def __init__(self, profiles: ProfileRegistry, interval=RECLAIM_INTERVAL):
+        self.profiles = profiles
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-reclaimer", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def run_once(self) -> int:
+        reclaimed = 0
+        for name in self.profiles.tombstoned():
+            try:
+                reclaim_profile(name)
+            except Exception as e:
+                # Stays tombstoned; the next pass retries.
+                print(f"[PROFILES] ⚠️ Reclaiming '{name}' failed: {e}")
+                continue
+            self.profiles.forget(name)
+            reclaimed += 1
+            print(f"[PROFILES] 🗑️ Reclaimed profile '{name}'")
+        return reclaimed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.run_once()
+
+
+profiles = ProfileRegistry()
+reclaimer = Reclaimer(profiles)
+
+
+def start_reclaimer():
+    """Start the reclaimer and pick up deletes left over from a previous run."""
+    reclaimer.wake()
+
+
+def _check_name(name: str) -> str:
     name = name.strip()
     if not name:
         raise HTTPException(status_code=400, detail="Profile name cannot be empty")
+    if "/" in name or "\\" in name or name.startswith(".") or name in reserved_names():
+        raise HTTPException(status_code=400, detail="Profile name is reserved or not a valid folder name")
+    return name
+
+
+# ✅ 1. List profiles (cursor-paginated; the next cursor is in X-Next-Cursor)
+@router.get("/list")
+def list_profiles(response: Response, cursor: Optional[int] = None, limit: int = PAGE_SIZE) -> List[dict]:
+    if not 0 < limit <= PAGE_MAX:
+        raise HTTPException(status_code=422, detail=f"limit must be within 1..{PAGE_MAX}")
+    names, next_cursor = profiles.page(cursor, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return [{"name": p} for p in names]
 
-    profiles = load_profiles()
-    if name in profiles:
-        raise HTTPException(status_code=400, detail="Profile already exists")
 
-    profiles.append(name)
-    save_profiles(profiles)
+# ✅ 2. Create a new profile
+@router.post("/create")
+def create_profile(name: str):
+    name = _check_name(name)
+    profiles.create(name)
 
     # Create individual folder for the new profile
     profile_dir = os.path.join(DATA_DIR, name)
@@ -56,33 +339,19 @@ def create_profile(name: str):
     return {"name": name, "message": f"Profile '{name}' created successfully"}
 
 
-# ✅ 3. Delete a profile
-@router.delete("/delete")
+# ✅ 3. Delete a profile (tombstoned now, files removed in the background)
+@router.delete("/delete", status_code=202)
 def delete_profile(name: str):
-    profiles = load_profiles()
-    if name not in profiles:
+    if not profiles.tombstone(name):
         raise HTTPException(status_code=404, detail="Profile not found")
-
-    profiles.remove(name)
-    save_profiles(profiles)
-
-    profile_dir = os.path.join(DATA_DIR, name)
-    if os.path.exists(profile_dir):
-        for root, dirs, files in os.walk(profile_dir, topdown=False):
-            for file in files:
-                os.remove(os.path.join(root, file))
-            for dir in dirs:
-                os.rmdir(os.path.join(root, dir))
-        os.rmdir(profile_dir)
-
+    reclaimer.wake()
     return {"message": f"Profile '{name}' deleted successfully"}
 
 
 # ✅ 4. Select profile
 @router.post("/select")
 def select_profile(name: str):
-    profiles = load_profiles()
-    if name not in profiles:
+    if not profiles.exists(name):
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    return {"name": name, "message": f"Profile '{name}' selected"}
\ No newline at end of file
+    return {"name": name, "message": f"Profile '{name}' selected"}
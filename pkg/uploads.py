@@ -0,0 +1,230 @@
+# pkg/uploads.py
+import os, time, shutil, sqlite3, asyncio, hashlib, threading
+from fastapi import UploadFile, HTTPException
+
+BLOB_DIR = os.getenv("MINDLINK_BLOB_DIR", os.path.join("data", "blobs"))
+CHUNK_BYTES = int(os.getenv("MINDLINK_UPLOAD_CHUNK_KB", "1024")) * 1024
+MAX_UPLOAD_BYTES = int(float(os.getenv("MINDLINK_UPLOAD_MAX_MB", "25")) * 1024 * 1024)
+# Per-profile storage quota over deduplicated bytes; 0 disables.
+PROFILE_QUOTA_BYTES = int(float(os.getenv("MINDLINK_PROFILE_QUOTA_MB", "1024")) * 1024 * 1024)
+
+
+# ============================================================
+# Content-addressed blob store
+# ============================================================
+class BlobStore:
+    """Uploads stored once per SHA-256, hard-linked to wherever profiles expect them.
+
+    `refs` records which profile file points at which blob, so quotas count
+    each distinct blob once per profile however often it was uploaded. Every
+    caller keys refs by the profile name.
+    """
+
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, created REAL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            "profile TEXT, path TEXT, digest TEXT, created REAL, PRIMARY KEY (profile, path))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS refs_digest ON refs (profile, digest)")
+        self._rekey_photo_refs(conn)
+
+    @staticmethod
+    def _rekey_photo_refs(conn):
+        # pkg.photo used to key its refs "<user>_<profile>"; move them to the profile name.
+        pattern = os.path.join("data", "profiles", "%", "%", "uploads", "%")
+        for key, path in conn.execute("SELECT profile, path FROM refs WHERE path LIKE ?", (pattern,)).fetchall():
+            parts = os.path.normpath(path).split(os.sep)
+            if len(parts) >= 6 and key == f"{parts[2]}_{parts[3]}":
+                conn.execute("UPDATE OR REPLACE refs SET profile = ? WHERE profile = ? AND path = ?", (parts[3], key, path))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(
+                os.path.join(self.root, "index.sqlite"), timeout=30, isolation_level=None
+            )
+        return conn
+
+    def blob_path(self, digest: str, ext: str = "") -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{ext.lower()}")
+
+    def usage(self, profile: str) -> int:
+        """Deduplicated bytes referenced by a profile."""
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blobs WHERE digest IN (SELECT digest FROM refs WHERE profile = ?)",
+            (profile,),
+        ).fetchone()
+        return row[0]
+
+    def find(self, profile: str, digest: str):
+        """An existing file of this profile with the given content, if any."""
+        for (path,) in self._conn().execute(
+            "SELECT path FROM refs WHERE profile = ? AND digest = ? ORDER BY created", (profile, digest)
+        ):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def prune(self, profile: str) -> int:
+        """Forget references whose files were deleted."""
+        conn = self._conn()
+        gone = [p for (p,) in conn.execute("SELECT path FROM refs WHERE profile = ?", (profile,)) if not os.path.exists(p)]
+        conn.executemany("DELETE FROM refs WHERE profile = ? AND path = ?", [(profile, p) for p in gone])
+        return len(gone)
+
+    def move_ref(self, old: str, new: str):
+        """Follow a profile file that was moved on disk."""
+        with self._lock:
+            self._conn().execute("UPDATE OR REPLACE refs SET path = ? WHERE path = ?", (new, old))
+
+    def forget(self, profile: str) -> int:
+        """Drop every reference of a deleted profile; `collect_garbage` then frees its blobs."""
+        with self._lock:
+            return self._conn().execute("DELETE FROM refs WHERE profile = ?", (profile,)).rowcount
+
+    # -------------------------------
+    # Writing
+    # -------------------------------
+    def _open_temp(self):
+        path = os.path.join(self.root, "tmp", f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}")
+        return path, open(path, "wb")
+
+    @staticmethod
+    def _write_chunk(f, hasher, chunk: bytes):
+        hasher.update(chunk)
+        f.write(chunk)
+
+    async def receive(self, file: UploadFile, max_bytes=MAX_UPLOAD_BYTES) -> tuple[str, str, int]:
+        """Stream an upload to a temp file in chunks, hashing as it goes.
+
+        Returns (temp path, sha256, size). Rejects with 413 as soon as the
+        size limit is crossed, without reading the rest.
+        """
+        if max_bytes and file.size is not None and file.size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+        tmp, f = await asyncio.to_thread(self._open_temp)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            while chunk := await file.read(CHUNK_BYTES):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+                await asyncio.to_thread(self._write_chunk, f, hasher, chunk)
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+        finally:
+            await file.close()
+        return tmp, hasher.hexdigest(), size
+
+    def commit(self, profile: str, tmp: str, digest: str, size: int, dest: str, reuse: bool = False) -> dict:
+        """Move a received temp file into the store and expose it at `dest`.
+
+        With `reuse`, a profile that already has this content gets its
+        existing file back instead of a new name.
+        """
+        ext = os.path.splitext(dest)[1]
+        blob = self.blob_path(digest, ext)
+        with self._lock:
+            conn = self._conn()
+            try:
+                existing = self.find(profile, digest)
+                if existing is None and PROFILE_QUOTA_BYTES:
+                    used = self.usage(profile)
+                    if used + size > PROFILE_QUOTA_BYTES and self.prune(profile):
+                        used = self.usage(profile)
+                    if used + size > PROFILE_QUOTA_BYTES:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Storage quota exceeded ({used} of {PROFILE_QUOTA_BYTES} bytes used)",
+                        )
+
+                duplicate = os.path.exists(blob)
+                if duplicate:
+                    os.remove(tmp)
+                else:
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(tmp, blob)
+                conn.execute("INSERT OR IGNORE INTO blobs (digest, size, created) VALUES (?, ?, ?)", (digest, size, time.time()))
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+            if reuse and existing is not None:
+                return {"path": existing, "digest": digest, "size": size, "deduplicated": True}
+
+            _link(blob, dest)
+            conn.execute(
+                "INSERT OR REPLACE INTO refs (profile, path, digest, created) VALUES (?, ?, ?, ?)",
+                (profile, dest, digest, time.time()),
+            )
+        if duplicate:
+            print(f"[UPLOAD] ♻️ {os.path.basename(dest)} deduplicated ({digest[:12]})")
+        return {"path": dest, "digest": digest, "size": size, "deduplicated": duplicate}
+
+    def collect_garbage(self) -> int:
+        """Delete blobs nothing links to any more (single link, no live reference)."""
+        removed = 0
+        with self._lock:
+            conn = self._conn()
+            for digest, in conn.execute("SELECT digest FROM blobs").fetchall():
+                live = [p for (p,) in conn.execute("SELECT path FROM refs WHERE digest = ?", (digest,)) if os.path.exists(p)]
+                if live:
+                    continue
+                folder = os.path.join(self.root, digest[:2])
+                for name in os.listdir(folder) if os.path.isdir(folder) else []:
+                    if name.startswith(digest):
+                        os.remove(os.path.join(folder, name))
+                conn.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                removed += 1
+        return removed
+
+
+def _link(blob: str, dest: str):
+    """Point `dest` at the blob (hard link, else copy), replacing whatever was there."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    if os.path.exists(dest) and os.path.samefile(blob, dest):
+        return
+    tmp = f"{dest}.tmp-{threading.get_ident()}"
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        shutil.copyfile(blob, tmp)
+    os.replace(tmp, dest)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def blob_store() -> BlobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
+
+
+async def save_upload(file: UploadFile, profile: str, dest: str, reuse: bool = False) -> dict:
+    """Stream an upload into the blob store and expose it at `dest`.
+
+    `profile` is the profile name, the key quotas and references are counted
+    under. Returns {"path", "digest", "size", "deduplicated"}; `path` differs
+    from `dest` only when `reuse` finds the profile already has this content.
+    Raises 413 when the upload is too large or the profile is over quota.
+    """
+    store = blob_store()
+    tmp, digest, size = await store.receive(file)
+    return await asyncio.to_thread(store.commit, profile, tmp, digest, size, dest, reuse)
@@ -0,0 +1,845 @@
+import os, json, math, pickle, shutil, hashlib, bisect, threading, time, atexit
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from pkg.metrics import span
+
+FLUSH_DELAY_SECONDS = float(os.getenv("MINDLINK_FAISS_FLUSH_DELAY", "2.0"))
+FLUSH_MAX_DELAY_SECONDS = float(os.getenv("MINDLINK_FAISS_FLUSH_MAX_DELAY", "30.0"))
+# Squared L2 distance under which a new summary counts as a near-duplicate
+# of a stored one (≈ cosine 0.98 for unit-length embeddings); 0 disables.
+DEDUP_DISTANCE = float(os.getenv("MINDLINK_FAISS_DEDUP_DISTANCE", "0.04"))
+
+# Index mode: "flat", "ivf_sq8", "ivf_pq", "ivf_hnsw_sq8", "ivf_hnsw_pq", or
+# "auto" (flat until ANN_THRESHOLD vectors, then ivf_sq8). Per-profile
+# overrides: MINDLINK_FAISS_INDEX_MODES='{"<profile>": "ivf_pq"}'.
+INDEX_MODE = os.getenv("MINDLINK_FAISS_INDEX", "auto")
+INDEX_MODES = json.loads(os.getenv("MINDLINK_FAISS_INDEX_MODES", "{}"))
+ANN_THRESHOLD = int(os.getenv("MINDLINK_FAISS_ANN_THRESHOLD", "20000"))
+NPROBE = int(os.getenv("MINDLINK_FAISS_NPROBE", "16"))
+# IVF modes keep a read-only base index plus a flat delta for writes; the base
+# is rebuilt from raw vectors once the delta and masked rows pass this size
+# (or a tenth of the collection, whichever is larger).
+DELTA_MAX = int(os.getenv("MINDLINK_FAISS_DELTA_MAX", "2048"))
+BASE_INDEX, BASE_IDS, BASE_VECTORS = "base.faiss", "base_ids.npy", "base_vectors.npy"
+
+# One lock guards every resident index and the registry below, whichever
+# adapter instance reaches them.
+LOCK = threading.RLock()
+_INDEXES: dict[str, "ResidentIndex"] = {}
+# Indexes being flushed for release; `resident_index` waits for these.
+_RELEASING: dict[str, threading.Event] = {}
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="faiss-writer")
+
+
+def edge_key(source: str, target: str) -> str:
+    """Stable vector key of the summary stored for a graph edge."""
+    return f"{source}->{target}"
+
+
+def doc_key(text: str, metadata: dict) -> str:
+    """Key for a summary: its edge when known, else its text (legacy vectors)."""
+    if metadata.get("source") is not None and metadata.get("target") is not None:
+        return edge_key(metadata["source"], metadata["target"])
+    return "text:" + text
+
+
+ALIAS_PREFIX = "alias:"
+
+
+def vector_id(key: str) -> int:
+    """63-bit FAISS id derived from a vector key."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+# ============================================================
+# Index modes
+# ============================================================
+def profile_index_mode(profile: str) -> str:
+    """Configured index mode for a profile."""
+    return INDEX_MODES.get(profile, INDEX_MODE)
+
+
+def index_mode_for(path: str) -> str:
+    """Configured mode for the profile owning a `faiss_<profile>` folder."""
+    return profile_index_mode(os.path.basename(os.path.normpath(path)).removeprefix("faiss_"))
+
+
+def resolve_mode(mode: str, ntotal: int) -> str:
+    """Concrete mode to build for a collection of `ntotal` vectors."""
+    if mode == "auto":
+        return "ivf_sq8" if ntotal >= ANN_THRESHOLD else "flat"
+    if mode != "flat" and ntotal < 39:
+        return "flat"  # too few points to train even one IVF list
+    if mode.endswith("_pq") and ntotal < 39 * 256:
+        # PQ codebooks need ~39 * 256 training points; use SQ8 until there are enough.
+        return mode.removesuffix("_pq") + "_sq8"
+    return mode
+
+
+def ideal_nlist(ntotal: int) -> int:
+    # ~sqrt(n) lists, with at least 39 training points per centroid.
+    return max(1, min(int(math.sqrt(ntotal)), ntotal // 39))
+
+
+def factory_spec(mode: str, dim: int, ntotal: int) -> str:
+    """faiss.index_factory string for a concrete mode and collection size.
+
+    HNSW is used as the IVF coarse quantizer rather than as the whole index.
+    IVF indexes are built read-only: deletes and upserts mask their ids
+    instead of calling `remove_ids`, which desyncs an `IndexIDMap2` over IVF.
+    """
+    if mode == "flat":
+        return "Flat"
+    nlist = ideal_nlist(ntotal)
+    coarse = f"IVF{nlist}_HNSW32" if "hnsw" in mode else f"IVF{nlist}"
+    if mode.endswith("_pq"):
+        m = next(m for m in (dim // 16, dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+        return f"{coarse},PQ{m}"
+    return f"{coarse},SQ8"
+
+
+def current_mode(index) -> str:
+    """Best-effort mode name of a built (ID-mapped) index."""
+    inner = index.index if isinstance(index, faiss.IndexIDMap2) else index
+    try:
+        ivf = faiss.extract_index_ivf(inner)
+    except RuntimeError:
+        return "flat"
+    coarse = "ivf_hnsw" if isinstance(faiss.downcast_index(ivf.quantizer), faiss.IndexHNSW) else "ivf"
+    return f"{coarse}_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else f"{coarse}_sq8"
+
+
+def tune(index, nprobe=NPROBE):
+    """Apply query-time parameters (nprobe is not persisted by faiss)."""
+    if current_mode(index) != "flat":
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", nprobe)
+    return index
+
+
+def search_params(index, selector=None, nprobe=NPROBE):
+    """Per-query parameters of the right type for the index (IVF needs its own)."""
+    if current_mode(index) == "flat":
+        return faiss.SearchParameters(sel=selector)
+    return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+
+
+def all_vectors(index) -> tuple[np.ndarray, np.ndarray]:
+    """(ids, vectors) of a flat ID-mapped index.
+
+    Quantized indexes only hold approximations and are never read back; IVF
+    bases keep their raw vectors beside them (see `stored_vectors`).
+    """
+    if current_mode(index) != "flat":
+        raise ValueError("quantized index: its raw vectors are not recoverable")
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    if not len(ids):
+        return ids, np.zeros((0, index.d), dtype=np.float32)
+    return ids, index.index.reconstruct_n(0, len(ids))
+
+
+def stored_vectors(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """(ids, raw vectors) of a saved resident index: the flat delta plus its base rows.
+
+    Base rows of deleted summaries are included; match ids against the docstore.
+    """
+    ids, vectors = all_vectors(faiss.read_index(os.path.join(path, "index.faiss")))
+    if os.path.exists(os.path.join(path, BASE_IDS)):
+        base_ids = np.load(os.path.join(path, BASE_IDS))
+        keep = ~np.isin(base_ids, ids)
+        ids = np.concatenate([ids, base_ids[keep]])
+        vectors = np.vstack([vectors, np.load(os.path.join(path, BASE_VECTORS), mmap_mode="r")[keep]])
+    return ids, vectors
+
+
+def build_index(mode: str, ids: np.ndarray, vectors: np.ndarray, dim: int):
+    """Train (if needed) and fill a new ID-mapped index of the given mode."""
+    spec = factory_spec(mode, dim, len(ids))
+    index = faiss.IndexIDMap2(faiss.index_factory(dim, spec))
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > 100_000:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), 100_000, replace=False)]
+        index.train(sample)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return tune(index)
+
+
+def batch_duplicates(vectors) -> dict[int, int]:
+    """{i: j} for each vector within DEDUP_DISTANCE of an earlier, kept vector j of the same batch."""
+    if not DEDUP_DISTANCE or len(vectors) < 2:
+        return {}
+    xs = np.asarray(vectors, dtype=np.float32)
+    twins, kept = {}, []
+    for i, x in enumerate(xs):
+        if kept:
+            dists = ((xs[kept] - x) ** 2).sum(axis=1)
+            j = int(dists.argmin())
+            if dists[j] <= DEDUP_DISTANCE:
+                twins[i] = kept[j]
+                continue
+        kept.append(i)
+    return twins
+
+
+# ============================================================
+# Metadata allow-lists
+# ============================================================
+class MetadataIndex:
+    """Inverted index over vector metadata used to build FAISS id allow-lists.
+
+    Equality fields (photo, speaker) keep one id set per value; timestamps are
+    kept sorted so a date range resolves with two bisects.
+    """
+
+    FIELDS = ("photo", "speaker")
+
+    def __init__(self):
+        self._postings: dict[tuple, set] = {}
+        self._by_time: list[tuple[float, int]] = []
+        self._meta: dict[int, dict] = {}
+
+    def add(self, vid: int, metadata: dict):
+        self.remove(vid)
+        entry = {f: metadata.get(f) for f in self.FIELDS if metadata.get(f) is not None}
+        for field, value in entry.items():
+            self._postings.setdefault((field, value), set()).add(vid)
+        ts = metadata.get("timestamp")
+        if ts is not None:
+            entry["timestamp"] = float(ts)
+            bisect.insort(self._by_time, (float(ts), vid))
+        self._meta[vid] = entry
+
+    def remove(self, vid: int):
+        entry = self._meta.pop(vid, None)
+        if entry is None:
+            return
+        for field in self.FIELDS:
+            if field in entry:
+                self._postings.get((field, entry[field]), set()).discard(vid)
+        if "timestamp" in entry:
+            i = bisect.bisect_left(self._by_time, (entry["timestamp"], vid))
+            if i < len(self._by_time) and self._by_time[i] == (entry["timestamp"], vid):
+                del self._by_time[i]
+
+    def allow_ids(self, filters: dict):
+        """Ids matching every filter, or None when no filter applies.
+
+        Supported keys: `photo`, `speaker` (a value or a list of values) and
+        `since` / `until` (epoch seconds, inclusive).
+        """
+        allowed = None
+        for field in self.FIELDS:
+            wanted = filters.get(field)
+            if wanted is None:
+                continue
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            ids = set().union(*(self._postings.get((field, v), set()) for v in values))
+            allowed = ids if allowed is None else allowed & ids
+        since, until = filters.get("since"), filters.get("until")
+        if since is not None or until is not None:
+            lo = bisect.bisect_left(self._by_time, (float(since), -1)) if since is not None else 0
+            hi = bisect.bisect_right(self._by_time, (float(until), 1 << 63)) if until is not None else len(self._by_time)
+            ids = {vid for _, vid in self._by_time[lo:hi]}
+            allowed = ids if allowed is None else allowed & ids
+        return allowed
+
+
+# ============================================================
+# Resident FAISS index
+# ============================================================
+class ResidentIndex:
+    """A FAISS store kept in memory for one profile.
+
+    New texts go into a pending queue; a writer drains the whole queue with a
+    single embedding call and appends it to the in-memory index. Disk flushes
+    are debounced and written atomically (temp dir, then rename).
+
+    Vectors live in a flat `IndexIDMap2` under ids derived from their key (see
+    `doc_key`), so re-adding a key replaces its vector and `remove` deletes it.
+    A near-duplicate of a stored summary gets no vector of its own; it is kept
+    as an alias doc (`alias:<key>`, not in the index) of the summary it
+    duplicates, and is re-embedded under its own key if that one is removed.
+    The index starts flat; once the configured mode calls for an ANN index, a
+    background thread builds a read-only IVF base from the raw vectors and
+    swaps it in. The flat index then serves as the delta: writes land there
+    and mask the base copy of their id until the next rebuild. The base's raw
+    vectors are saved beside it, so rebuilds never start from quantized codes.
+    """
+
+    def __init__(self, path: str, embeddings, mode: str = None):
+        self.path = path
+        self.embeddings = embeddings
+        self.mode = mode or index_mode_for(path)
+        self._migrating = False
+        self._touched: set[int] = set()  # ids written while a base was building
+        self.db = None
+        self.base = None  # read-only IVF index; `db.index` is then the flat delta
+        self.base_ids = self.base_vectors = None  # its ids and raw vectors, row-aligned
+        self.base_live: set[int] = set()  # base ids whose base vector is current
+        self.masked: set[int] = set()  # base ids deleted or superseded in the delta
+        self._base_saved = False
+        self.loaded = False
+        self._pending: list[tuple[str, str, dict]] = []
+        self.meta_index = MetadataIndex()
+        self.aliases: dict[str, str] = {}  # near-duplicate key -> key whose vector stands in for it
+        self.duplicates_skipped = 0
+        self._drain_lock = threading.Lock()
+        self._draining = False
+        self._embed_failures = 0
+        self._dirty_since = None
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()  # one flush of this index at a time
+
+    # -------------------------------
+    # Load / flush
+    # -------------------------------
+    def load(self):
+        with LOCK:
+            if self.loaded:
+                return self.db
+            self.loaded = True
+            backup = f"{self.path}.old"
+            if not os.path.exists(self.path) and os.path.exists(backup):
+                # A flush was interrupted between the two renames.
+                os.rename(backup, self.path)
+            if os.path.exists(self.path):
+                try:
+                    self.db = FAISS.load_local(
+                        self.path, self.embeddings, allow_dangerous_deserialization=True
+                    )
+                    print(f"[FAISS] ✅ Loaded {self.path}")
+                except Exception as e:
+                    print(f"[WARN] FAISS load failed: {e}")
+            if self.db is not None and not isinstance(self.db.index, faiss.IndexIDMap2):
+                self._migrate_to_id_map()
+            elif self.db is not None and current_mode(self.db.index) != "flat":
+                self._reembed_quantized()
+            elif self.db is not None:
+                self._load_base()
+                for vid, key in self.db.index_to_docstore_id.items():
+                    doc = self.db.docstore.search(key)
+                    if isinstance(doc, Document):
+                        self.meta_index.add(vid, doc.metadata or {})
+                for key, doc in getattr(self.db.docstore, "_dict", {}).items():
+                    if key.startswith(ALIAS_PREFIX) and isinstance(doc, Document):
+                        self.aliases[key.removeprefix(ALIAS_PREFIX)] = doc.metadata.get("alias_of")
+            self._maybe_migrate()
+            return self.db
+
+    # -------------------------------
+    # Index mode migration
+    # -------------------------------
+    def _maybe_migrate(self):
+        # Caller holds LOCK.
+        db = self.db
+        if db is None or self._migrating:
+            return
+        live = len(db.index_to_docstore_id)
+        target = resolve_mode(self.mode, live)
+        if target == "flat":
+            if self.base is not None:
+                self._fold_base(db)
+            return
+        if self.base is not None and current_mode(self.base) == target:
+            # Same mode: rebuild once the delta and masked rows outgrow it, or
+            # the IVF lists have grown ~16x too long.
+            churn = db.index.ntotal + len(self.masked)
+            nlist = faiss.extract_index_ivf(self.base.index).nlist
+            if churn <= max(DELTA_MAX, live // 10) and nlist * 4 >= ideal_nlist(live):
+                return
+        self._migrating = True
+        self._touched = set()
+        ids, vectors = self._live_vectors(db)
+        folded = set(faiss.vector_to_array(db.index.id_map).tolist())
+        threading.Thread(target=self._migrate, args=(target, ids, vectors, folded), daemon=True).start()
+
+    def _migrate(self, target, ids, vectors, folded):
+        start = time.perf_counter()
+        try:
+            index = build_index(target, ids, vectors, vectors.shape[1])
+            with LOCK:
+                # Delta vectors now in the base leave the delta; ids written during
+                # the build keep their delta vector (or deletion) and mask the base.
+                touched = self._touched
+                stale = [vid for vid in folded if vid not in touched]
+                if stale:
+                    self.db.index.remove_ids(np.array(stale, dtype=np.int64))
+                self.base, self.base_ids, self.base_vectors = index, ids, vectors
+                self.base_live = {vid for vid in ids.tolist() if vid not in touched}
+                self.masked = set(ids.tolist()) - self.base_live
+                self._base_saved = False
+                self._schedule_flush()
+            print(f"[FAISS] ✅ Rebuilt {self.path} as {target} ({index.ntotal} vectors, {time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            print(f"[ERROR] FAISS index migration failed: {e}")
+        finally:
+            with LOCK:
+                self._migrating = False
+                self._touched = set()
+
+    def _live_vectors(self, db) -> tuple[np.ndarray, np.ndarray]:
+        # Caller holds LOCK. Raw vectors of every stored summary.
+        ids, vectors = all_vectors(db.index)
+        if self.base is not None and self.base_live:
+            rows = np.flatnonzero(np.isin(self.base_ids, np.fromiter(self.base_live, dtype=np.int64)))
+            ids = np.concatenate([ids, self.base_ids[rows]])
+            vectors = np.vstack([vectors, self.base_vectors[rows]]).astype(np.float32)
+        return ids, vectors
+
+    def _fold_base(self, db):
+        # Caller holds LOCK. Back to a single flat index (mode changed or the profile shrank).
+        if self.base_live:
+            rows = np.flatnonzero(np.isin(self.base_ids, np.fromiter(self.base_live, dtype=np.int64)))
+            db.index.add_with_ids(np.asarray(self.base_vectors[rows], dtype=np.float32), self.base_ids[rows])
+        self.base = self.base_ids = self.base_vectors = None
+        self.base_live, self.masked = set(), set()
+        self._base_saved = False
+        self._schedule_flush()
+
+    def _load_base(self):
+        # Caller holds LOCK. Ids in the delta or gone from the docstore stay masked.
+        ids_path = os.path.join(self.path, BASE_IDS)
+        if not os.path.exists(ids_path):
+            return
+        self.base = tune(faiss.read_index(os.path.join(self.path, BASE_INDEX)))
+        self.base_ids = np.load(ids_path)
+        self.base_vectors = np.load(os.path.join(self.path, BASE_VECTORS), mmap_mode="r")
+        delta = set(faiss.vector_to_array(self.db.index.id_map).tolist())
+        stored = self.db.index_to_docstore_id
+        self.base_live = {vid for vid in self.base_ids.tolist() if vid in stored and vid not in delta}
+        self.masked = set(self.base_ids.tolist()) - self.base_live
+        self._base_saved = True
+
+    def _save_base(self, folder: str, base, base_ids, base_vectors, saved: bool):
+        # Caller holds the flush lock. The base is read-only once swapped in, so
+        # it is written outside LOCK; an unchanged one is hard-linked from the current folder.
+        if base is None:
+            return
+        if saved:
+            for name in (BASE_INDEX, BASE_IDS, BASE_VECTORS):
+                try:
+                    os.link(os.path.join(self.path, name), os.path.join(folder, name))
+                except OSError:
+                    shutil.copy2(os.path.join(self.path, name), os.path.join(folder, name))
+            return
+        faiss.write_index(base, os.path.join(folder, BASE_INDEX))
+        np.save(os.path.join(folder, BASE_IDS), base_ids)
+        np.save(os.path.join(folder, BASE_VECTORS), np.asarray(base_vectors, dtype=np.float32))
+
+    def _reembed_quantized(self):
+        # Caller holds LOCK. Stores saved with an IVF index in place only hold
+        # quantized (and possibly desynced) codes; re-embed their texts instead
+        # of trusting a reconstruction. Cached embeddings make this cheap.
+        items = []
+        for key, doc in getattr(self.db.docstore, "_dict", {}).items():
+            if isinstance(doc, Document):
+                meta = {k: v for k, v in (doc.metadata or {}).items() if k != "alias_of"}
+                items.append((key.removeprefix(ALIAS_PREFIX), doc.page_content, meta))
+        print(f"[FAISS] Re-embedding {self.path} ({len(items)} summaries) saved with a quantized index")
+        self.db = None
+        self._pending[:0] = items
+        if not self._draining:
+            self._draining = True
+            _executor.submit(self._drain_loop)
+
+    def _migrate_to_id_map(self):
+        # Caller holds LOCK. Older stores use positional ids and may hold the
+        # same summary several times; rebuild them keyed and deduplicated.
+        db = self.db
+        vectors = db.index.reconstruct_n(0, db.index.ntotal) if db.index.ntotal else None
+        new = self._empty_db(db.index.d)
+        seen = set()
+        for pos, doc_id in sorted(db.index_to_docstore_id.items()):
+            doc = db.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            key = doc_key(doc.page_content, doc.metadata or {})
+            if key in seen:
+                continue
+            seen.add(key)
+            self._add(new, key, doc.page_content, doc.metadata or {}, vectors[pos])
+        print(f"[FAISS] Migrated {self.path} to keyed ids ({db.index.ntotal} → {new.index.ntotal} vectors)")
+        self.db = new
+        self._schedule_flush()
+
+    def _empty_db(self, dim: int) -> FAISS:
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=faiss.IndexIDMap2(faiss.IndexFlatL2(dim)),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    def _add(self, db, key, text, metadata, vector):
+        # Caller holds LOCK; replaces any vector already stored under `key`.
+        vid = vector_id(key)
+        if vid in self.base_live:
+            # The base is read-only: mask its copy, the new vector goes to the delta.
+            self.base_live.discard(vid)
+            self.masked.add(vid)
+            db.docstore.delete([key])
+        elif vid in db.index_to_docstore_id:
+            db.index.remove_ids(np.array([vid], dtype=np.int64))
+            db.docstore.delete([key])
+        db.index.add_with_ids(np.asarray([vector], dtype=np.float32), np.array([vid], dtype=np.int64))
+        db.docstore.add({key: Document(id=key, page_content=text, metadata=metadata)})
+        db.index_to_docstore_id[vid] = key
+        self.meta_index.add(vid, metadata)
+        if self._migrating and db is self.db:
+            self._touched.add(vid)
+
+    def _alias(self, db, key, text, metadata, target):
+        # Caller holds LOCK. `key` is stored as a near-duplicate of `target`.
+        for other, stand_in in list(self.aliases.items()):
+            if stand_in == key:
+                # Aliases of `key` lean on `target` from now on.
+                self.aliases[other] = target
+                doc = db.docstore.search(ALIAS_PREFIX + other)
+                if isinstance(doc, Document):
+                    doc.metadata["alias_of"] = target
+        if vector_id(key) in db.index_to_docstore_id:
+            self._remove(db, [key])  # its own, older vector
+        self._unalias(db, [key])
+        alias_id = ALIAS_PREFIX + key
+        db.docstore.add({alias_id: Document(id=alias_id, page_content=text, metadata={**metadata, "alias_of": target})})
+        self.aliases[key] = target
+
+    def _unalias(self, db, keys) -> list[tuple[str, str, dict]]:
+        # Caller holds LOCK. Drops alias docs; returns their (key, text, metadata).
+        dropped = []
+        for key in keys:
+            if self.aliases.pop(key, None) is None:
+                continue
+            doc = db.docstore.search(ALIAS_PREFIX + key)
+            db.docstore.delete([ALIAS_PREFIX + key])
+            if isinstance(doc, Document):
+                meta = {k: v for k, v in (doc.metadata or {}).items() if k != "alias_of"}
+                dropped.append((key, doc.page_content, meta))
+        return dropped
+
+    def _remove(self, db, keys) -> tuple[int, list]:
+        # Caller holds LOCK. Returns (removed, orphans): aliases of removed keys
+        # lost their stand-in vector and must be embedded under their own key.
+        keys = set(keys)
+        removed_aliases = len(self._unalias(db, [k for k in keys if k in self.aliases]))
+        ids = [vector_id(k) for k in keys if vector_id(k) in db.index_to_docstore_id]
+        if not ids:
+            return removed_aliases, []
+        gone = {db.index_to_docstore_id[vid] for vid in ids}
+        in_base = self.base_live.intersection(ids)
+        self.base_live -= in_base
+        self.masked |= in_base
+        delta = [vid for vid in ids if vid not in in_base]
+        if delta:
+            db.index.remove_ids(np.array(delta, dtype=np.int64))
+        db.docstore.delete([db.index_to_docstore_id.pop(vid) for vid in ids])
+        for vid in ids:
+            self.meta_index.remove(vid)
+        if self._migrating and db is self.db:
+            self._touched.update(ids)
+        orphans = self._unalias(db, [k for k, target in self.aliases.items() if target in gone])
+        return removed_aliases + len(ids), orphans
+
+    def flush(self):
+        """Write the index to disk now if it has unsaved changes.
+
+        Only the in-memory snapshot is taken under LOCK; the files are written
+        outside it, so one profile's flush doesn't stall the others.
+        """
+        with self._flush_lock:
+            with LOCK:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if self.db is None or self._dirty_since is None:
+                    return
+                dirty_since, self._dirty_since = self._dirty_since, None
+                index_bytes = faiss.serialize_index(self.db.index)
+                docs = pickle.dumps((self.db.docstore, self.db.index_to_docstore_id))
+                base = (self.base, self.base_ids, self.base_vectors, self._base_saved)
+                count = len(self.db.index_to_docstore_id)
+            tmp, backup = f"{self.path}.tmp", f"{self.path}.old"
+            try:
+                with span("faiss.flush"):
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    os.makedirs(tmp)
+                    with open(os.path.join(tmp, "index.faiss"), "wb") as f:
+                        f.write(index_bytes.tobytes())
+                    with open(os.path.join(tmp, "index.pkl"), "wb") as f:
+                        f.write(docs)
+                    self._save_base(tmp, *base)
+                    if os.path.exists(self.path):
+                        os.rename(self.path, backup)
+                    os.rename(tmp, self.path)
+                    shutil.rmtree(backup, ignore_errors=True)
+            except Exception as e:
+                print(f"[ERROR] FAISS flush failed: {e}")
+                with LOCK:
+                    # Still unsaved; the next change (or flush) tries again.
+                    self._dirty_since = min(dirty_since, self._dirty_since or dirty_since)
+                return
+            with LOCK:
+                if base[0] is not None and self.base is base[0] and not self._base_saved:
+                    # Serve the base's raw vectors from disk from now on.
+                    self.base_vectors = np.load(os.path.join(self.path, BASE_VECTORS), mmap_mode="r")
+                    self._base_saved = True
+            print(f"[FAISS] 💾 Flushed {self.path} ({count} vectors)")
+
+    def _schedule_flush(self):
+        # Caller holds LOCK.
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        # Debounce, but never hold changes back longer than the max delay.
+        delay = min(FLUSH_DELAY_SECONDS, max(0.0, self._dirty_since + FLUSH_MAX_DELAY_SECONDS - now))
+        self._flush_timer = threading.Timer(delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def enqueue(self, texts: list[str], metadatas: list[dict] = None):
+        """Queue texts for embedding; a background writer merges queued adds."""
+        metadatas = metadatas or [{} for _ in texts]
+        with LOCK:
+            self._pending.extend((doc_key(t, m), t, m) for t, m in zip(texts, metadatas))
+            if self._draining:
+                return
+            self._draining = True
+        _executor.submit(self._drain_loop)
+
+    def _drain_loop(self):
+        try:
+            while self.drain():
+                pass
+        finally:
+            with LOCK:
+                self._draining = False
+                restart = bool(self._pending)
+                if restart:
+                    self._draining = True
+                # Back off while the embedder keeps failing.
+                delay = min(60.0, 2.0 ** self._embed_failures) if self._embed_failures else 0.0
+            if restart and delay:
+                timer = threading.Timer(delay, _executor.submit, args=(self._drain_loop,))
+                timer.daemon = True
+                timer.start()
+            elif restart:
+                _executor.submit(self._drain_loop)
+
+    def drain(self) -> int:
+        """Embed everything queued so far in one call and add it to the in-memory index.
+
+        Re-queued keys with unchanged text only refresh their metadata, and new
+        summaries within `DEDUP_DISTANCE` of a different stored (or co-queued)
+        one are kept as its aliases rather than as vectors.
+        """
+        with self._drain_lock:
+            with LOCK:
+                items, self._pending = self._pending, []
+            if not items:
+                return 0
+            db = self.load()
+            latest = {key: (text, meta) for key, text, meta in items}
+            with LOCK:
+                fresh = []
+                for key, (text, meta) in latest.items():
+                    doc = None
+                    if db is not None:
+                        doc = db.docstore.search(ALIAS_PREFIX + key if key in self.aliases else key)
+                    if isinstance(doc, Document) and key in self.aliases and doc.page_content == text:
+                        doc.metadata = {**meta, "alias_of": self.aliases[key]}
+                        self.duplicates_skipped += 1
+                    elif isinstance(doc, Document) and doc.page_content == text:
+                        doc.metadata = meta
+                        self.meta_index.add(vector_id(key), meta)
+                        self.duplicates_skipped += 1
+                    else:
+                        fresh.append((key, text, meta))
+                if len(fresh) < len(latest):
+                    self._schedule_flush()
+            if not fresh:
+                return len(items)
+            try:
+                # Embed outside the shared lock so other profiles keep going.
+                vectors = self.embeddings.embed_documents([t for _, t, _ in fresh])
+            except Exception as e:
+                # Put the items back (ahead of newer ones) so they are retried.
+                with LOCK:
+                    self._pending[:0] = fresh
+                    self._embed_failures += 1
+                print(f"[ERROR] FAISS update failed ({len(fresh)} summaries re-queued): {e}")
+                return 0
+            added = 0
+            with LOCK:
+                self._embed_failures = 0
+                if self.db is None:
+                    self.db = self._empty_db(len(vectors[0]))
+                db = self.db
+                # Near-duplicates within the batch first, then against the index.
+                twins = batch_duplicates(vectors)
+                nearest = self._nearest(db, [v for i, v in enumerate(vectors) if i not in twins])
+                stands_in = {}
+                for i, ((key, text, meta), vector) in enumerate(zip(fresh, vectors)):
+                    if i in twins:
+                        continue
+                    dist, near_key = nearest.pop(0)
+                    if near_key is not None and near_key != key and dist <= DEDUP_DISTANCE:
+                        self._alias(db, key, text, meta, near_key)
+                        stands_in[i] = near_key
+                        self.duplicates_skipped += 1
+                        continue
+                    self._unalias(db, [key])
+                    self._add(db, key, text, meta, vector)
+                    stands_in[i] = key
+                    added += 1
+                for i, j in twins.items():
+                    key, text, meta = fresh[i]
+                    self._alias(db, key, text, meta, stands_in[j])
+                    self.duplicates_skipped += 1
+                self._schedule_flush()
+                self._maybe_migrate()
+            print(f"[FAISS] ✅ Updated ({added} new items, {len(items) - added} deduplicated)")
+            return len(items)
+
+    def _nearest(self, db, vectors) -> list[tuple[float, str]]:
+        # Caller holds LOCK.
+        if not DEDUP_DISTANCE or not len(vectors) or not db.index_to_docstore_id:
+            return [(float("inf"), None)] * len(vectors)
+        hits = self._search(db, vectors, 1)
+        return [(h[0][0], db.index_to_docstore_id.get(h[0][1])) if h else (float("inf"), None) for h in hits]
+
+    def _search(self, db, vectors, k, allow=None) -> list[list[tuple[float, int]]]:
+        # Caller holds LOCK. Nearest (distance, id) pairs over the delta and the unmasked base.
+        xq = np.asarray(vectors, dtype=np.float32)
+        hits = [[] for _ in range(len(xq))]
+        if db.index.ntotal:
+            params = None
+            if allow is not None:
+                keep = faiss.IDSelectorBatch(np.fromiter(allow, dtype=np.int64, count=len(allow)))
+                params = faiss.SearchParameters(sel=keep)
+            dists, ids = db.index.search(xq, k, params=params)
+            for row, (d, i) in enumerate(zip(dists, ids)):
+                hits[row] += [(float(a), int(b)) for a, b in zip(d, i) if b != -1]
+        live = self.base_live if allow is None else self.base_live & allow
+        if self.base is not None and live:
+            if allow is not None:
+                keep = faiss.IDSelectorBatch(np.fromiter(live, dtype=np.int64, count=len(live)))
+                selector = keep
+            elif self.masked:
+                keep = faiss.IDSelectorBatch(np.fromiter(self.masked, dtype=np.int64, count=len(self.masked)))
+                selector = faiss.IDSelectorNot(keep)
+            else:
+                selector = None
+            dists, ids = self.base.search(xq, k, params=search_params(self.base, selector))
+            for row, (d, i) in enumerate(zip(dists, ids)):
+                hits[row] += [(float(a), int(b)) for a, b in zip(d, i) if b != -1]
+        return [sorted(h)[:k] for h in hits]
+
+    def remove(self, keys: list[str]) -> int:
+        """Delete the vectors stored under `keys`, including ones still queued.
+
+        Aliases that leaned on a removed vector are queued for embedding under their own key.
+        """
+        keys = set(keys)
+        # Wait out an in-flight drain so it can't re-add a key after we delete it.
+        with self._drain_lock:
+            db = self.load()
+            with LOCK:
+                self._pending = [item for item in self._pending if item[0] not in keys]
+                if db is None:
+                    return 0
+                removed, orphans = self._remove(db, keys)
+                if removed:
+                    self._schedule_flush()
+                    self._maybe_migrate()
+        if orphans:
+            self.enqueue([t for _, t, _ in orphans], [m for _, _, m in orphans])
+        return removed
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def search(self, query: str, top_k: int = 5, filters: dict = None) -> list[str]:
+        return [text for text, _ in self.search_documents(query, top_k, filters)]
+
+    def search_documents(self, query: str, top_k: int = 5, filters: dict = None) -> list[tuple[str, dict]]:
+        """Nearest stored summaries as (text, metadata) pairs.
+
+        `filters` (see `MetadataIndex.allow_ids`) is applied inside the FAISS
+        search as an id allow-list, so filtered queries still return `top_k`.
+        """
+        # Read-your-writes: fold in anything still queued before searching.
+        self.drain()
+        db = self.load()
+        if db is None:
+            return []
+        vector = self.embeddings.embed_query(query)
+        with LOCK:
+            allowed = self.meta_index.allow_ids(filters) if filters else None
+            if allowed is not None and not allowed:
+                return []
+            results = []
+            for _, vid in self._search(db, [vector], top_k, allowed)[0]:
+                key = db.index_to_docstore_id.get(vid)
+                doc = db.docstore.search(key) if key is not None else None
+                if isinstance(doc, Document):
+                    results.append((doc.page_content, {**(doc.metadata or {}), "id": key}))
+        return results
+
+
+def resident_index(path: str, embeddings) -> ResidentIndex:
+    """Return the shared resident index for a FAISS folder."""
+    key = os.path.abspath(path)
+    while True:
+        with LOCK:
+            releasing = _RELEASING.get(key)
+            if releasing is None:
+                index = _INDEXES.get(key)
+                if index is None:
+                    index = _INDEXES[key] = ResidentIndex(path, embeddings, index_mode_for(path))
+                return index
+        # Loading from disk now would miss what the release is still flushing.
+        releasing.wait()
+
+
+def release_index(path: str):
+    """Flush and drop a resident index (e.g. when its profile is evicted).
+
+    The index stays registered until it is flushed, and stays resident if
+    queued summaries could not be embedded, so nothing queued is lost.
+    """
+    key = os.path.abspath(path)
+    with LOCK:
+        index = _INDEXES.get(key)
+        if index is None or key in _RELEASING:
+            return
+        done = _RELEASING[key] = threading.Event()
+    try:
+        index.drain()
+        index.flush()
+    finally:
+        with LOCK:
+            if index._pending:
+                print(f"[WARN] {path}: {len(index._pending)} summaries still queued; index kept resident")
+            elif _INDEXES.get(key) is index:
+                del _INDEXES[key]
+            del _RELEASING[key]
+        done.set()
+
+
+@atexit.register
+def flush_all():
+    with LOCK:
+        indexes = list(_INDEXES.values())
+    for index in indexes:
+        index.drain()
+        index.flush()
@@ -0,0 +1,614 @@
+import os, glob, json, time, pickle, sqlite3, hashlib, threading
+import faiss
+import numpy as np
+from pkg.vector_index import (
+    ALIAS_PREFIX, DEDUP_DISTANCE, batch_duplicates, build_index, current_mode, doc_key, profile_index_mode,
+    resolve_mode, search_params, stored_vectors, tune, vector_id,
+)
+
+SHARD_ROOT = os.getenv("MINDLINK_VECTOR_ROOT", os.path.join("data", "vectors"))
+SHARD_COUNT = int(os.getenv("MINDLINK_VECTOR_SHARDS", "16"))
+# Unmerged vectors per profile before the base index is rebuilt in the background.
+MERGE_AFTER = int(os.getenv("MINDLINK_VECTOR_MERGE_AFTER", "256"))
+# Base indexes are mapped read-only: the OS pages in only what queries touch.
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+SQL_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    profile TEXT, key TEXT, vid INTEGER, seq INTEGER, text TEXT, metadata TEXT,
+    photo TEXT, speaker TEXT, timestamp REAL, vector BLOB,
+    PRIMARY KEY (profile, key)
+);
+CREATE INDEX IF NOT EXISTS docs_vid ON docs (profile, vid);
+CREATE INDEX IF NOT EXISTS docs_seq ON docs (profile, seq);
+CREATE INDEX IF NOT EXISTS docs_photo ON docs (profile, photo);
+CREATE INDEX IF NOT EXISTS docs_speaker ON docs (profile, speaker);
+CREATE INDEX IF NOT EXISTS docs_time ON docs (profile, timestamp);
+CREATE TABLE IF NOT EXISTS aliases (
+    profile TEXT, key TEXT, target TEXT, text TEXT, metadata TEXT, PRIMARY KEY (profile, key)
+);
+CREATE INDEX IF NOT EXISTS aliases_target ON aliases (profile, target);
+CREATE TABLE IF NOT EXISTS tombstones (profile TEXT, vid INTEGER, seq INTEGER, PRIMARY KEY (profile, vid));
+CREATE TABLE IF NOT EXISTS profiles (profile TEXT PRIMARY KEY, next_seq INTEGER, base_seq INTEGER, dim INTEGER);
+"""
+
+
+def _chunks(items, size=SQL_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ============================================================
+# Shards
+# ============================================================
+class VectorShard:
+    """One shard directory: a SQLite docstore shared by its profiles, plus one
+    memory-mapped base index file per profile."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.db_path = os.path.join(path, "docs.sqlite")
+        self._local = threading.local()
+        conn = self.conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        return conn
+
+    def index_path(self, profile: str) -> str:
+        return os.path.join(self.path, f"{profile}.faiss")
+
+
+_SHARDS: dict[str, VectorShard] = {}
+_OPEN: dict[str, "ProfileVectors"] = {}
+_registry_lock = threading.Lock()
+
+
+def shard_for(profile: str, root: str = SHARD_ROOT, count: int = SHARD_COUNT) -> VectorShard:
+    """Stable profile → shard assignment."""
+    n = int.from_bytes(hashlib.blake2b(profile.encode("utf-8"), digest_size=4).digest(), "big") % count
+    path = os.path.abspath(os.path.join(root, f"shard-{n:02d}"))
+    with _registry_lock:
+        shard = _SHARDS.get(path)
+        if shard is None:
+            shard = _SHARDS[path] = VectorShard(path)
+        return shard
+
+
+def open_profile(profile: str, embeddings) -> "ProfileVectors":
+    """Return the shared open vector store of a profile; pair with `close_profile`."""
+    with _registry_lock:
+        vectors = _OPEN.get(profile)
+        if vectors is not None:
+            vectors.refs += 1
+            return vectors
+    vectors = ProfileVectors(shard_for(profile), profile, embeddings)
+    with _registry_lock:
+        vectors = _OPEN.setdefault(profile, vectors)
+        vectors.refs += 1
+        return vectors
+
+
+def close_profile(profile: str, force: bool = False):
+    """Release one handle; the last one unmaps the index (data stays on disk).
+
+    `force` closes it for every holder (the profile is being deleted).
+    """
+    with _registry_lock:
+        vectors = _OPEN.get(profile)
+        if vectors is None:
+            return
+        vectors.refs -= 1
+        if vectors.refs > 0 and not force:
+            return
+        del _OPEN[profile]
+    vectors.close()
+
+
+def drop_profile(profile: str) -> int:
+    """Delete every vector of a profile and its base index; returns the number of docs removed."""
+    close_profile(profile, force=True)
+    shard = shard_for(profile)
+    conn = shard.conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        removed = conn.execute("DELETE FROM docs WHERE profile = ?", (profile,)).rowcount
+        conn.execute("DELETE FROM tombstones WHERE profile = ?", (profile,))
+        conn.execute("DELETE FROM aliases WHERE profile = ?", (profile,))
+        conn.execute("DELETE FROM profiles WHERE profile = ?", (profile,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    path = shard.index_path(profile)
+    for leftover in (path, f"{path}.tmp"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return removed
+
+
+# ============================================================
+# Per-profile vectors
+# ============================================================
+class ProfileVectors:
+    """Vectors of one profile: a read-only mmapped base index plus an in-RAM delta.
+
+    Every vector is also kept in the shard's SQLite `docs` table, so the delta
+    survives restarts and merges can rebuild the base exactly. Deletes and
+    upserts of vectors already in the base are masked (tombstones / delta ids)
+    until the next merge rewrites it. Near-duplicates are stored as `aliases`
+    rows of the doc whose vector stands in for them (see `vector_index`).
+    """
+
+    def __init__(self, shard: VectorShard, profile: str, embeddings, mode: str = None):
+        self.shard = shard
+        self.profile = profile
+        self.embeddings = embeddings
+        self.mode = mode or profile_index_mode(profile)
+        self.lock = threading.RLock()
+        self.refs = 0  # open handles, guarded by the registry lock
+        self.closed = False
+        self._merging = False
+        self.duplicates_skipped = 0
+        self._open()
+
+    # -------------------------------
+    # Open / close
+    # -------------------------------
+    def _open(self):
+        conn = self.shard.conn()
+        row = conn.execute(
+            "SELECT next_seq, base_seq, dim FROM profiles WHERE profile = ?", (self.profile,)
+        ).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO profiles VALUES (?, 0, -1, NULL)", (self.profile,))
+            row = (0, -1, None)
+        self.next_seq, self.base_seq, self.dim = row
+        path = self.shard.index_path(self.profile)
+        self.base = tune(faiss.read_index(path, MMAP_FLAGS)) if os.path.exists(path) else None
+        self.delta, self.delta_seq = None, {}
+        for vid, seq, blob in conn.execute(
+            "SELECT vid, seq, vector FROM docs WHERE profile = ? AND seq > ?", (self.profile, self.base_seq)
+        ):
+            self._delta_add(vid, np.frombuffer(blob, dtype=np.float32), seq)
+        self.tombstones = dict(conn.execute("SELECT vid, seq FROM tombstones WHERE profile = ?", (self.profile,)))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.base, self.delta, self.delta_seq = None, None, {}
+
+    def _check_open(self):
+        # Caller holds self.lock.
+        if self.closed:
+            raise RuntimeError(f"vectors of {self.profile} are closed")
+
+    def _delta_add(self, vid, vector, seq):
+        if self.delta is None:
+            self.delta = faiss.IndexIDMap2(faiss.IndexFlatL2(len(vector)))
+        if vid in self.delta_seq:
+            self.delta.remove_ids(np.array([vid], dtype=np.int64))
+        self.delta.add_with_ids(np.asarray([vector], dtype=np.float32), np.array([vid], dtype=np.int64))
+        self.delta_seq[vid] = seq
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def add(self, texts: list[str], metadatas: list[dict] = None):
+        """Embed and store summaries; same-key texts replace, near-duplicates become aliases."""
+        metadatas = metadatas or [{} for _ in texts]
+        latest = {doc_key(t, m): (t, m) for t, m in zip(texts, metadatas)}
+        conn = self.shard.conn()
+        stored, aliased = {}, {}
+        for chunk in _chunks(latest):
+            marks = ",".join("?" * len(chunk))
+            stored.update(conn.execute(
+                f"SELECT key, text FROM docs WHERE profile = ? AND key IN ({marks})", (self.profile, *chunk)
+            ))
+            aliased.update(conn.execute(
+                f"SELECT key, text FROM aliases WHERE profile = ? AND key IN ({marks})", (self.profile, *chunk)
+            ))
+        fresh = [(k, t, m) for k, (t, m) in latest.items() if t not in (stored.get(k), aliased.get(k))]
+        with self.lock:
+            self._check_open()
+            for key, (text, meta) in latest.items():
+                if stored.get(key) == text:
+                    self.duplicates_skipped += 1
+                    conn.execute(
+                        "UPDATE docs SET metadata = ?, photo = ?, speaker = ?, timestamp = ? WHERE profile = ? AND key = ?",
+                        (json.dumps(meta), meta.get("photo"), meta.get("speaker"), meta.get("timestamp"), self.profile, key),
+                    )
+                elif aliased.get(key) == text:
+                    self.duplicates_skipped += 1
+                    conn.execute(
+                        "UPDATE aliases SET metadata = ? WHERE profile = ? AND key = ?", (json.dumps(meta), self.profile, key)
+                    )
+        if not fresh:
+            return 0
+        vectors = np.asarray(self.embeddings.embed_documents([t for _, t, _ in fresh]), dtype=np.float32)
+        return self._write(fresh, vectors)
+
+    def _write(self, items, vectors, dedup=True) -> int:
+        conn = self.shard.conn()
+        added = 0
+        with self.lock:
+            self._check_open()
+            # Near-duplicates within the batch first, then against the stored vectors.
+            twins = batch_duplicates(vectors) if dedup else {}
+            kept = [i for i in range(len(items)) if i not in twins]
+            nearest = self._search(vectors[kept], 1) if dedup and DEDUP_DISTANCE and kept else [[] for _ in kept]
+            stands_in = {}
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for i, near in zip(kept, nearest):
+                    (key, text, meta), vector = items[i], vectors[i]
+                    vid = vector_id(key)
+                    if near and near[0][1] != vid and near[0][0] <= DEDUP_DISTANCE:
+                        row = conn.execute(
+                            "SELECT key FROM docs WHERE profile = ? AND vid = ?", (self.profile, near[0][1])
+                        ).fetchone()
+                        if row is not None:
+                            self._alias(conn, key, text, meta, row[0])
+                            stands_in[i] = row[0]
+                            self.duplicates_skipped += 1
+                            continue
+                    conn.execute("DELETE FROM aliases WHERE profile = ? AND key = ?", (self.profile, key))
+                    stands_in[i] = key
+                    seq = self.next_seq
+                    self.next_seq += 1
+                    conn.execute(
+                        "INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (self.profile, key, vid, seq, text, json.dumps(meta), meta.get("photo"),
+                         meta.get("speaker"), meta.get("timestamp"), vector.tobytes()),
+                    )
+                    self._delta_add(vid, vector, seq)
+                    added += 1
+                for i, j in twins.items():
+                    self._alias(conn, *items[i], stands_in[j])
+                    self.duplicates_skipped += 1
+                if self.dim is None and len(vectors):
+                    self.dim = int(vectors.shape[1])
+                conn.execute(
+                    "UPDATE profiles SET next_seq = ?, dim = ? WHERE profile = ?", (self.next_seq, self.dim, self.profile)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if len(self.delta_seq) >= MERGE_AFTER:
+                self.merge_async()
+        print(f"[VECTORS] ✅ {self.profile}: {added} new items, {len(items) - added} deduplicated")
+        return added
+
+    def _alias(self, conn, key, text, meta, target):
+        # Caller holds self.lock inside a transaction. `key` is stored as a near-duplicate of `target`.
+        conn.execute("UPDATE aliases SET target = ? WHERE profile = ? AND target = ?", (target, self.profile, key))
+        self._drop(conn, [key])  # its own, older vector (its aliases were just retargeted)
+        conn.execute(
+            "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?, ?)", (self.profile, key, target, text, json.dumps(meta))
+        )
+
+    def _drop(self, conn, keys) -> tuple[int, list]:
+        # Caller holds self.lock inside a transaction. Returns (removed, orphans): the
+        # aliases of removed docs, which must be re-added under their own key.
+        vids, dropped, unaliased = [], [], 0
+        for chunk in _chunks(set(keys)):
+            marks = ",".join("?" * len(chunk))
+            unaliased += conn.execute(
+                f"DELETE FROM aliases WHERE profile = ? AND key IN ({marks})", (self.profile, *chunk)
+            ).rowcount
+            for vid, key in conn.execute(
+                f"SELECT vid, key FROM docs WHERE profile = ? AND key IN ({marks})", (self.profile, *chunk)
+            ).fetchall():
+                vids.append(vid)
+                dropped.append(key)
+            conn.execute(f"DELETE FROM docs WHERE profile = ? AND key IN ({marks})", (self.profile, *chunk))
+        if not vids:
+            return unaliased, []
+        seq = self.next_seq
+        self.next_seq += 1
+        for vid in vids:
+            # The base may hold an older copy; mask it until the next merge.
+            conn.execute("INSERT OR REPLACE INTO tombstones VALUES (?, ?, ?)", (self.profile, vid, seq))
+            self.tombstones[vid] = seq
+            if self.delta_seq.pop(vid, None) is not None:
+                self.delta.remove_ids(np.array([vid], dtype=np.int64))
+        conn.execute("UPDATE profiles SET next_seq = ? WHERE profile = ?", (self.next_seq, self.profile))
+        leaning = []
+        for chunk in _chunks(dropped):
+            marks = ",".join("?" * len(chunk))
+            leaning += conn.execute(
+                f"SELECT key, text, metadata FROM aliases WHERE profile = ? AND target IN ({marks})", (self.profile, *chunk)
+            ).fetchall()
+            conn.execute(f"DELETE FROM aliases WHERE profile = ? AND target IN ({marks})", (self.profile, *chunk))
+        return unaliased + len(vids), [(text, json.loads(meta or "{}")) for _, text, meta in leaning]
+
+    def remove(self, keys: list[str]) -> int:
+        """Delete the vectors (or aliases) stored under `keys`.
+
+        Aliases that leaned on a removed vector are re-added under their own key.
+        """
+        conn = self.shard.conn()
+        with self.lock:
+            self._check_open()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed, orphans = self._drop(conn, keys)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if orphans:
+            self.add([t for t, _ in orphans], [m for _, m in orphans])
+        return removed
+
+    # -------------------------------
+    # Merge
+    # -------------------------------
+    def merge_async(self):
+        with self.lock:
+            if self._merging or self.closed:
+                return
+            self._merging = True
+        threading.Thread(target=self.merge, args=(True,), daemon=True).start()
+
+    def merge(self, claimed: bool = False):
+        """Rebuild the base index from SQLite and swap the new file in."""
+        with self.lock:
+            if (self._merging and not claimed) or self.closed:
+                if claimed:
+                    self._merging = False
+                return
+            self._merging = True
+        start = time.perf_counter()
+        try:
+            conn = self.shard.conn()
+            conn.execute("BEGIN")
+            try:
+                with self.lock:
+                    # The first read pins the snapshot; every seq <= through is in it.
+                    conn.execute("SELECT COUNT(*) FROM docs WHERE profile = ?", (self.profile,)).fetchone()
+                    through = self.next_seq - 1
+                rows = conn.execute("SELECT vid, vector FROM docs WHERE profile = ?", (self.profile,)).fetchall()
+            finally:
+                conn.execute("COMMIT")
+
+            path, mode, count = self.shard.index_path(self.profile), None, len(rows)
+            tmp = f"{path}.tmp"
+            if rows:
+                ids = np.array([vid for vid, _ in rows], dtype=np.int64)
+                vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                del rows
+                mode = resolve_mode(self.mode, len(ids))
+                index = build_index(mode, ids, vectors, vectors.shape[1])
+                faiss.write_index(index, tmp)
+                del index, vectors
+
+            with self.lock:
+                if self.closed:
+                    # Closed (or dropped) during the build: leave the files alone.
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                    return
+                if mode is not None:
+                    os.replace(tmp, path)
+                elif os.path.exists(path):
+                    mode = "empty"
+                    os.remove(path)
+                self.base = tune(faiss.read_index(path, MMAP_FLAGS)) if os.path.exists(path) else None
+                self.base_seq = through
+                merged = [vid for vid, seq in self.delta_seq.items() if seq <= through]
+                if merged:
+                    self.delta.remove_ids(np.array(merged, dtype=np.int64))
+                    for vid in merged:
+                        del self.delta_seq[vid]
+                self.tombstones = {vid: seq for vid, seq in self.tombstones.items() if seq > through}
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("UPDATE profiles SET base_seq = ? WHERE profile = ?", (through, self.profile))
+                conn.execute("DELETE FROM tombstones WHERE profile = ? AND seq <= ?", (self.profile, through))
+                conn.execute("COMMIT")
+            if mode is not None:
+                print(f"[VECTORS] 💾 Merged {self.profile} ({count} vectors, {mode}, {time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            print(f"[ERROR] Vector merge failed for {self.profile}: {e}")
+        finally:
+            with self.lock:
+                self._merging = False
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def _allow_ids(self, filters: dict):
+        """Ids matching photo / speaker / since / until filters, via the shard's indexes."""
+        clauses, params = [], []
+        for field in ("photo", "speaker"):
+            wanted = filters.get(field)
+            if wanted is not None:
+                values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+                clauses.append(f"{field} IN ({','.join('?' * len(values))})")
+                params += values
+        if filters.get("since") is not None:
+            clauses.append("timestamp >= ?")
+            params.append(float(filters["since"]))
+        if filters.get("until") is not None:
+            clauses.append("timestamp <= ?")
+            params.append(float(filters["until"]))
+        if not clauses:
+            return None
+        rows = self.shard.conn().execute(
+            f"SELECT vid FROM docs WHERE profile = ? AND {' AND '.join(clauses)}", (self.profile, *params)
+        )
+        return {vid for (vid,) in rows}
+
+    def _search(self, vectors, k, allow=None) -> list[list[tuple[float, int]]]:
+        # Caller holds self.lock.
+        hits = [[] for _ in range(len(vectors))]
+        xq = np.asarray(vectors, dtype=np.float32)
+        if self.base is not None and self.base.ntotal:
+            masked = self.tombstones.keys() | self.delta_seq.keys()
+            keep = None
+            if allow is not None:
+                keep = faiss.IDSelectorBatch(np.fromiter(allow - masked, dtype=np.int64))
+                selector = keep
+            elif masked:
+                keep = faiss.IDSelectorBatch(np.fromiter(masked, dtype=np.int64))
+                selector = faiss.IDSelectorNot(keep)
+            else:
+                selector = None
+            if allow is None or len(allow - masked):
+                dists, ids = self.base.search(xq, k, params=search_params(self.base, selector))
+                for row, (d, i) in enumerate(zip(dists, ids)):
+                    hits[row] += [(float(a), int(b)) for a, b in zip(d, i) if b != -1]
+        if self.delta is not None and self.delta.ntotal:
+            selector = faiss.IDSelectorBatch(np.fromiter(allow, dtype=np.int64)) if allow is not None else None
+            dists, ids = self.delta.search(xq, k, params=faiss.SearchParameters(sel=selector))
+            for row, (d, i) in enumerate(zip(dists, ids)):
+                hits[row] += [(float(a), int(b)) for a, b in zip(d, i) if b != -1]
+        return [sorted(h)[:k] for h in hits]
+
+    def search_documents(self, query: str, top_k: int = 5, filters: dict = None) -> list[tuple[str, dict]]:
+        """Nearest stored summaries as (text, metadata) pairs, filtered inside the search."""
+        allow = self._allow_ids(filters) if filters else None
+        if allow is not None and not allow:
+            return []
+        vector = self.embeddings.embed_query(query)
+        with self.lock:
+            self._check_open()
+            hits = self._search([vector], top_k, allow)[0]
+        if not hits:
+            return []
+        vids = [vid for _, vid in hits]
+        rows = {
+            vid: (key, text, meta)
+            for vid, key, text, meta in self.shard.conn().execute(
+                f"SELECT vid, key, text, metadata FROM docs WHERE profile = ? AND vid IN ({','.join('?' * len(vids))})",
+                (self.profile, *vids),
+            )
+        }
+        return [
+            (rows[vid][1], {**json.loads(rows[vid][2] or "{}"), "id": rows[vid][0]})
+            for vid in vids if vid in rows
+        ]
+
+    def count(self) -> int:
+        return self.shard.conn().execute(
+            "SELECT COUNT(*) FROM docs WHERE profile = ?", (self.profile,)
+        ).fetchone()[0]
+
+    # -------------------------------
+    # Migration
+    # -------------------------------
+    def import_legacy(self, faiss_path: str) -> bool:
+        """Copy a `faiss_<profile>` folder into this store (no pickle code execution) and retire it."""
+        if not os.path.exists(os.path.join(faiss_path, "index.faiss")):
+            return False
+        items, vectors = load_legacy_store(faiss_path, self.embeddings)
+        if items:
+            self._write(items, vectors, dedup=False)
+        self.merge()
+        os.replace(faiss_path, f"{faiss_path}.migrated")
+        print(f"[VECTORS] Migrated {faiss_path} ({len(items)} vectors)")
+        return True
+
+
+# ============================================================
+# Legacy FAISS folders
+# ============================================================
+class _PickledDocstore:
+    def __setstate__(self, state):
+        self.docs = state.get("_dict", {})
+
+
+class _PickledDocument:
+    def __setstate__(self, state):
+        fields = state.get("__dict__", state)
+        self.page_content = fields.get("page_content", "")
+        self.metadata = fields.get("metadata") or {}
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Reads LangChain's `index.pkl` into inert stand-ins; any other global is refused."""
+
+    ALLOWED = {
+        ("langchain_community.docstore.in_memory", "InMemoryDocstore"): _PickledDocstore,
+        ("langchain_core.documents.base", "Document"): _PickledDocument,
+    }
+
+    def find_class(self, module, name):
+        try:
+            return self.ALLOWED[(module, name)]
+        except KeyError:
+            raise pickle.UnpicklingError(f"refusing to load {module}.{name}") from None
+
+
+def load_legacy_store(path: str, embeddings=None) -> tuple[list[tuple[str, str, dict]], np.ndarray]:
+    """Read (key, text, metadata) items and their vectors from a LangChain FAISS folder.
+
+    Folders saved with a quantized index hold no raw vectors; their texts are
+    re-embedded with `embeddings`.
+    """
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = _LegacyUnpickler(f).load()
+    if isinstance(index, faiss.IndexIDMap2) and current_mode(index) != "flat":
+        if embeddings is None:
+            raise ValueError(f"{path} holds quantized vectors only; embeddings are needed to import it")
+        items = {}
+        for doc_id, doc in docstore.docs.items():
+            meta = {k: v for k, v in doc.metadata.items() if k != "alias_of"}
+            key = doc_id.removeprefix(ALIAS_PREFIX)
+            items.setdefault(key, (key, doc.page_content, meta))
+        items = list(items.values())
+        if not items:
+            return [], np.zeros((0, index.d), np.float32)
+        return items, np.asarray(embeddings.embed_documents([t for _, t, _ in items]), dtype=np.float32)
+    if isinstance(index, faiss.IndexIDMap2):
+        ids, vectors = stored_vectors(path)
+        rows = {int(vid): n for n, vid in enumerate(ids)}
+    else:
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), np.float32)
+        rows = {n: n for n in range(index.ntotal)}
+    items, picked, seen = [], [], set()
+    for fid, doc_id in index_to_docstore_id.items():
+        doc = docstore.docs.get(doc_id)
+        if doc is None or fid not in rows:
+            continue
+        key = doc_key(doc.page_content, doc.metadata)
+        if key in seen:
+            continue
+        seen.add(key)
+        items.append((key, doc.page_content, doc.metadata))
+        picked.append(rows[fid])
+    return items, vectors[picked] if picked else np.zeros((0, index.d), np.float32)
+
+
+def migrate_all(root: str = "data", embeddings=None) -> int:
+    """One-time import of every `data/<profile>/faiss_<profile>` folder."""
+    if embeddings is None:
+        from pkg.llm import get_embeddings
+        embeddings = get_embeddings()
+    migrated = 0
+    for path in glob.glob(os.path.join(root, "*", "faiss_*")):
+        profile = os.path.basename(os.path.dirname(path))
+        if os.path.basename(path) != f"faiss_{profile}":
+            continue
+        try:
+            migrated += open_profile(profile, embeddings).import_legacy(path)
+        except Exception as e:
+            print(f"[ERROR] Vector migration failed for {profile}: {e}")
+        finally:
+            close_profile(profile)
+    return migrated
+
+
+if __name__ == "__main__":
+    start = time.time()
+    count = migrate_all()
+    print(f"Migrated {count} profiles in {time.time() - start:.2f}s")
@@ -0,0 +1,474 @@
+import os, json, sqlite3, threading, time
+from pkg.llm import get_client
+from pkg.metrics import span, record_usage, counter
+from pkg.ingest import pipeline as ingestion
+
+DIGEST_MODEL = os.getenv("MINDLINK_DIGEST_MODEL", "gpt-4o-mini")
+NARRATIVE_MODEL = "gpt-4o-mini"
+# Calendar months covered by the review, the current one included.
+REVIEW_MONTHS = 12
+# Seconds to wait after new memories before refreshing digests, so a burst of
+# turns is summarized once; negative disables refreshes on ingestion (a
+# request for an out-of-date review still schedules one).
+REFRESH_DELAY = float(os.getenv("MINDLINK_REVIEW_REFRESH_DELAY", "30"))
+TURN_CHARS = 1000
+NOTES_CHARS = int(os.getenv("MINDLINK_DIGEST_INPUT_CHARS", "8000"))
+YEAR_KEY = "current"
+# Version suffix of a narrative built before every month had its digest.
+PARTIAL = ":partial"
+# Bucket, digested like a month, for facts stored before facts carried timestamps.
+EARLIER = "earlier"
+
+PHOTO_PROMPT = (
+    "The notes below are conversations a user had about one of their photos. "
+    "Summarize the moment the photo holds and what the user felt and shared about it, "
+    "in two or three sentences, in the third person."
+)
+MONTH_PROMPT = (
+    "The notes below cover one month of a user's reflections: summaries of the photos "
+    "they talked about and excerpts of other conversations. Summarize the month's main "
+    "moments, moods and changes in three to five sentences, in the third person."
+)
+
+YEAR_IN_REVIEW_PROMPT = (
+    "You are Eunoia — an empathetic visual companion and poetic narrator."
+    "Reflect on the user’s journey with emotional depth, softness, and gentle optimism. "
+    "Compose a 'Year in Review' that feels personal and alive — a warm reflection that traces moments of emotion, growth, and transformation.\n\n"
+
+    "Speak in Eunoia’s tone: calm, sensory, and sincere. Weave feelings like color — noticing quiet victories, tender pauses, and the way change shaped the year’s rhythm."
+    "Balance introspection with hope, and let your language flow like gentle storytelling — lyrical, but grounded in empathy.\n\n"
+
+    "Infuse your narration with the spirit of the Ten Fortune Cookies — calm, color, chaos, care, dream, curiosity, change, shadow, wonder, and perspective — "
+    "so every line feels emotionally resonant and authentic.\n\n"
+
+    "Avoid being mechanical or overly formal. Write as if offering a reflection to a dear friend — kind, observant, and quietly celebratory."
+)
+
+
+def month_of(ts) -> str:
+    return time.strftime("%Y-%m", time.localtime(ts)) if ts is not None else EARLIER
+
+
+def review_months(now=None) -> list[str]:
+    """The REVIEW_MONTHS month keys ending with the current month, oldest first."""
+    t = time.localtime(now or time.time())
+    year, month, keys = t.tm_year, t.tm_mon, []
+    for _ in range(REVIEW_MONTHS):
+        keys.append(f"{year:04d}-{month:02d}")
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return keys[::-1]
+
+
+def _window_version(months: list[str], month_versions: dict) -> str:
+    """Changes when the window moves (its last month) or a memory lands in it."""
+    return f"{months[-1]}:{max(map(int, month_versions.values()), default=0)}"
+
+
+def _clip(texts: list[str], limit: int = NOTES_CHARS) -> str:
+    """Newest texts that fit in `limit` characters, in chronological order."""
+    kept, used = [], 0
+    for text in reversed(texts):
+        if kept and used + len(text) > limit:
+            break
+        kept.append(text)
+        used += len(text) + 2
+    return "\n\n".join(reversed(kept))
+
+
+# ============================================================
+# Digest store
+# ============================================================
+class DigestStore:
+    """A profile's remembered turns and their photo / month / year digests.
+
+    One SQLite file per profile. Every digest records the version of the
+    period it was built from (the newest turn sequence number in it), so a
+    digest is rebuilt only after new memories land in its period.
+    """
+
+    def __init__(self, profile_name: str, root: str = "data"):
+        self.path = os.path.join(root, profile_name, f"review_{profile_name}.sqlite")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL, month TEXT, photo TEXT, text TEXT);"
+            "CREATE INDEX IF NOT EXISTS turns_month ON turns (month);"
+            "CREATE INDEX IF NOT EXISTS turns_photo ON turns (photo);"
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " kind TEXT, key TEXT, text TEXT, version TEXT, built REAL, PRIMARY KEY (kind, key));"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def add(self, rows: list[tuple]):
+        """Store turns as (timestamp, photo, text)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO turns (ts, month, photo, text) VALUES (?, ?, ?, ?)",
+                [(ts, month_of(ts), photo, text) for ts, photo, text in rows],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def first_timestamp(self):
+        return self._conn().execute("SELECT MIN(ts) FROM turns").fetchone()[0]
+
+    def _marks(self, months: list[str]) -> str:
+        return ",".join("?" * len(months))
+
+    def month_versions(self, months: list[str]) -> dict:
+        return {m: str(v) for m, v in self._conn().execute(
+            f"SELECT month, MAX(seq) FROM turns WHERE month IN ({self._marks(months)}) GROUP BY month", months
+        )}
+
+    def photo_versions(self, months: list[str]) -> dict:
+        """Versions of the photos talked about in `months` (over all their turns)."""
+        return {p: str(v) for p, v in self._conn().execute(
+            "SELECT photo, MAX(seq) FROM turns WHERE photo IN ("
+            f" SELECT DISTINCT photo FROM turns WHERE photo IS NOT NULL AND month IN ({self._marks(months)})"
+            ") GROUP BY photo", months
+        )}
+
+    def photos_in(self, month: str) -> list[str]:
+        return [p for (p,) in self._conn().execute(
+            "SELECT photo FROM turns WHERE month = ? AND photo IS NOT NULL GROUP BY photo ORDER BY MIN(seq)", (month,)
+        )]
+
+    def photo_turns(self, photo: str) -> list[str]:
+        return [t for (t,) in self._conn().execute("SELECT text FROM turns WHERE photo = ? ORDER BY seq", (photo,))]
+
+    def month_turns(self, month: str) -> list[str]:
+        return [t for (t,) in self._conn().execute("SELECT text FROM turns WHERE month = ? ORDER BY seq", (month,))]
+
+    def loose_turns(self, month: str) -> list[str]:
+        """Turns of a month that aren't about any photo."""
+        return [t for (t,) in self._conn().execute(
+            "SELECT text FROM turns WHERE month = ? AND photo IS NULL ORDER BY seq", (month,)
+        )]
+
+    def digests(self, kind: str) -> dict:
+        """{key: (text, version)} of every digest of a kind."""
+        return {k: (t, v) for k, t, v in self._conn().execute(
+            "SELECT key, text, version FROM digests WHERE kind = ?", (kind,)
+        )}
+
+    def digest(self, kind: str, key: str) -> tuple:
+        row = self._conn().execute(
+            "SELECT text, version FROM digests WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def put(self, kind: str, key: str, text: str, version: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)", (kind, key, text, version, time.time())
+        )
+
+    def get_meta(self, key: str, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+
+# ============================================================
+# Incremental Year in Review
+# ============================================================
+class YearInReview:
+    """Hierarchical Year in Review: turns → photo digests → month digests → narrative.
+
+    New memories are recorded as they are ingested and a debounced background
+    pass refreshes the digests of the periods they landed in (and the narrative,
+    once a profile has asked for one). The narrative is cached per profile and
+    keyed by the review window and its newest turn, so a repeat request without
+    new memories in the window is a single SQLite lookup.
+
+    Digests are only ever built by the background pass. A request that finds
+    the narrative out of date gets the old one, marked stale, and a request with
+    no narrative yet gets one built from the digests there are; both schedule a
+    refresh right away.
+    """
+
+    def __init__(self, delay=REFRESH_DELAY, root="data"):
+        self.delay = delay
+        self.root = root
+        self._lock = threading.Lock()
+        self._stores: dict[str, DigestStore] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._refreshing: dict[str, threading.Lock] = {}
+        self._due: dict[str, float] = {}
+        self._wake = threading.Condition()
+        self._thread = None
+        self._short_term = None
+        self._stats = dict.fromkeys(
+            ("requests", "hits", "stale", "narratives", "photo_digests", "month_digests", "seeded_facts", "refreshes"), 0
+        )
+
+    def store(self, profile: str) -> DigestStore:
+        with self._lock:
+            store = self._stores.get(profile)
+            if store is None:
+                store = self._stores[profile] = DigestStore(profile, self.root)
+            return store
+
+    def short_term(self, fn):
+        """Use `fn(profile) -> str` for the recent conversation added to narrative prompts."""
+        self._short_term = fn
+
+    def _profile_lock(self, profile: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(profile, threading.Lock())
+
+    def _refresh_lock(self, profile: str) -> threading.Lock:
+        """Held for a whole background pass; requests never wait on it."""
+        with self._lock:
+            return self._refreshing.setdefault(profile, threading.Lock())
+
+    # -------------------------------
+    # New memories
+    # -------------------------------
+    def record(self, profile: str, batch: list[dict]):
+        """Ingestion listener: keep the batch's turns and schedule a digest refresh."""
+        rows = []
+        for entry in batch:
+            text = "\n".join(
+                f"{m['role'].capitalize()}: {m['content']}"
+                for m in entry.get("messages", []) if isinstance(m.get("content"), str)
+            )
+            if text:
+                rows.append((entry.get("ts") or time.time(), entry.get("photo_name"), text[:TURN_CHARS]))
+        if rows:
+            self.store(profile).add(rows)
+            self.schedule(profile)
+
+    def schedule(self, profile: str, delay=None):
+        """Refresh a profile's digests after `delay` seconds (REFRESH_DELAY by default)."""
+        if delay is None:
+            if self.delay < 0:
+                return
+            delay = self.delay
+        with self._wake:
+            # Only ever brought forward: a steady stream of turns can't postpone the refresh forever.
+            due = time.monotonic() + delay
+            self._due[profile] = min(self._due.get(profile, due), due)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="review-digester", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._due:
+                    self._wake.wait()
+                profile, due = min(self._due.items(), key=lambda item: item[1])
+                if due > time.monotonic():
+                    self._wake.wait(due - time.monotonic())
+                    continue
+                del self._due[profile]
+            try:
+                self.refresh(profile)
+            except Exception as e:
+                print(f"[REVIEW] ⚠️ Refreshing digests of {profile} failed: {e}")
+
+    def forget(self, profile: str):
+        """Drop a profile's pending refresh and open store (before its files are removed)."""
+        with self._wake:
+            self._due.pop(profile, None)
+        with self._refresh_lock(profile), self._profile_lock(profile):
+            with self._lock:
+                self._stores.pop(profile, None)
+                self._locks.pop(profile, None)
+                self._refreshing.pop(profile, None)
+
+    # -------------------------------
+    # Digests
+    # -------------------------------
+    def _summarize(self, caller: str, system: str, notes: str, max_tokens=None, model=DIGEST_MODEL) -> str:
+        request = {
+            "model": model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": notes}],
+        }
+        if max_tokens:
+            request["max_tokens"] = max_tokens
+        with span(f"review.{caller}"):
+            resp = get_client().chat.completions.create(**request)
+        record_usage(caller, request["model"], getattr(resp, "usage", None))
+        return (resp.choices[0].message.content or "").strip()
+
+    def _seed(self, profile: str, store: DigestStore):
+        """Import the facts a profile had before its turns were recorded here.
+
+        Dated facts land in their month; undated ones (stored before facts had
+        timestamps) go in the EARLIER bucket.
+        """
+        from pkg.memory_registry import registry
+
+        with registry.lease(profile) as memory:
+            facts = memory.dated_facts(until=store.first_timestamp()) if store.get_meta("seeded") is None else []
+            facts += [(None, photo, text) for photo, text in memory.undated_facts()]
+        if facts:
+            store.add(facts)
+        store.set_meta("seeded", store.get_meta("seeded") or time.time())
+        store.set_meta("seeded_undated", time.time())
+        self._count(seeded_facts=len(facts))
+
+    def _refresh_digests(self, store: DigestStore, months: list[str], month_versions: dict):
+        photos = store.digests("photo")
+        for photo, version in store.photo_versions(months).items():
+            if photos.get(photo, (None, None))[1] != version:
+                text = self._summarize("digest_photo", PHOTO_PROMPT, _clip(store.photo_turns(photo)), 200)
+                store.put("photo", photo, text, version)
+                photos[photo] = (text, version)
+                self._count(photo_digests=1)
+
+        built = store.digests("month")
+        for month, version in month_versions.items():
+            if built.get(month, (None, None))[1] == version:
+                continue
+            notes = [f"Photo {p}: {photos[p][0]}" for p in store.photos_in(month) if p in photos]
+            loose = store.loose_turns(month)
+            if loose:
+                notes.append("Other conversations:\n" + _clip(loose, NOTES_CHARS // 2))
+            store.put("month", month, self._summarize("digest_month", MONTH_PROMPT, _clip(notes), 300), version)
+            self._count(month_digests=1)
+
+    def _seed_once(self, profile: str, store: DigestStore):
+        # Stores seeded before undated facts were imported get those on their next use.
+        if store.get_meta("seeded_undated") is None:
+            with self._profile_lock(profile):
+                if store.get_meta("seeded_undated") is None:
+                    self._seed(profile, store)
+
+    @staticmethod
+    def _window(store: DigestStore, now=None) -> tuple:
+        months = [EARLIER] + review_months(now)
+        month_versions = store.month_versions(months)
+        return months, month_versions, _window_version(months, month_versions)
+
+    def _messages(self, profile: str, store: DigestStore, months: list[str], month_versions: dict) -> tuple[list, bool]:
+        """Narrative prompt from the month digests there are and the recent conversation,
+        plus whether the digests were all current.
+
+        A month that has no digest yet is represented by excerpts of its turns.
+        """
+        digests = store.digests("month")
+        sections, current = [], True
+        for m in months:
+            if m not in month_versions:
+                continue
+            text, version = digests.get(m, (None, None))
+            current = current and version == month_versions[m]
+            if text is None:
+                text = "Excerpts:\n" + _clip(store.month_turns(m), NOTES_CHARS // REVIEW_MONTHS)
+            label = "Earlier memories" if m == EARLIER else time.strftime("%B %Y", time.strptime(m, "%Y-%m"))
+            sections.append(f"{label}:\n{text}")
+        notes = "Monthly digests of the past year:\n\n" + "\n\n".join(sections) if sections else (
+            "No memories were recorded in the past year."
+        )
+        recent = self._short_term(profile) if self._short_term is not None else ""
+        if recent:
+            notes += f"\n\nRecent conversation:\n{recent}"
+        return [
+            {"role": "system", "content": YEAR_IN_REVIEW_PROMPT},
+            {"role": "user", "content": notes},
+        ], current
+
+    def _build_narrative(self, store: DigestStore, messages: list, version: str) -> str:
+        system, notes = (m["content"] for m in messages)
+        reply = self._summarize("year_in_review", system, notes, model=NARRATIVE_MODEL)
+        store.put("year", YEAR_KEY, reply, version)
+        self._count(narratives=1)
+        return reply
+
+    # -------------------------------
+    # Entry points
+    # -------------------------------
+    def prepare(self, profile: str) -> dict:
+        """The cached narrative (`reply`, `stale` if newer memories aren't in it yet), or the
+        `messages` to build it from; plus the `version` to save it under.
+
+        Never builds digests: anything out of date is left to a refresh, scheduled now.
+        """
+        store = self.store(profile)
+        self._seed_once(profile, store)
+        months, month_versions, version = self._window(store)
+        text, built = store.digest("year", YEAR_KEY)
+        if text is not None:
+            prepared = {"reply": text, "version": built, "messages": None, "stale": built != version}
+        else:
+            messages, current = self._messages(profile, store, months, month_versions)
+            if not current:
+                version += PARTIAL
+            prepared = {"reply": None, "version": version, "messages": messages, "stale": False}
+        if prepared["stale"] or prepared["version"].endswith(PARTIAL):
+            self.schedule(profile, delay=0)
+        self._hit(prepared["reply"] is not None, prepared["stale"])
+        return prepared
+
+    def save(self, profile: str, version: str, reply: str):
+        """Cache a narrative built from `prepare`, unless newer memories arrived meanwhile."""
+        with self._profile_lock(profile):
+            store = self.store(profile)
+            if self._window(store)[2] == version.removesuffix(PARTIAL):
+                store.put("year", YEAR_KEY, reply, version)
+                self._count(narratives=1)
+
+    def narrative(self, profile: str) -> tuple[str, bool, bool]:
+        """(narrative, cached, stale): the cached one, or one built now from the current digests."""
+        prepared = self.prepare(profile)
+        if prepared["reply"] is not None:
+            return prepared["reply"], True, prepared["stale"]
+        system, notes = (m["content"] for m in prepared["messages"])
+        reply = self._summarize("year_in_review", system, notes, model=NARRATIVE_MODEL)
+        self.save(profile, prepared["version"], reply)
+        return reply, False, False
+
+    def refresh(self, profile: str):
+        """Background pass: bring digests up to date, and the narrative if the profile has one."""
+        with self._refresh_lock(profile):
+            store = self.store(profile)
+            self._seed_once(profile, store)
+            months, month_versions, version = self._window(store)
+            self._refresh_digests(store, months, month_versions)
+            text, built = store.digest("year", YEAR_KEY)
+            if text is not None and built != version:
+                messages, _ = self._messages(profile, store, months, month_versions)
+                self._build_narrative(store, messages, version)
+        self._count(refreshes=1)
+
+    # -------------------------------
+    # Stats
+    # -------------------------------
+    def _count(self, **amounts):
+        with self._lock:
+            for name, n in amounts.items():
+                self._stats[name] += n
+
+    def _hit(self, hit: bool, stale: bool = False):
+        self._count(requests=1, hits=int(hit and not stale), stale=int(stale))
+        result = "stale" if stale else "hit" if hit else "miss"
+        counter("mindlink_year_review_requests_total", "Year in Review requests", {"result": result}).inc()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["pending_refreshes"] = len(self._due)
+        s["hit_rate"] = round(s["hits"] / s["requests"], 4) if s["requests"] else None
+        return s
+
+
+reviews = YearInReview()
+ingestion.subscribe(reviews.record)
@@ -10,8 +10,16 @@ async function handleResponse(res: Response, errorMessage: string) {
 }
 
 export async function fetchProfiles() {
-  const res = await fetch(`${API_BASE}/list`);
-  return handleResponse(res, "Failed to load profiles");
+  // The list is cursor-paginated: follow X-Next-Cursor until the last page.
+  const profiles: { name: string }[] = [];
+  let cursor: string | null = null;
+  do {
+    const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    const res: Response = await fetch(`${API_BASE}/list${query}`);
+    profiles.push(...(await handleResponse(res, "Failed to load profiles")));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return profiles;
 }
 
 export async function createProfile(name: string) {
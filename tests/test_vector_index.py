@@ -0,0 +1,100 @@
+import hashlib
+import time
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from pkg import vector_index
+from pkg.vector_index import ResidentIndex, edge_key
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors, far apart for distinct texts."""
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+        v = np.random.default_rng(seed).normal(size=32).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _meta(i):
+    return {"source": f"s{i}", "target": f"t{i}"}
+
+
+def _wait_for_base(index, ntotal=None):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        with vector_index.LOCK:
+            if index.base is not None and not index._migrating and (ntotal is None or index.base.ntotal == ntotal):
+                return
+        time.sleep(0.05)
+    pytest.fail("IVF base was never built")
+
+
+def _top(index, text, k=1):
+    return [t for t, _ in index.search_documents(text, k)]
+
+
+@pytest.fixture
+def ivf_index(tmp_path):
+    index = ResidentIndex(str(tmp_path / "faiss_p"), HashEmbeddings(), mode="ivf_sq8")
+    texts = [f"fact number {i}" for i in range(200)]
+    index.enqueue(texts, [_meta(i) for i in range(200)])
+    index.drain()
+    _wait_for_base(index)
+    return index
+
+
+def test_delete_then_query_under_ivf_sq8(ivf_index):
+    assert vector_index.current_mode(ivf_index.base) == "ivf_sq8"
+    base_total = ivf_index.base.ntotal
+
+    removed = [edge_key(f"s{i}", f"t{i}") for i in range(0, 200, 7)]
+    assert ivf_index.remove(removed) == len(removed)
+    # The IVF base is never mutated; deleted ids are masked at search time.
+    assert ivf_index.base.ntotal == base_total
+
+    for i in range(200):
+        hits = _top(ivf_index, f"fact number {i}", k=5)
+        if i % 7 == 0:
+            assert f"fact number {i}" not in hits
+        else:
+            assert hits[0] == f"fact number {i}"
+
+
+def test_upsert_and_reload_keep_ivf_results_exact(ivf_index, tmp_path):
+    ivf_index.enqueue(["fact number 3, revised"], [_meta(3)])
+    ivf_index.remove([edge_key("s5", "t5")])
+    assert _top(ivf_index, "fact number 3, revised") == ["fact number 3, revised"]
+    assert "fact number 3" not in _top(ivf_index, "fact number 3", k=5)
+    ivf_index.flush()
+
+    reloaded = ResidentIndex(ivf_index.path, HashEmbeddings(), mode="ivf_sq8")
+    reloaded.load()
+    assert reloaded.base is not None
+    assert _top(reloaded, "fact number 3, revised") == ["fact number 3, revised"]
+    assert "fact number 5" not in _top(reloaded, "fact number 5", k=5)
+    assert _top(reloaded, "fact number 42") == ["fact number 42"]
+
+
+def test_rebuild_uses_raw_vectors(ivf_index, monkeypatch):
+    monkeypatch.setattr(vector_index, "DELTA_MAX", 0)
+    ivf_index.remove([edge_key(f"s{i}", f"t{i}") for i in range(20)])
+    _wait_for_base(ivf_index, ntotal=180)
+
+    embeddings = HashEmbeddings()
+    with vector_index.LOCK:
+        ids, vectors = ivf_index._live_vectors(ivf_index.db)
+        keys = [ivf_index.db.index_to_docstore_id[int(vid)] for vid in ids]
+    assert len(ids) == 180 and not ivf_index.masked
+    for key, vector in zip(keys, vectors):
+        text = ivf_index.db.docstore.search(key).page_content
+        np.testing.assert_array_equal(vector, np.asarray(embeddings.embed_query(text), dtype=np.float32))
+    assert _top(ivf_index, "fact number 150") == ["fact number 150"]